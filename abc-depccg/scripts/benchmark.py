@@ -0,0 +1,1013 @@
+#!/usr/bin/python3
+"""
+    Benchmarks for the ABC Treebank depccg scripts.
+    Each subcommand measures one part of `parser.py` or `trainer.py`
+    and prints the results to STDOUT.
+"""
+import typing
+import argparse
+import importlib.util
+import sys
+import time
+import pathlib
+
+from synthetic import generate_synthetic_treebank
+
+DIR_SCRIPTS: pathlib.Path = pathlib.Path(__file__).resolve().parent
+
+def load_script(name: str):
+    """
+        Load a script in this directory as a module.
+        `parser.py` cannot be imported in the usual way
+        because its name collides with the standard `parser` module.
+
+        Parameters
+        ----------
+        name : str
+            The name of the script without the extension.
+
+        Returns
+        -------
+        module
+            The loaded script.
+    """
+    spec = importlib.util.spec_from_file_location(
+        f"abc_depccg_{name}",
+        str(DIR_SCRIPTS / f"{name}.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+# === END ===
+
+def measure(
+    func: typing.Callable[[], typing.Any],
+    repeat: int = 1
+) -> float:
+    """
+        Measure the best wall time of `func` over `repeat` runs.
+
+        Returns
+        -------
+        time : float
+            The best wall time in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    # === END FOR ===
+    return best
+# === END ===
+
+def report(name: str, seconds: float, count: int, unit: str) -> None:
+    sys.stdout.write(
+        f"{name:<32} {seconds:10.4f} s  "
+        f"{count / seconds if seconds > 0 else float('inf'):14.1f} {unit}/s\n"
+    )
+# === END ===
+
+DIR_TESTS: pathlib.Path = DIR_SCRIPTS.parent.parent / "tests"
+
+def load_test_sentences(
+    dir_tests: typing.Union[str, pathlib.Path] = DIR_TESTS
+) -> typing.List[str]:
+    """
+        Collect the (untokenized) test sentences in `tests/`.
+        The sentences are in the first column of the .csv/.tsv files,
+        whose first lines of the .csv files are headers,
+        and are one per line in the .txt files.
+
+        Returns
+        -------
+        sentences : typing.List[str]
+            The test sentences.
+    """
+    res: typing.List[str] = []
+    for path in sorted(pathlib.Path(dir_tests).iterdir()):
+        with open(path) as h_test:
+            lines = list(h_test)
+        # === END WITH h_test ===
+
+        if path.suffix == ".csv":
+            lines = [line.split(",")[0] for line in lines[1:]]
+        elif path.suffix == ".tsv":
+            lines = [line.split("\t")[0] for line in lines]
+        # === END IF ===
+
+        res.extend(filter(None, (line.strip() for line in lines)))
+    # === END FOR path ===
+    return res
+# === END ===
+
+def make_mixed_corpus(
+    parser,
+    dir_tests: typing.Union[str, pathlib.Path],
+    sentences: int,
+    long_ratio: float,
+    long_length: int = 250
+) -> typing.List[typing.List[str]]:
+    """
+        Make a mixed-length corpus from the test sentences in `tests/`
+        tokenized by Janome:
+        most sentences are as they are,
+        and some are concatenations of several ones up to `long_length` tokens.
+        Its statistics are printed to STDOUT.
+
+        Parameters
+        ----------
+        parser : module
+            `parser.py` loaded by `load_script`.
+        sentences : int
+            The number of the sentences of the corpus.
+        long_ratio : float
+            The ratio of the long sentences.
+        long_length : int
+            The number of the tokens of the long sentences.
+
+        Returns
+        -------
+        doc : typing.List[typing.List[str]]
+            The tokenized sentences.
+    """
+    import random
+
+    _, tests = parser.annotate_using_janome(
+        [[sentence] for sentence in load_test_sentences(dir_tests)],
+        tokenize = True
+    )
+    rng = random.Random(0)
+    doc: typing.List[typing.List[str]] = []
+    for _ in range(sentences):
+        sentence = list(rng.choice(tests))
+        if rng.random() < long_ratio:
+            while len(sentence) < long_length:
+                sentence += rng.choice(tests)
+            # === END WHILE ===
+            sentence = sentence[:long_length]
+        # === END IF ===
+        doc.append(sentence)
+    # === END FOR ===
+
+    lengths = sorted(len(sentence) for sentence in doc)
+    sys.stdout.write(
+        f"{len(doc)} sentences, {sum(lengths)} tokens, "
+        f"median length {lengths[len(lengths) // 2]}, max length {lengths[-1]}\n"
+    )
+    return doc
+# === END ===
+
+# ======
+# Benchmarks
+# ======
+def bench_cat(args: argparse.Namespace) -> None:
+    """
+        Compare the parsy category translator
+        with the hand-written one on the categories in a `target.txt`.
+    """
+    parser = load_script("parser")
+    trainer = load_script("trainer")
+
+    with open(args.target) as h_target:
+        cats: typing.List[str] = list(
+            filter(
+                None,
+                map(trainer.parse_mod_target_line, h_target)
+            )
+        )
+    # === END WITH h_target ===
+
+    # Emulate the occurrences of categories in parsed trees
+    occurrences: typing.List[str] = cats * args.occurrences
+
+    # Check the identity of the outputs first
+    for cat in cats:
+        expected = parser.translate_cat_TLG(parser.parse_cat(cat))
+        actual = parser.parse_cat_translate_TLG(cat)
+        if expected != actual:
+            raise AssertionError(
+                f"Mismatch on {cat}: {expected} (parsy) != {actual}"
+            )
+        # === END IF ===
+    # === END FOR cat ===
+    sys.stdout.write(f"{len(cats)} categories, all translations identical\n")
+
+    def run_parsy():
+        for cat in occurrences:
+            parser.translate_cat_TLG(parser.parse_cat(cat))
+        # === END FOR ===
+    # === END ===
+
+    def run_hand_written_cold():
+        parser.parse_category.cache_clear()
+        for cat in cats:
+            parser.parse_cat_translate_TLG(cat)
+        # === END FOR ===
+    # === END ===
+
+    def run_hand_written():
+        parser.parse_category.cache_clear()
+        for cat in occurrences:
+            parser.parse_cat_translate_TLG(cat)
+        # === END FOR ===
+    # === END ===
+
+    report(
+        "parsy",
+        measure(run_parsy, args.repeat),
+        len(occurrences), "cats"
+    )
+    report(
+        "hand-written (no reuse)",
+        measure(run_hand_written_cold, args.repeat),
+        len(cats), "cats"
+    )
+    report(
+        "hand-written (memoized)",
+        measure(run_hand_written, args.repeat),
+        len(occurrences), "cats"
+    )
+# === END ===
+
+def bench_server(args: argparse.Namespace) -> None:
+    """
+        Compare the latency of a cold start of `parser.py`
+        with that of a request to a running parsing server.
+        The cold starts do not use the caches of parse results
+        and tokenization results, so that each of them loads the model.
+        The server should likewise be run with `--no-cache`.
+    """
+    import subprocess
+    import statistics
+    client = load_script("client")
+
+    def run_cold():
+        subprocess.run(
+            [
+                sys.executable, str(DIR_SCRIPTS / "parser.py"),
+                "--model", args.model,
+                "--input", args.input,
+                "--no-cache",
+            ] + (["--tokenize"] if args.tokenize else []),
+            check = True,
+            stdout = subprocess.DEVNULL
+        )
+    # === END ===
+
+    def run_warm():
+        client.request_parse(
+            args.url, args.input,
+            tokenize = args.tokenize
+        )
+    # === END ===
+
+    for name, func in (("cold start", run_cold), ("server", run_warm)):
+        latencies = [measure(func) for _ in range(args.runs)]
+        sys.stdout.write(
+            f"{name:<32} "
+            f"median {statistics.median(latencies):10.4f} s  "
+            f"min {min(latencies):10.4f} s  "
+            f"max {max(latencies):10.4f} s\n"
+        )
+    # === END FOR ===
+# === END ===
+
+def bench_workers(args: argparse.Namespace) -> None:
+    """
+        Measure how `parser.py --workers N` scales
+        on the test sentences in `tests/`.
+        The caches of parse results and tokenization results are not used,
+        so that every run parses all the sentences.
+    """
+    import subprocess
+
+    sentences = load_test_sentences(args.tests) * args.copies
+    doc: bytes = "\n".join(sentences).encode("utf-8")
+    sys.stdout.write(f"{len(sentences)} sentences\n")
+
+    for workers in args.workers:
+        def run():
+            subprocess.run(
+                [
+                    sys.executable, str(DIR_SCRIPTS / "parser.py"),
+                    "--model", args.model,
+                    "--tokenize",
+                    "--workers", str(workers),
+                    "--batchsize", str(args.batchsize),
+                    "--no-cache",
+                ],
+                input = doc,
+                check = True,
+                stdout = subprocess.DEVNULL
+            )
+        # === END ===
+
+        report(
+            f"{workers} worker(s)",
+            measure(run, args.repeat),
+            len(sentences), "sents"
+        )
+    # === END FOR workers ===
+# === END ===
+
+def bench_userdic(args: argparse.Namespace) -> None:
+    """
+        Measure the time to build the Janome user dictionary:
+        the generation of the entries from the system dictionary
+        and the whole build including the compilation.
+    """
+    import tempfile
+    import janome.tokenizer
+    parser = load_script("parser")
+
+    dic = list(janome.tokenizer.Tokenizer(mmap = False).sys_dic.entries.values())
+    entries = parser.generate_janome_userdic(dic)
+    sys.stdout.write(f"{len(entries)} entries from {len(dic)} system entries\n")
+
+    report(
+        "generation",
+        measure(lambda: parser.generate_janome_userdic(dic), args.repeat),
+        len(dic), "sysdic entries"
+    )
+
+    with tempfile.TemporaryDirectory() as dir_tmp:
+        report(
+            "generation + compilation",
+            measure(
+                lambda: parser.build_janome_userdic(pathlib.Path(dir_tmp) / "userdic"),
+                args.repeat
+            ),
+            len(dic), "sysdic entries"
+        )
+    # === END WITH dir_tmp ===
+# === END ===
+
+def bench_tokenize(args: argparse.Namespace) -> None:
+    """
+        Compare the throughput of serial and pooled Janome tokenization
+        on the test sentences in `tests/`.
+        The token cache is disabled so that every run tokenizes the sentences.
+        Duplicate sentences in a run are tokenized once,
+        so the throughput is counted in unique sentences.
+    """
+    parser = load_script("parser")
+    parser.TOKEN_CACHE_SIZE = 0
+
+    sentences = [
+        [sentence] 
+        for sentence in load_test_sentences(args.tests) * args.copies
+    ]
+    n_unique = len(set(sentence for sentence, in sentences))
+    sys.stdout.write(f"{len(sentences)} sentences ({n_unique} unique)\n")
+
+    # Load (or build) the tokenizer outside of the measurement
+    parser.tokenize_using_janome("")
+
+    for workers in args.workers:
+        report(
+            "serial" if workers == 1 else f"{workers} workers",
+            measure(
+                lambda: parser.annotate_using_janome(
+                    sentences, 
+                    tokenize = True, 
+                    workers = workers
+                ), 
+                args.repeat
+            ),
+            n_unique, "unique sents"
+        )
+        parser.shutdown_janome_pool()
+    # === END FOR workers ===
+# === END ===
+
+def bench_preprocess(args: argparse.Namespace) -> None:
+    """
+        Measure the preprocessing of the treebank in `trainer.py`
+        (the split and the digest) on a synthetic treebank:
+        the former three passes of `mod_treebank` 
+        and the single pass with different numbers of workers.
+    """
+    import tempfile
+    trainer = load_script("trainer")
+
+    with tempfile.TemporaryDirectory() as dir_tmp:
+        dir_tmp = pathlib.Path(dir_tmp)
+        treefiles: typing.List[pathlib.Path] = sorted(
+            generate_synthetic_treebank(
+                dir_tmp / "source", args.files, args.trees
+            ).glob("*.psd")
+        )
+        count: int = args.files * args.trees
+        sys.stdout.write(f"{len(treefiles)} files, {count} trees\n")
+
+        def new_output_dir() -> pathlib.Path:
+            dir_output = pathlib.Path(tempfile.mkdtemp(dir = dir_tmp))
+            for name in trainer.DIGEST_MODES:
+                (dir_output / name).mkdir()
+            # === END FOR name ===
+            return dir_output
+        # === END ===
+
+        def split(
+            dir_output: pathlib.Path,
+            digest: typing.Callable[[typing.Iterator], None]
+        ) -> None:
+            with open(dir_output / "all.psd", "w") as h_all, \
+                open(dir_output / "train.psd", "w") as h_train, \
+                open(dir_output / "test.psd", "w") as h_test:
+                digest(
+                    trainer.split_treebank_files(
+                        treefiles, h_all, h_train, h_test, 80
+                    )
+                )
+            # === END WITH ===
+        # === END ===
+
+        def run_three_passes() -> None:
+            dir_output = new_output_dir()
+            split(dir_output, lambda jobs: sum(1 for _ in jobs))
+            trainer.mod_treebank(dir_output / "all.psd", dir_output / "all", "train")
+            trainer.mod_treebank(dir_output / "train.psd", dir_output / "train", "train")
+            trainer.mod_treebank(dir_output / "test.psd", dir_output / "test", "test")
+        # === END ===
+
+        report(
+            "three passes",
+            measure(run_three_passes, args.repeat),
+            count, "trees"
+        )
+
+        for workers in args.workers:
+            def run() -> None:
+                dir_output = new_output_dir()
+                digesters = {
+                    name: trainer.TreebankDigester(
+                        dir_output / f"{name}.psd", dir_output / name, mode
+                    )
+                    for name, mode in trainer.DIGEST_MODES.items()
+                }
+                split(
+                    dir_output,
+                    lambda jobs: trainer.digest_treebank_files(
+                        jobs, digesters, workers = workers
+                    )
+                )
+
+                for digester in digesters.values():
+                    digester.dump()
+                # === END FOR digester ===
+            # === END ===
+
+            report(
+                f"single pass, {workers} worker(s)",
+                measure(run, args.repeat),
+                count, "trees"
+            )
+        # === END FOR workers ===
+    # === END WITH dir_tmp ===
+# === END ===
+
+def bench_epoch(args: argparse.Namespace) -> None:
+    """
+        Measure the loading of the training data in an epoch
+        (reading and indexing all the instances as the trainer does)
+        on a synthetic treebank:
+        `traindata.json` read by `ja_supertagging_dataset`
+        and the shards read by `ja_sharded_supertagging_dataset`.
+    """
+    import tempfile
+    import allennlp.data.vocabulary as allv
+    import allennlp.data.token_indexers as allti
+    import allennlp.data.tokenizers as alltok
+    import allennlp.common.util as allu
+    allu.import_submodules("depccg.models.my_allennlp")
+
+    trainer = load_script("trainer")
+    sys.path.insert(0, str(DIR_SCRIPTS))
+    import sharded_dataset
+
+    with tempfile.TemporaryDirectory() as dir_tmp:
+        dir_tmp = pathlib.Path(dir_tmp)
+        treefiles: typing.List[pathlib.Path] = sorted(
+            generate_synthetic_treebank(
+                dir_tmp / "source", args.files, args.trees
+            ).glob("*.psd")
+        )
+        count: int = args.files * args.trees
+
+        dir_train = dir_tmp / "train"
+        dir_train.mkdir()
+        digester = trainer.TreebankDigester(
+            dir_tmp / "train.psd", dir_train, "train"
+        )
+        for treefile in treefiles:
+            with open(treefile) as h_treefile:
+                for line in h_treefile:
+                    tree = trainer.read_treebank_line(line)
+                    if tree is not None:
+                        digester.add(tree)
+                    # === END IF ===
+                # === END FOR line ===
+            # === END WITH h_treefile ===
+        # === END FOR treefile ===
+        digester.dump()
+
+        # The same indexers as supertagger.jsonnet
+        token_indexers = {
+            "tokens": allti.SingleIdTokenIndexer(lowercase_tokens = False),
+            "token_characters": allti.TokenCharactersIndexer(
+                character_tokenizer = alltok.CharacterTokenizer(
+                    end_tokens = ["@@PADDING@@"] * 4
+                )
+            ),
+        }
+        reader = sharded_dataset.ShardedSupertaggingDatasetReader(
+            lazy = True, token_indexers = token_indexers
+        )
+        vocab = allv.Vocabulary.from_instances(
+            reader.read(str(dir_train / "traindata.json"))
+        )
+
+        start = time.perf_counter()
+        sharded_dataset.write_shards(
+            dir_train / "traindata.json", dir_tmp / "shards", vocab
+        )
+        sys.stdout.write(
+            f"{count} trees, sharded in {time.perf_counter() - start:.4f} s\n"
+        )
+
+        for name, path in (
+            ("traindata.json", dir_train / "traindata.json"),
+            ("shards", dir_tmp / "shards"),
+        ):
+            def run() -> None:
+                for instance in reader.read(str(path)):
+                    instance.index_fields(vocab)
+                # === END FOR instance ===
+            # === END ===
+
+            report(
+                f"epoch from {name}",
+                measure(run, args.repeat),
+                count, "sentences"
+            )
+        # === END FOR name, path ===
+    # === END WITH dir_tmp ===
+# === END ===
+
+def bench_abct(args: argparse.Namespace) -> None:
+    """
+        Compare the recursive "abct" writer (`dump_tree_ABCT`
+        on the JSON representations of the trees)
+        with the buffered one (`render_tree_ABCT`)
+        on the trees of the test sentences in `tests/` parsed by a model.
+    """
+    import io
+    parser = load_script("parser")
+
+    sentences = [
+        [sentence] 
+        for sentence in load_test_sentences(args.tests)
+    ]
+    tagged_doc, doc = parser.annotate_using_janome(sentences, tokenize = True)
+    parsed_trees = parser.load_parser(args.model).parse_doc(doc)
+
+    # Emulate a large output by repeating the parsed sentences
+    corpus = list(zip(tagged_doc, parsed_trees)) * args.copies
+    n_trees = sum(len(nbest) for _, nbest in corpus)
+    sys.stdout.write(f"{len(corpus)} sentences, {n_trees} trees\n")
+
+    def run_recursive() -> str:
+        stream = io.StringIO()
+        for i, (tokens, nbest) in enumerate(corpus, 1):
+            for tree, prob in nbest:
+                parser.dump_tree_ABCT(
+                    {
+                        "type": "ROOT",
+                        "cat": "TOP",
+                        "children": [
+                            {
+                                "cat": "COMMENT",
+                                "surf": f"{{probability={prob}}}"
+                            },
+                            tree.json(tokens = tokens),
+                            {
+                                "cat": "ID",
+                                "surf": str(i)
+                            }
+                        ]
+                    },
+                    stream
+                )
+                stream.write("\n")
+            # === END FOR tree, prob ===
+        # === END FOR i ===
+        return stream.getvalue()
+    # === END ===
+
+    def run_buffered() -> str:
+        stream = io.StringIO()
+        buffer: typing.List[str] = []
+        for i, (tokens, nbest) in enumerate(corpus, 1):
+            for tree, prob in nbest:
+                parser.render_tree_ABCT(tree, tokens, prob, i, buffer)
+            # === END FOR tree, prob ===
+        # === END FOR i ===
+        stream.write("".join(buffer))
+        return stream.getvalue()
+    # === END ===
+
+    # Check the identity of the outputs first
+    if run_recursive() != run_buffered():
+        raise AssertionError("The outputs of the writers differ")
+    # === END IF ===
+    sys.stdout.write("outputs identical\n")
+
+    report(
+        "recursive (via JSON)",
+        measure(run_recursive, args.repeat),
+        n_trees, "trees"
+    )
+    report(
+        "buffered (explicit stack)",
+        measure(run_buffered, args.repeat),
+        n_trees, "trees"
+    )
+# === END ===
+
+def bench_batching(args: argparse.Namespace) -> None:
+    """
+        Compare the throughput of parsing with the supertagger batches
+        of `--batchsize` sentences in the input order
+        with that of the length-bucketed batches within token budgets
+        on a mixed-length corpus made from the test sentences in `tests/`:
+        most sentences are as they are,
+        and some are concatenations of several ones up to 250 tokens.
+    """
+    parser = load_script("parser")
+    doc = make_mixed_corpus(
+        parser, args.tests, args.sentences, args.long_ratio
+    )
+
+    lazy_parser = parser.LazyParser(args.model)
+    # Load the model outside of the measurement
+    lazy_parser.get()
+    lazy_parser.get_tagger()
+
+    for token_budget in [0] + args.token_budgets:
+        lazy_parser.token_budget = token_budget
+        report(
+            (
+                f"batchsize {args.batchsize}" 
+                if token_budget == 0 
+                else f"token budget {token_budget}"
+            ),
+            measure(
+                lambda: lazy_parser.parse_doc(doc, batchsize = args.batchsize),
+                args.repeat
+            ),
+            len(doc), "sents"
+        )
+    # === END FOR token_budget ===
+# === END ===
+
+def bench_budget(args: argparse.Namespace) -> None:
+    """
+        Compare the per-sentence latency of parsing without a time budget
+        with that within time budgets (see `parser.LazyParser`)
+        on a mixed-length corpus (see `make_mixed_corpus`).
+        The sentences are parsed one by one,
+        and the percentiles of the latencies are reported
+        together with the numbers of the sentences parsed at each stage
+        (or those which fail to be parsed if there is no budget).
+        The long sentences exceed the limit of 250 tokens of the parser
+        by default, so that they reach the stage "frag".
+    """
+    parser = load_script("parser")
+    doc = make_mixed_corpus(
+        parser, args.tests, args.sentences, args.long_ratio, args.long_length
+    )
+
+    for time_budget in [0.0] + args.time_budgets:
+        lazy_parser = parser.LazyParser(args.model, time_budget = time_budget)
+        # Load the model outside of the measurement
+        lazy_parser.get()
+        lazy_parser.get_tagger()
+        if time_budget > 0:
+            lazy_parser.get_fallback()
+        # === END IF ===
+
+        latencies: typing.List[float] = []
+        failures = 0
+        for sentence in doc:
+            start = time.perf_counter()
+            parsed = lazy_parser.parse_doc([sentence])
+            latencies.append(time.perf_counter() - start)
+            failures += parser.is_failed_parse(parsed[0], sentence)
+        # === END FOR sentence ===
+
+        latencies.sort()
+        p50, p99 = (
+            latencies[min(len(latencies) - 1, len(latencies) * q // 100)]
+            for q in (50, 99)
+        )
+        if time_budget <= 0:
+            name = "no budget"
+            stages = f"failed {failures}"
+        else:
+            name = f"time budget {time_budget} s"
+            stages = ", ".join(
+                f"{stage} {count}" 
+                for stage, count in lazy_parser.stage_counts.items()
+            )
+        # === END IF ===
+
+        sys.stdout.write(
+            f"{name:<32} p50 {p50 * 1000:8.1f} ms  p99 {p99 * 1000:8.1f} ms  "
+            f"max {latencies[-1] * 1000:8.1f} ms  {stages}\n"
+        )
+    # === END FOR time_budget ===
+# === END ===
+
+# ======
+# Commandline wrappers
+# ======
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        "Benchmarks for the ABC Treebank depccg scripts"
+    )
+    arg_parser.set_defaults(func = lambda _: arg_parser.print_help())
+    subparsers = arg_parser.add_subparsers()
+
+    arg_parser.add_argument(
+        "--repeat",
+        type = int,
+        default = 3,
+        help = "the number of runs of which the best one is reported"
+    )
+
+    p_cat = subparsers.add_parser(
+        "cat",
+        help = "category translation (parsy vs. hand-written)"
+    )
+    p_cat.add_argument(
+        "target",
+        help = "path to a target.txt of a digested treebank"
+    )
+    p_cat.add_argument(
+        "--occurrences",
+        type = int,
+        default = 20,
+        help = "how many times each category occurs"
+    )
+    p_cat.set_defaults(func = bench_cat)
+
+    p_server = subparsers.add_parser(
+        "server",
+        help = "parse latency (cold start vs. parsing server)"
+    )
+    p_server.add_argument(
+        "--model",
+        required = True,
+        help = "path to a model directory (for cold starts)"
+    )
+    p_server.add_argument(
+        "--url",
+        default = "http://127.0.0.1:8300/",
+        help = "URL of a running parsing server started with the same model"
+    )
+    p_server.add_argument(
+        "--input",
+        default = "太郎 が 走っ た",
+        help = "sentence to parse"
+    )
+    p_server.add_argument(
+        "--tokenize",
+        action = "store_true",
+        help = "tokenize the sentence"
+    )
+    p_server.add_argument(
+        "--runs",
+        type = int,
+        default = 5,
+        help = "the number of requests for each mode"
+    )
+    p_server.set_defaults(func = bench_server)
+
+    p_workers = subparsers.add_parser(
+        "workers",
+        help = "scaling of multi-process parsing"
+    )
+    p_workers.add_argument(
+        "--model",
+        required = True,
+        help = "path to a model directory"
+    )
+    p_workers.add_argument(
+        "--workers",
+        type = int,
+        nargs = "+",
+        default = [1, 2, 4, 8],
+        help = "the numbers of workers to try"
+    )
+    p_workers.add_argument(
+        "--tests",
+        default = str(DIR_TESTS),
+        help = "directory of the test sentences"
+    )
+    p_workers.add_argument(
+        "--copies",
+        type = int,
+        default = 1,
+        help = "how many times the test sentences are repeated"
+    )
+    p_workers.add_argument(
+        "--batchsize",
+        type = int,
+        default = 32,
+        help = "batchsize in supertagger (and shard size)"
+    )
+    p_workers.set_defaults(func = bench_workers)
+
+    p_userdic = subparsers.add_parser(
+        "userdic",
+        help = "time to build the Janome user dictionary"
+    )
+    p_userdic.set_defaults(func = bench_userdic)
+
+    p_tokenize = subparsers.add_parser(
+        "tokenize",
+        help = "throughput of serial vs. pooled Janome tokenization"
+    )
+    p_tokenize.add_argument(
+        "--workers",
+        type = int,
+        nargs = "+",
+        default = [1, 2, 4, 8],
+        help = "the numbers of tokenizer processes to try (1 for serial)"
+    )
+    p_tokenize.add_argument(
+        "--tests",
+        default = str(DIR_TESTS),
+        help = "directory of the test sentences"
+    )
+    p_tokenize.add_argument(
+        "--copies",
+        type = int,
+        default = 50,
+        help = "how many times the test sentences are repeated"
+    )
+    p_tokenize.set_defaults(func = bench_tokenize)
+
+    p_preprocess = subparsers.add_parser(
+        "preprocess",
+        help = "treebank preprocessing of the trainer on a synthetic treebank"
+    )
+    p_preprocess.add_argument(
+        "--files",
+        type = int,
+        default = 50,
+        help = "the number of .psd files of the synthetic treebank"
+    )
+    p_preprocess.add_argument(
+        "--trees",
+        type = int,
+        default = 1000,
+        help = "the number of trees in each file"
+    )
+    p_preprocess.add_argument(
+        "--workers",
+        type = int,
+        nargs = "+",
+        default = [1, 2, 4, 8],
+        help = "the numbers of workers to try"
+    )
+    p_preprocess.set_defaults(func = bench_preprocess)
+
+    p_epoch = subparsers.add_parser(
+        "epoch",
+        help = "loading of the training data in an epoch (JSON vs. shards)"
+    )
+    p_epoch.add_argument(
+        "--files",
+        type = int,
+        default = 10,
+        help = "the number of .psd files of the synthetic treebank"
+    )
+    p_epoch.add_argument(
+        "--trees",
+        type = int,
+        default = 1000,
+        help = "the number of trees in each file"
+    )
+    p_epoch.set_defaults(func = bench_epoch)
+
+    p_abct = subparsers.add_parser(
+        "abct",
+        help = "writing of trees in the abct format (recursive vs. buffered)"
+    )
+    p_abct.add_argument(
+        "--model",
+        required = True,
+        help = "path to a model directory"
+    )
+    p_abct.add_argument(
+        "--tests",
+        default = str(DIR_TESTS),
+        help = "directory of the test sentences"
+    )
+    p_abct.add_argument(
+        "--copies",
+        type = int,
+        default = 20,
+        help = "how many times the parsed sentences are repeated"
+    )
+    p_abct.set_defaults(func = bench_abct)
+
+    p_batching = subparsers.add_parser(
+        "batching",
+        help = "parsing with fixed-size vs. length-bucketed supertagger batches"
+    )
+    p_batching.add_argument(
+        "--model",
+        required = True,
+        help = "path to a model directory"
+    )
+    p_batching.add_argument(
+        "--tests",
+        default = str(DIR_TESTS),
+        help = "directory of the test sentences"
+    )
+    p_batching.add_argument(
+        "--sentences",
+        type = int,
+        default = 2000,
+        help = "the number of sentences of the corpus"
+    )
+    p_batching.add_argument(
+        "--long-ratio",
+        type = float,
+        default = 0.05,
+        help = "the ratio of the long sentences in the corpus"
+    )
+    p_batching.add_argument(
+        "--batchsize",
+        type = int,
+        default = 32,
+        help = "batchsize in supertagger (and the maximum in a bucket)"
+    )
+    p_batching.add_argument(
+        "--token-budgets",
+        type = int,
+        nargs = "+",
+        default = [1024, 2048, 4096, 8192],
+        help = "the token budgets to try"
+    )
+    p_batching.set_defaults(func = bench_batching)
+
+    p_budget = subparsers.add_parser(
+        "budget",
+        help = "per-sentence parse latency without vs. within time budgets"
+    )
+    p_budget.add_argument(
+        "--model",
+        required = True,
+        help = "path to a model directory"
+    )
+    p_budget.add_argument(
+        "--tests",
+        default = str(DIR_TESTS),
+        help = "directory of the test sentences"
+    )
+    p_budget.add_argument(
+        "--sentences",
+        type = int,
+        default = 500,
+        help = "the number of sentences of the corpus"
+    )
+    p_budget.add_argument(
+        "--long-ratio",
+        type = float,
+        default = 0.05,
+        help = "the ratio of the long sentences in the corpus"
+    )
+    p_budget.add_argument(
+        "--long-length",
+        type = int,
+        default = 300,
+        help = "the number of the tokens of the long sentences in the corpus"
+    )
+    p_budget.add_argument(
+        "--time-budgets",
+        type = float,
+        nargs = "+",
+        default = [0.5, 1.0, 2.0],
+        help = "the time budgets in seconds to try"
+    )
+    p_budget.set_defaults(func = bench_budget)
+
+    args = arg_parser.parse_args()
+    args.func(args)
+# === END IF ===
@@ -0,0 +1,240 @@
+#!/usr/bin/python3
+"""
+A size-bounded on-disk LRU cache shared by the caches of `parser.py`.
+"""
+
+import typing
+import os
+import sys
+import sqlite3
+import pathlib
+import time
+
+class SQLiteLRUCache:
+    """
+    A size-bounded LRU cache from strings to byte strings
+        stored in an SQLite database.
+    The least recently used entries are evicted
+        when the total size of the values exceeds `max_bytes`.
+
+    The database can be shared by multiple processes.
+    Each process opens its own connection.
+    The total size of the values is kept in the table `meta`
+        by triggers on `entries`,
+        so that storing values does not scan the whole cache.
+    Failures of the database (e.g. a read-only directory)
+        disable the cache with a warning instead of stopping the caller.
+
+    Attributes
+    ----------
+    path : pathlib.Path
+        The path to the database.
+    max_bytes : int
+        The maximum total size of the values.
+    hits : int
+        The number of keys found in this process.
+    misses : int
+        The number of keys not found in this process.
+    """
+
+    """
+    The maximum number of keys in a single SQL statement.
+    """
+    CHUNK_SIZE: int = 500
+
+    def __init__(
+        self,
+        path: typing.Union[str, pathlib.Path],
+        max_bytes: int
+    ):
+        self.path = pathlib.Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._conn: typing.Optional[sqlite3.Connection] = None
+        self._pid: typing.Optional[int] = None
+        self._disabled = False
+    # === END ===
+
+    def _connect(self) -> typing.Optional[sqlite3.Connection]:
+        if self._disabled:
+            return None
+        # === END IF ===
+
+        # A connection cannot be shared with forked processes
+        if self._conn is None or self._pid != os.getpid():
+            try:
+                self.path.parent.mkdir(parents = True, exist_ok = True)
+                conn = sqlite3.connect(str(self.path), timeout = 60)
+                # INSERT OR REPLACEで置き換えられる行にも削除のトリガーを発火させる
+                conn.execute("PRAGMA recursive_triggers = ON")
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS entries ("
+                        "key TEXT PRIMARY KEY, "
+                        "value BLOB NOT NULL, "
+                        "size INTEGER NOT NULL, "
+                        "atime REAL NOT NULL)"
+                    )
+                    conn.execute(
+                        "CREATE INDEX IF NOT EXISTS entries_atime ON entries (atime)"
+                    )
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS meta ("
+                        "key TEXT PRIMARY KEY, "
+                        "value INTEGER NOT NULL)"
+                    )
+                    # 以前のデータベースでは，合計を一度だけ数える
+                    conn.execute(
+                        "INSERT OR IGNORE INTO meta (key, value) "
+                        "SELECT 'total_size', COALESCE(SUM(size), 0) FROM entries"
+                    )
+                    conn.execute(
+                        "CREATE TRIGGER IF NOT EXISTS entries_insert "
+                        "AFTER INSERT ON entries BEGIN "
+                        "UPDATE meta SET value = value + NEW.size WHERE key = 'total_size'; "
+                        "END"
+                    )
+                    conn.execute(
+                        "CREATE TRIGGER IF NOT EXISTS entries_delete "
+                        "AFTER DELETE ON entries BEGIN "
+                        "UPDATE meta SET value = value - OLD.size WHERE key = 'total_size'; "
+                        "END"
+                    )
+                    conn.execute(
+                        "CREATE TRIGGER IF NOT EXISTS entries_update "
+                        "AFTER UPDATE OF size ON entries BEGIN "
+                        "UPDATE meta SET value = value - OLD.size + NEW.size WHERE key = 'total_size'; "
+                        "END"
+                    )
+                # === END WITH conn ===
+            except (sqlite3.Error, OSError) as e:
+                self._fail(e)
+                return None
+            # === END TRY ===
+
+            self._conn = conn
+            self._pid = os.getpid()
+        # === END IF ===
+
+        return self._conn
+    # === END ===
+
+    def _fail(self, e: Exception) -> typing.NoReturn:
+        sys.stderr.write(f"[Cache] Disable the cache {self.path}: {e}\n")
+        self._disabled = True
+        self._conn = None
+    # === END ===
+
+    def get_many(self, keys: typing.Iterable[str]) -> typing.Dict[str, bytes]:
+        """
+        Look up keys and mark the found ones as recently used.
+
+        Returns
+        -------
+        found : typing.Dict[str, bytes]
+            The values of the keys found.
+        """
+        keys = list(dict.fromkeys(keys))
+        res: typing.Dict[str, bytes] = {}
+        conn = self._connect()
+
+        if conn is not None:
+            try:
+                with conn:
+                    for i in range(0, len(keys), self.CHUNK_SIZE):
+                        chunk = keys[i:i + self.CHUNK_SIZE]
+                        placeholders = ",".join("?" * len(chunk))
+                        res.update(
+                            conn.execute(
+                                f"SELECT key, value FROM entries WHERE key IN ({placeholders})",
+                                chunk
+                            )
+                        )
+                    # === END FOR i ===
+
+                    now = time.time()
+                    conn.executemany(
+                        "UPDATE entries SET atime = ? WHERE key = ?",
+                        ((now, key) for key in res)
+                    )
+                # === END WITH conn ===
+            except sqlite3.Error as e:
+                self._fail(e)
+                res = {}
+            # === END TRY ===
+        # === END IF ===
+
+        self.hits += len(res)
+        self.misses += len(keys) - len(res)
+        return res
+    # === END ===
+
+    def get(self, key: str) -> typing.Optional[bytes]:
+        return self.get_many((key, )).get(key)
+    # === END ===
+
+    def put_many(self, items: typing.Dict[str, bytes]) -> typing.NoReturn:
+        """
+        Store values and evict the least recently used entries if necessary.
+        """
+        conn = self._connect()
+
+        if conn is None or not items:
+            return
+        # === END IF ===
+
+        try:
+            with conn:
+                now = time.time()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO entries (key, value, size, atime) VALUES (?, ?, ?, ?)",
+                    (
+                        (key, value, len(value), now)
+                        for key, value in items.items()
+                    )
+                )
+                self._evict(conn)
+            # === END WITH conn ===
+        except sqlite3.Error as e:
+            self._fail(e)
+        # === END TRY ===
+    # === END ===
+
+    def put(self, key: str, value: bytes) -> typing.NoReturn:
+        self.put_many({key: value})
+    # === END ===
+
+    def _evict(self, conn: sqlite3.Connection) -> typing.NoReturn:
+        (total, ) = conn.execute(
+            "SELECT value FROM meta WHERE key = 'total_size'"
+        ).fetchone()
+
+        if total <= self.max_bytes:
+            return
+        # === END IF ===
+
+        evicted: typing.List[typing.Tuple[str]] = []
+        for key, size in conn.execute(
+            "SELECT key, size FROM entries ORDER BY atime ASC"
+        ):
+            if total <= self.max_bytes:
+                break
+            # === END IF ===
+            evicted.append((key, ))
+            total -= size
+        # === END FOR ===
+
+        conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+    # === END ===
+
+    def stats(self) -> str:
+        """
+        A one-line summary of the hits and misses in this process.
+        """
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return f"{self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate)"
+    # === END ===
+# === END CLASS ===
@@ -0,0 +1,308 @@
+#!/usr/bin/python3
+"""
+Interned CG categories shared by `parser.py` and `trainer.py`.
+"""
+
+import typing
+import functools
+import re
+
+# ======
+# 1. Category Objects
+# ======
+"""
+A tranalation table that translates atomic categories in the depccg format
+    to those in the ABC Treebank format.
+In fact, what this does is just get rid of brackets.
+
+Examples
+--------
+"S[m]" -> "Sm"
+"""
+CAT_BASE_trans_table: typing.Dict[int, str] = (
+    str.maketrans(
+        {
+            "[": "",
+            "]": ""
+        }
+    )
+)
+
+class Category:
+    """
+    An immutable and hash-consed CG category.
+    Structurally identical categories are always one and the same instance,
+        so that equality checks and hashing are done by identity in O(1).
+
+    Instances are made only through `Category.base`, `Category.left`,
+        `Category.right` or `parse_category`.
+
+    Attributes
+    ----------
+    type : str
+        "BASE", "L" (left functor) or "R" (right functor).
+    lit : str, optional
+        The atomic category in the depccg format. None for functors.
+    antecedent : Category, optional
+        The argument of a functor. None for atomic categories.
+    consequence : Category, optional
+        The result of a functor. None for atomic categories.
+    depccg : str
+        The string representation in the depccg format.
+    tlg : str
+        The string representation in the ABC Treebank format.
+    """
+
+    __slots__ = (
+        "type", "lit", "antecedent", "consequence",
+        "depccg", "tlg"
+    )
+
+    _table: typing.Dict[tuple, "Category"] = {}
+
+    def __new__(
+        cls,
+        type: str,
+        lit: typing.Optional[str] = None,
+        antecedent: typing.Optional["Category"] = None,
+        consequence: typing.Optional["Category"] = None,
+    ) -> "Category":
+        # The children are interned, so the key is hashed in O(1)
+        key = (type, lit, antecedent, consequence)
+        self = cls._table.get(key)
+
+        if self is None:
+            self = object.__new__(cls)
+            init = functools.partial(object.__setattr__, self)
+            init("type", type)
+            init("lit", lit)
+            init("antecedent", antecedent)
+            init("consequence", consequence)
+
+            if type == "L":
+                init(
+                    "depccg",
+                    f"{consequence._depccg_bracketed()}\\{antecedent._depccg_bracketed()}"
+                )
+                init("tlg", f"<{antecedent.tlg}\\{consequence.tlg}>")
+            elif type == "R":
+                init(
+                    "depccg",
+                    f"{consequence._depccg_bracketed()}/{antecedent._depccg_bracketed()}"
+                )
+                init("tlg", f"<{consequence.tlg}/{antecedent.tlg}>")
+            else:
+                init("depccg", lit)
+                init("tlg", lit.translate(CAT_BASE_trans_table))
+            # === END IF ===
+
+            cls._table[key] = self
+        # === END IF ===
+
+        return self
+    # === END ===
+
+    @classmethod
+    def base(cls, lit: str) -> "Category":
+        """
+        Get the atomic category `lit` (in the depccg format).
+        """
+        return cls("BASE", lit = lit)
+    # === END ===
+
+    @classmethod
+    def left(cls, antecedent: "Category", consequence: "Category") -> "Category":
+        """
+        Get the left functor `consequence\\antecedent` (in the depccg format).
+        """
+        return cls("L", antecedent = antecedent, consequence = consequence)
+    # === END ===
+
+    @classmethod
+    def right(cls, antecedent: "Category", consequence: "Category") -> "Category":
+        """
+        Get the right functor `consequence/antecedent` (in the depccg format).
+        """
+        return cls("R", antecedent = antecedent, consequence = consequence)
+    # === END ===
+
+    def is_functor(self) -> bool:
+        return self.type != "BASE"
+    # === END ===
+
+    def _depccg_bracketed(self) -> str:
+        return f"({self.depccg})" if self.is_functor() else self.depccg
+    # === END ===
+
+    def as_dict(self) -> dict:
+        """
+        Convert the category into the abstract representation
+            returned by `parser.parse_cat`.
+        """
+        if self.is_functor():
+            return {
+                "type": self.type,
+                "antecedent": self.antecedent.as_dict(),
+                "consequence": self.consequence.as_dict(),
+            }
+        else:
+            return {
+                "type": "BASE",
+                "lit": self.tlg,
+            }
+        # === END IF ===
+    # === END ===
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Category is immutable")
+    # === END ===
+
+    def __delattr__(self, name):
+        raise AttributeError("Category is immutable")
+    # === END ===
+
+    def __reduce__(self):
+        # Re-intern the category when unpickled
+        return (
+            Category,
+            (self.type, self.lit, self.antecedent, self.consequence)
+        )
+    # === END ===
+
+    def __str__(self) -> str:
+        return self.depccg
+    # === END ===
+
+    def __repr__(self) -> str:
+        return f"Category({self.depccg!r})"
+    # === END ===
+# === END CLASS ===
+
+# ======
+# 2. Category Parser
+# ======
+"""
+A tokenizer of depccg categories.
+Every character of the input belongs to some token,
+    so the tokens always concatenate back to the input.
+"""
+CAT_TOKEN_RE: typing.Pattern = re.compile(r"[^()\\/]+|[()\\/]")
+
+"""
+The maximum number of distinct category strings
+    whose parses are memoized.
+"""
+CAT_CACHE_SIZE: int = 16384
+
+def _parse_category_left(
+    tokens: typing.List[str],
+    pos: int
+) -> typing.Tuple[Category, int]:
+    """
+    Parse a left-functor category beginning at `pos` in `tokens`.
+    This is the hand-written counterpart of `parser.pCAT_COMP_LEFT`.
+
+    Returns
+    -------
+    res : Category
+        The parsed category.
+    pos : int
+        The position of the first token not consumed.
+    """
+    res, pos = _parse_category_right(tokens, pos)
+
+    while pos < len(tokens) and tokens[pos] == "\\":
+        ante, pos = _parse_category_right(tokens, pos + 1)
+        res = Category.left(ante, res)
+    # === END WHILE ===
+
+    return res, pos
+# === END ===
+
+def _parse_category_right(
+    tokens: typing.List[str],
+    pos: int
+) -> typing.Tuple[Category, int]:
+    """
+    Parse a right-functor category beginning at `pos` in `tokens`.
+    This is the hand-written counterpart of `parser.pCAT_COMP_RIGHT`.
+    """
+    res, pos = _parse_category_atom(tokens, pos)
+
+    while pos < len(tokens) and tokens[pos] == "/":
+        ante, pos = _parse_category_atom(tokens, pos + 1)
+        res = Category.right(ante, res)
+    # === END WHILE ===
+
+    return res, pos
+# === END ===
+
+def _parse_category_atom(
+    tokens: typing.List[str],
+    pos: int
+) -> typing.Tuple[Category, int]:
+    """
+    Parse an atomic or a parenthesized category
+        beginning at `pos` in `tokens`.
+    This is the hand-written counterpart of
+        `parser.pCAT_BASE | parser.pCAT_PAR`.
+    """
+    if pos >= len(tokens):
+        raise ValueError("Unexpected end of a category")
+    # === END IF ===
+
+    token = tokens[pos]
+    if token == "(":
+        res, pos = _parse_category_left(tokens, pos + 1)
+
+        if pos >= len(tokens) or tokens[pos] != ")":
+            raise ValueError("Unbalanced parentheses in a category")
+        # === END IF ===
+
+        return res, pos + 1
+    elif token in (")", "\\", "/"):
+        raise ValueError(f"Unexpected token '{token}' in a category")
+    else:
+        return Category.base(token), pos + 1
+    # === END IF ===
+# === END ===
+
+@functools.lru_cache(maxsize = CAT_CACHE_SIZE)
+def parse_category(text: str) -> Category:
+    """
+    Parse a depccg category into an interned category object.
+    The parsing is done in a single pass by a hand-written parser
+        and the results are memoized.
+
+    Parameters
+    ----------
+    text : str
+        A string representation of an depccg category.
+
+    Returns
+    -------
+    res : Category
+        The interned category.
+
+    Examples
+    --------
+    >>> parse_category("(S[m]/S[m])/(S[p]\\PP[s]\\PP[o])").tlg
+    '<<Sm/Sm>/<PPo\\<PPs\\Sp>>>'
+    >>> parse_category("S[m]\\PP[s]\\PP[o]").depccg
+    '(S[m]\\PP[s])\\PP[o]'
+    >>> parse_category("S[m]\\PP[s]\\PP[o]") is parse_category("(S[m]\\PP[s])\\PP[o]")
+    True
+
+    Notes
+    --------
+    A ValueError is raised if the input is not a well-formed category.
+    """
+    tokens = CAT_TOKEN_RE.findall(text)
+    res, pos = _parse_category_left(tokens, 0)
+
+    if pos != len(tokens):
+        raise ValueError(f"Trailing tokens in the category '{text}'")
+    # === END IF ===
+
+    return res
+# === END ===
@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+"""
+    A client of the parsing server (`parser.py --serve`).
+    Sentences are read from `--input` or STDIN
+    and the trees are written to STDOUT.
+"""
+import typing
+import argparse
+import sys
+import json
+import urllib.request
+import urllib.error
+
+def request_parse(
+    url: str,
+    text: str,
+    format: typing.Optional[str] = None,
+    tokenize: typing.Optional[bool] = None,
+    timeout: typing.Optional[float] = None
+) -> str:
+    """
+        Send sentences to the parsing server and get the trees.
+
+        Parameters
+        ----------
+        url : str
+            The URL of the server, e.g. "http://127.0.0.1:8300/".
+        text : str
+            Sentences separated by newlines.
+        format : str, optional
+            The output format. The server default if None.
+        tokenize : bool, optional
+            Whether to tokenize the sentences. The server default if None.
+
+        Returns
+        -------
+        trees : str
+            The output of the parser.
+    """
+    request: typing.Dict[str, typing.Any] = {"input": text}
+    if format is not None:
+        request["format"] = format
+    # === END IF ===
+    if tokenize is not None:
+        request["tokenize"] = tokenize
+    # === END IF ===
+
+    req = urllib.request.Request(
+        url,
+        data = json.dumps(request).encode("utf-8"),
+        headers = {"Content-Type": "application/json"},
+        method = "POST"
+    )
+
+    with urllib.request.urlopen(req, timeout = timeout) as res:
+        return res.read().decode("utf-8")
+    # === END WITH res ===
+# === END ===
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        "A client of the A* CCG parsing server"
+    )
+    arg_parser.add_argument(
+        "-u", "--url",
+        default = "http://127.0.0.1:8300/",
+        help = "URL of the parsing server"
+    )
+    arg_parser.add_argument(
+        "-i", "--input",
+        default = None,
+        help = "input to parse"
+    )
+    arg_parser.add_argument(
+        "-f", "--format",
+        default = None,
+        help = "output format (the server default if omitted)"
+    )
+    arg_parser.add_argument(
+        "--tokenize",
+        action = "store_true",
+        default = None,
+        help = "tokenize input sentences"
+    )
+
+    args = arg_parser.parse_args()
+
+    text: str = sys.stdin.read() if args.input is None else args.input
+
+    try:
+        sys.stdout.write(
+            request_parse(
+                args.url, text,
+                format = args.format,
+                tokenize = args.tokenize
+            )
+        )
+    except urllib.error.HTTPError as e:
+        sys.stderr.write(f"[Client] {e.code}: {e.read().decode('utf-8')}")
+        sys.exit(1)
+    # === END TRY ===
+# === END IF ===
@@ -4,13 +4,55 @@ import typing
 
 from collections import namedtuple
 import itertools
+import functools
 import argparse
 import sys
 import os
 import json
-import re
 import parsy
 import pathlib
+import contextlib
+import zipfile
+
+from category import Category, parse_category
+from cache import SQLiteLRUCache
+from profiler import ParseProfiler
+
+__Profiler: ParseProfiler = None
+
+def start_profiler(per_sentence: bool = False) -> ParseProfiler:
+    """
+    Start profiling the parse path (see `profile_stage`).
+    If `per_sentence`, the sentences are parsed one by one
+        to record the latency of each of them
+        (which the sentences parsed within a time budget always record).
+    """
+    global __Profiler
+
+    __Profiler = ParseProfiler(per_sentence = per_sentence)
+    return __Profiler
+# === END ===
+
+def get_profiler() -> typing.Optional[ParseProfiler]:
+    """
+    Get the profiler of the parse path. None unless profiling.
+    """
+    return __Profiler
+# === END ===
+
+@contextlib.contextmanager
+def profile_stage(name: str) -> typing.Iterator[None]:
+    """
+    Measure the wall time of a stage of the parse path if profiling.
+    """
+    if __Profiler is None:
+        yield
+    else:
+        with __Profiler.stage(name):
+            yield
+        # === END WITH ===
+    # === END IF ===
+# === END ===
 
 # ======
 # 1. Category Parser and Translators
@@ -193,14 +235,15 @@ def parse_cat(text: str) -> dict:
     return pCAT.parse(text)
 # === END ===
 
-def translate_cat_TLG(cat: dict) -> str:
+def translate_cat_TLG(cat: typing.Union[dict, Category]) -> str:
     """
     Print an abstract representation of a CG category in the ABC Treebank format.
 
     Parameters
     ----------
-    cat : dict
-        An abstract representation of a CG category.
+    cat : dict or Category
+        An abstract representation of a CG category,
+            or an interned category object.
     
     Returns
     -------
@@ -214,6 +257,10 @@ def translate_cat_TLG(cat: dict) -> str:
     '<<Sm/Sm>/<PPo\\<PPs\\Sp>>>'
     """
 
+    if isinstance(cat, Category):
+        return cat.tlg
+    # === END IF ===
+
     input_type = cat["type"]
     if input_type == "L":
         return f"<{translate_cat_TLG(cat['antecedent'])}\{translate_cat_TLG(cat['consequence'])}>"
@@ -224,7 +271,7 @@ def translate_cat_TLG(cat: dict) -> str:
     # === END IF ===
 # === END ===
 
-def parse_cat_translate_TLG(text: str):
+def parse_cat_translate_TLG(text: str) -> str:
     """
     Print an abstract representation of a CG category in the ABC Treebank format.
 
@@ -247,8 +294,14 @@ def parse_cat_translate_TLG(text: str):
     --------
     parse_cat_translate_TLG(str) == translate_cat_TLG(parse_cat(str))
 
+    The translation goes through `category.parse_category`,
+        which parses categories in a single pass with a hand-written parser
+        and memoizes the results,
+        since only a limited number of distinct categories 
+        come out of the supertagger.
+    A ValueError is raised if the input is not a well-formed category.
     """
-    return translate_cat_TLG(parse_cat(text))
+    return parse_category(text).tlg
 # === END ===
 
 # ======
@@ -282,6 +335,108 @@ def dump_tree_ABCT(tree: dict, stream: typing.TextIO) -> typing.NoReturn:
     # === END IF ===
 # === END ===
 
+def render_tree_ABCT(
+    tree: typing.Union["depccg.tree.Tree", dict],
+    tokens: typing.Optional[typing.List["depccg.tokens.Token"]],
+    prob: float,
+    tree_id: int,
+    buffer: typing.List[str],
+    stage: typing.Optional[str] = None
+) -> typing.List[str]:
+    """
+    Render a tree in the "abct" format into a buffer.
+    The output is the same as that of `dump_tree_ABCT`
+        on the JSON representation of the tree wrapped in a TOP node
+        with the COMMENT of the probability (and the stage) and the ID,
+        followed by a newline.
+    The tree is walked with an explicit stack
+        without materializing its JSON representation.
+
+    Parameters
+    ----------
+    tree : depccg.tree.Tree or dict
+        A tree from the parser
+            or its JSON representation from the parse cache.
+    tokens : typing.List[depccg.tokens.Token], optional
+        The tokens of the sentence, which give the words of the leaves.
+        Not used for JSON representations.
+    prob : float
+        The probability of the tree.
+    tree_id : int
+        The ID of the sentence.
+    buffer : typing.List[str]
+        The buffer to which the pieces of the output are appended.
+    stage : str, optional
+        The stage at which the tree is made (see PARSE_STAGES).
+
+    Returns
+    -------
+    buffer : typing.List[str]
+        `buffer` itself.
+    """
+    write = buffer.append
+    translate = parse_cat_translate_TLG
+    is_json = isinstance(tree, dict)
+    leaves = None if is_json else iter(tokens)
+
+    if stage is None:
+        write(f"({translate('TOP')} ({translate('COMMENT')} {{probability={prob}}}) ")
+    else:
+        write(f"({translate('TOP')} ({translate('COMMENT')} {{probability={prob},stage={stage}}}) ")
+    # === END IF ===
+
+    # Strings on the stack are written as they are
+    stack: typing.List[typing.Any] = [tree]
+    while stack:
+        node = stack.pop()
+
+        if isinstance(node, str):
+            write(node)
+            continue
+        # === END IF ===
+
+        if is_json:
+            cat = node["cat"]
+            children = node["children"] if "children" in node else None
+            leaf = node
+        elif node.is_leaf:
+            cat = str(node.cat)
+            children = None
+            leaf = next(leaves)
+        else:
+            cat = str(node.cat)
+            children = node.children
+        # === END IF ===
+
+        if children is None:
+            if "surf" in leaf:
+                word = leaf["surf"]
+            elif "word" in leaf:
+                word = leaf["word"]
+            else:
+                word = "ERROR"
+            # === END IF ===
+            write(f"({translate(cat)} {word})")
+        else:
+            write(f"({translate(cat)}")
+            stack.append(")")
+            for child in reversed(children):
+                stack.append(child)
+                stack.append(" ")
+            # === END FOR child ===
+        # === END IF ===
+    # === END WHILE ===
+
+    write(f" ({translate('ID')} {tree_id}))\n")
+    return buffer
+# === END ===
+
+"""
+The number of pieces of output buffered by `render_tree_ABCT`
+    before they are written at once.
+"""
+ABCT_BUFFER_SIZE: int = 1 << 16
+
 # =======
 # 3. Janome Tokenizers
 # ======
@@ -294,252 +449,216 @@ JanomeLexEntry = namedtuple(
     )
 )
 
-def generate_janome_userdic(
-    dic: typing.List[typing.Tuple[typing.Any]]
-) -> typing.Set[JanomeLexEntry]:
-    # ------
-    # collecting heads
-    # ------
-    # -- はず（名詞，非自立）
-    entries_hazu = [
-        JanomeLexEntry(*e)
-        for e in dic
-        if re.match(r"^(はず|ハズ|筈)$", e[7]) and re.match(r"名詞,非自立", e[4])
-    ]
+"""
+A specification of a class of head morphemes in the Janome system dictionary.
+An entry belongs to the class 
+    if its base form is one of `bases` or begins with one of `base_prefixes`,
+    and its part of speech begins with `pos_prefix`.
+"""
+JanomeHeadSpec = namedtuple(
+    "JanomeHeadSpec",
+    ("bases", "base_prefixes", "pos_prefix")
+)
+JanomeHeadSpec.__new__.__defaults__ = ((), (), "")
 
-    # -- か（終助詞）
-    entries_ka = [
-        JanomeLexEntry(*e)
-        for e in dic
-        if re.match(r"^か$", e[7])
-    ]
+"""
+A connective inserted between the prefix and the head of a modal.
+"""
+JanomeConnective = namedtuple(
+    "JanomeConnective",
+    ("surface", "base_form", "reading", "phonetic")
+)
 
-    # -- ない（形容詞）
-    entries_nai_adj = [
-        JanomeLexEntry(*e) 
-        for e in dic
-        if re.match(r"^(ない|無い)$", e[7]) and re.match(r"形容詞", e[4])
-    ]
+"""
+A family of modals, each of which is made of 
+    a prefix morpheme, a connective and a head morpheme.
+The entries of the family are generated for 
+    (prefix morphemes) × (connectives) × (head morphemes).
+
+Attributes
+----------
+prefix : str
+    The name of the head class of the prefix morphemes.
+derive_prefix : typing.Callable[[JanomeLexEntry], typing.Iterable[JanomeLexEntry]], optional
+    A function which derives prefix morphemes from the ones collected.
+connectives : typing.Tuple[JanomeConnective, ...]
+    The connectives.
+heads : typing.Tuple[str, ...]
+    The names of the head classes of the head morphemes.
+"""
+JanomeModalRule = namedtuple(
+    "JanomeModalRule",
+    ("prefix", "derive_prefix", "connectives", "heads")
+)
 
+"""
+The classes of morphemes collected from the Janome system dictionary.
+An entry belongs to a class if it satisfies any of the specifications.
+"""
+JANOME_HEAD_CLASSES: typing.Dict[str, typing.Tuple[JanomeHeadSpec, ...]] = {
+    # -- はず（名詞，非自立）
+    "hazu": (
+        JanomeHeadSpec(bases = ("はず", "ハズ", "筈"), pos_prefix = "名詞,非自立"),
+    ),
+    # -- か（終助詞）
+    "ka": (
+        JanomeHeadSpec(bases = ("か", ), pos_prefix = ""),
+    ),
+    # -- ない（形容詞）
+    "nai_adj": (
+        JanomeHeadSpec(bases = ("ない", "無い"), pos_prefix = "形容詞"),
+    ),
     # -- ない（助動詞）
     # -- ん（助動詞）
-    entries_nai_aux = [
-        JanomeLexEntry(*e)
-        for e in dic
-        if (
-            re.match(r"ん", e[7]) 
-            or (re.match(r"^ない$", e[7]) and re.match(r"助動詞", e[4]))
-        )
-    ]
-
+    "nai_aux": (
+        JanomeHeadSpec(base_prefixes = ("ん", ), pos_prefix = ""),
+        JanomeHeadSpec(bases = ("ない", ), pos_prefix = "助動詞"),
+    ),
     # -- ある（自立動詞）
-    entries_aru = [
-        JanomeLexEntry(*e)
-        for e in dic
-        if re.match(r"^(ある|有る)$", e[7]) and re.match(r"動詞,自立", e[4])
-    ]
+    "aru": (
+        JanomeHeadSpec(bases = ("ある", "有る"), pos_prefix = "動詞,自立"),
+    ),
+}
 
-    # ------
-    # generating entries
-    # ------
-    res: typing.Set[JanomeLexEntry] = set()
+class JanomeDicIndex:
+    """
+    An index of the entries of the Janome system dictionary 
+        that belong to any of the head classes,
+        keyed by their base forms.
+    It is built in a single pass over the dictionary.
+    """
 
-    # -- はずがない・ある
-    res.update(
-        head._replace(
-            surface = (
-                hazu.surface 
-                + case["surface"] 
-                + head.surface
-            ),
-            left_id = hazu.left_id,
-            # right_id = ,
-            cost = head.cost - 10000,
-            #pos_major = ,
-            #pos_minor1 = ,
-            #pos_minor2 = ,
-            #pos_minor3 = ,
-            #infl_type = ,
-            #infl_form =, 
-            base_form = (
-                hazu.base_form 
-                + case["base_form"] 
-                + head.base_form
-            ), 
-            reading = (
-                hazu.reading 
-                + case["reading"] 
-                + head.reading
-            ), 
-            phonetic = (
-                hazu.phonetic 
-                + case["phonetic"] 
-                + head.phonetic
+    def __init__(
+        self,
+        dic: typing.Iterable[typing.Tuple[typing.Any]],
+        head_classes: typing.Dict[str, typing.Tuple[JanomeHeadSpec, ...]] = JANOME_HEAD_CLASSES
+    ):
+        self.head_classes = head_classes
+
+        specs = tuple(itertools.chain.from_iterable(head_classes.values()))
+        bases: typing.Set[str] = set(
+            itertools.chain.from_iterable(spec.bases for spec in specs)
+        )
+        base_prefixes: typing.Tuple[str, ...] = tuple(
+            set(
+                itertools.chain.from_iterable(spec.base_prefixes for spec in specs)
             )
         )
-        for hazu in entries_hazu
-        for case in [
-            {
-                "surface": s,
-                "base_form": s,
-                "reading": r,
-                "phonetic": p
-            } for s, r, p in (
+
+        self.by_base: typing.Dict[str, typing.List[JanomeLexEntry]] = {}
+        for e in dic:
+            base_form = e[7]
+            if base_form in bases or base_form.startswith(base_prefixes):
+                self.by_base.setdefault(base_form, []).append(JanomeLexEntry(*e))
+            # === END IF ===
+        # === END FOR e ===
+    # === END ===
+
+    def lookup(self, head_class: str) -> typing.List[JanomeLexEntry]:
+        """
+        Get the entries belonging to the given head class.
+        """
+        res: typing.List[JanomeLexEntry] = []
+
+        for spec in self.head_classes[head_class]:
+            base_forms = itertools.chain(
+                spec.bases,
+                (
+                    base_form for base_form in self.by_base
+                    if spec.base_prefixes and base_form.startswith(spec.base_prefixes)
+                )
+            )
+            res.extend(
+                entry
+                for base_form in base_forms
+                for entry in self.by_base.get(base_form, ())
+                if entry.part_of_speech.startswith(spec.pos_prefix)
+            )
+        # === END FOR spec ===
+        
+        return res
+    # === END ===
+# === END CLASS ===
+
+def _derive_nakya_prefixes(nai_entry: JanomeLexEntry) -> typing.Iterator[JanomeLexEntry]:
+    """
+    Derive the prefix morphemes of なければ・なきゃ・ないと from a ない.
+
+    Notes
+    -----
+    The conditions look at `part_of_speech`, 
+        which carries no inflection information in Janome entries.
+    Thus nothing is derived at present.
+    """
+    if nai_entry.part_of_speech.startswith("仮定"):
+        if nai_entry.part_of_speech.startswith("縮約"):
+            for ba in ("ば", "バ"):
+                yield nai_entry._replace(
+                    surface = nai_entry.surface + ba,
+                    base_form = nai_entry.base_form + ba,
+                    reading = nai_entry.reading + "バ",
+                    phonetic = nai_entry.phonetic + "バ",
+                )
+            # === END FOR ba ===
+        else:
+            yield nai_entry
+        # === END IF ===
+    elif nai_entry.part_of_speech.startswith("基本"):
+        if nai_entry.part_of_speech.startswith("縮約"):
+            for to in ("と", "ト"):
+                yield nai_entry._replace(
+                    surface = nai_entry.surface + to,
+                    base_form = nai_entry.base_form + to,
+                    reading = nai_entry.reading + "ト",
+                    phonetic = nai_entry.phonetic + "ト",
+                )
+            # === END FOR to ===
+        # === END IF ===
+    # === END IF ===
+# === END ===
+
+"""
+The families of modals registered to the user dictionary.
+A new family is added by adding a rule (and head classes if necessary).
+"""
+JANOME_MODAL_RULES: typing.Tuple[JanomeModalRule, ...] = (
+    # -- はずがない・ある
+    JanomeModalRule(
+        prefix = "hazu",
+        derive_prefix = None,
+        connectives = tuple(
+            JanomeConnective(s, s, r, p) 
+            for s, r, p in (
                 ("が", "ガ", "ガ"), ("ガ", "ガ", "ガ"),
                 ("は", "ハ", "ワ"), ("ハ", "ハ", "ワ"),
                 ("も", "モ", "モ"), ("モ", "モ", "モ"),
                 ("の", "ノ", "ノ"), ("ノ", "ノ", "ノ"),
             )
-        ]
-        for head in itertools.chain(entries_nai_adj, entries_aru)
-    )
-
+        ),
+        heads = ("nai_adj", "aru"),
+    ),
     # -- かもしれない
-    res.update(
-        head._replace(
-            surface = (
-                ka.surface 
-                + case["surface"] 
-                + head.surface
-            ),
-            left_id = ka.left_id,
-            # right_id = ,
-            cost = head.cost - 10000,
-            #pos_major = ,
-            #pos_minor1 = ,
-            #pos_minor2 = ,
-            #pos_minor3 = ,
-            #infl_type = ,
-            #infl_form =, 
-            base_form = (
-                ka.base_form 
-                + case["base_form"] 
-                + head.base_form
-            ), 
-            reading = (
-                ka.reading 
-                + case["reading"] 
-                + head.reading
-            ), 
-            phonetic = (
-                ka.phonetic 
-                + case["phonetic"] 
-                + head.phonetic
-            )
-        )
-        for ka in entries_ka
-        for case in [
-            {
-                "surface": s,
-                "base_form": s,
-                "reading": "モシレ",
-                "phonetic": "モシレ"
-            } for s in (
+    JanomeModalRule(
+        prefix = "ka",
+        derive_prefix = None,
+        connectives = tuple(
+            JanomeConnective(s, s, "モシレ", "モシレ") 
+            for s in (
                 "もしれ",
                 "モシレ",
                 "も知れ",
                 "モ知レ"
             )
-        ]
-        for head in entries_nai_aux
-    )
-
-    def _iter_nakya(nai_entry: JanomeLexEntry) -> typing.Iterator[JanomeLexEntry]:
-        if re.match(r"仮定", nai_entry.part_of_speech):
-            if re.match(r"縮約", nai_entry.part_of_speech):
-                return (
-                    nai_entry._replace(
-                        surface = (
-                            nai_entry.surface 
-                            + ba["surface"]
-                        ),
-                        base_form = (
-                            nai_entry.base_form 
-                            + ba["base_form"] 
-                        ), 
-                        reading = (
-                            nai_entry.reading 
-                            + "バ"
-                        ), 
-                        phonetic = (
-                            nai_entry.phonetic 
-                            + "バ"
-                        )
-                    ) for ba in ("ば", "バ")
-                )
-            else:
-                yield nai_entry
-            # === END IF ===
-        elif re.match(r"基本", nai_entry.part_of_speech):
-            if re.match(r"縮約", nai_entry.part_of_speech):
-                return (
-                    nai_entry._replace(
-                        surface = (
-                            nai_entry.surface 
-                            + to["surface"]
-                        ),
-                        base_form = (
-                            nai_entry.base_form 
-                            + to["base_form"] 
-                        ), 
-                        reading = (
-                            nai_entry.reading 
-                            + "ト"
-                        ), 
-                        phonetic = (
-                            nai_entry.phonetic 
-                            + "ト"
-                        )
-                    ) for to in ("と", "ト")
-                )
-        else:
-            pass
-        # === END IF ===
-    # === END ===
-
+        ),
+        heads = ("nai_aux", ),
+    ),
     # -- なければならない
-    res.update(
-        head._replace(
-            surface = (
-                nakere.surface 
-                + case["surface"] 
-                + head.surface
-            ),
-            left_id = ka.left_id,
-            # right_id = ,
-            cost = head.cost - 10000,
-            #pos_major = ,
-            #pos_minor1 = ,
-            #pos_minor2 = ,
-            #pos_minor3 = ,
-            #infl_type = ,
-            #infl_form =, 
-            base_form = (
-                nakere.base_form 
-                + case["base_form"] 
-                + head.base_form
-            ), 
-            reading = (
-                nakere.reading 
-                + case["reading"] 
-                + head.reading
-            ), 
-            phonetic = (
-                nakere.phonetic 
-                + case["phonetic"] 
-                + head.phonetic
-            )
-        )
-        for nakere in itertools.chain.from_iterable(
-            _iter_nakya(nai) for nai in entries_nai_aux
-        )
-        for case in [
-            {
-                "surface": s,
-                "base_form": s,
-                "reading": rp,
-                "phonetic": rp 
-            } for s, rp in (
+    JanomeModalRule(
+        prefix = "nai_aux",
+        derive_prefix = _derive_nakya_prefixes,
+        connectives = tuple(
+            JanomeConnective(s, s, rp, rp) 
+            for s, rp in (
                 ("なら", "ナラ"),
                 ("ナラ", "ナラ"),
                 ("成ら", "ナラ"),
@@ -549,12 +668,176 @@ def generate_janome_userdic(
                 ("いけ", "イケ"),
                 ("イケ", "イケ"),
             )
-        ]
-        for head in entries_nai_aux
-    )
+        ),
+        heads = ("nai_aux", ),
+    ),
+)
+
+def generate_janome_userdic(
+    dic: typing.Iterable[typing.Tuple[typing.Any]],
+    rules: typing.Tuple[JanomeModalRule, ...] = JANOME_MODAL_RULES
+) -> typing.Set[JanomeLexEntry]:
+    """
+    Generate the entries of the Janome user dictionary for modals.
+
+    Parameters
+    ----------
+    dic : typing.Iterable[typing.Tuple[typing.Any]]
+        The entries of the Janome system dictionary.
+    rules : typing.Tuple[JanomeModalRule, ...]
+        The families of modals.
+
+    Returns
+    -------
+    entries : typing.Set[JanomeLexEntry]
+        The entries generated.
+        Each entry inherits the inflection, the right context ID
+            from the head morpheme
+            and the left context ID from the prefix morpheme.
+    """
+    # ------
+    # collecting heads
+    # ------
+    index = JanomeDicIndex(dic)
+    heads: typing.Dict[str, typing.List[JanomeLexEntry]] = {
+        head_class: index.lookup(head_class)
+        for head_class in index.head_classes
+    }
+
+    # ------
+    # generating entries
+    # ------
+    res: typing.Set[JanomeLexEntry] = set()
+
+    for rule in rules:
+        prefixes: typing.Iterable[JanomeLexEntry] = heads[rule.prefix]
+        if rule.derive_prefix:
+            prefixes = list(
+                itertools.chain.from_iterable(
+                    map(rule.derive_prefix, prefixes)
+                )
+            )
+        # === END IF ===
+
+        res.update(
+            head._replace(
+                surface = prefix.surface + conn.surface + head.surface,
+                left_id = prefix.left_id,
+                cost = head.cost - 10000,
+                base_form = prefix.base_form + conn.base_form + head.base_form,
+                reading = prefix.reading + conn.reading + head.reading,
+                phonetic = prefix.phonetic + conn.phonetic + head.phonetic,
+            )
+            for prefix in prefixes
+            for conn in rule.connectives
+            for head in itertools.chain.from_iterable(
+                heads[head_class] for head_class in rule.heads
+            )
+        )
+    # === END FOR rule ===
+
     return res
 # === END ===
 
+"""
+The directory in which caches (e.g. the compiled Janome user dictionary) are stored.
+It is on the results volume by default so that it survives containers,
+    and can be changed by the environment variable ABC_DEPCCG_CACHE
+    or the `--cache-dir` option.
+"""
+DIR_CACHE: pathlib.Path = pathlib.Path(
+    os.environ.get("ABC_DEPCCG_CACHE", "/root/results/.cache")
+)
+
+@functools.lru_cache(maxsize = None)
+def janome_userdic_key() -> str:
+    """
+    Compute the key of the compiled Janome user dictionary,
+        which is a hash of the Janome version,
+        the source of the generator of the user dictionary 
+        and its rule tables.
+    """
+    import hashlib
+    import inspect
+    from janome.version import JANOME_VERSION
+
+    hasher = hashlib.sha1()
+    hasher.update(JANOME_VERSION.encode("utf-8"))
+
+    for obj in (JanomeDicIndex, generate_janome_userdic):
+        hasher.update(inspect.getsource(obj).encode("utf-8"))
+    # === END FOR obj ===
+
+    hasher.update(repr(JANOME_HEAD_CLASSES).encode("utf-8"))
+    for rule in JANOME_MODAL_RULES:
+        hasher.update(repr(rule._replace(derive_prefix = None)).encode("utf-8"))
+        if rule.derive_prefix:
+            hasher.update(inspect.getsource(rule.derive_prefix).encode("utf-8"))
+        # === END IF ===
+    # === END FOR rule ===
+
+    return hasher.hexdigest()
+# === END ===
+
+def janome_userdic_path(dir_cache: typing.Optional[pathlib.Path] = None) -> pathlib.Path:
+    """
+    Get the directory of the compiled Janome user dictionary in the cache.
+    """
+    return (dir_cache or DIR_CACHE) / "janome-userdic" / janome_userdic_key()
+# === END ===
+
+def build_janome_userdic(dir_dic: pathlib.Path) -> typing.NoReturn:
+    """
+    Generate the Janome user dictionary from the system dictionary,
+        compile it and save it to `dir_dic`.
+    The dictionary is first saved to a temporary directory 
+        and then moved to `dir_dic`, 
+        so that no half-written dictionary is left.
+    """
+    import janome.tokenizer
+    import janome.dic
+    from janome.sysdic import connections
+    import tempfile
+    import shutil
+
+    # ユーザー辞書の生成にはシステム辞書の全エントリーが必要なので，mmapを使わずに読み込む
+    tokenizer = janome.tokenizer.Tokenizer(mmap = False)
+    user_entries = generate_janome_userdic(
+        tokenizer.sys_dic.entries.values()
+    )
+
+    dir_dic.parent.mkdir(parents = True, exist_ok = True)
+    dir_tmp = pathlib.Path(tempfile.mkdtemp(dir = str(dir_dic.parent)))
+    dir_tmp.chmod(0o755)
+
+    try:
+        with open(dir_tmp / "userdic.csv", mode = "w", encoding = "utf8") as user_dict_tf:
+            for entry in user_entries:
+                user_dict_tf.write(",".join(map(str, entry)))
+                user_dict_tf.write("\n")
+            # === END FOR entry ===
+        # === END WITH user_dict ===
+
+        # 読み込みを速くするため，圧縮はしない
+        janome.dic.UserDictionary(
+            str(dir_tmp / "userdic.csv"), 
+            "utf8", "ipadic",
+            connections
+        ).save(str(dir_tmp), compressionlevel = 0)
+
+        if dir_dic.exists():
+            shutil.rmtree(dir_dic)
+        # === END IF ===
+        dir_tmp.rename(dir_dic)
+    finally:
+        if dir_tmp.exists():
+            shutil.rmtree(dir_tmp)
+        # === END IF ===
+    # === END TRY ===
+
+    sys.stderr.write(f"[Janome] User dictionary compiled into {dir_dic}\n")
+# === END ===
+
 __Janome_Tokenizer: "janome.tokenizer.Tokenizer" = None
 
 def __init_janome_tokenizer():
@@ -567,82 +850,350 @@ def __init_janome_tokenizer():
 
 def __reset_janome_tokenizer():
     import janome.tokenizer
-    import janome.dic
-    from janome.sysdic import connections
-    import tempfile
     global __Janome_Tokenizer
-    
-    __Janome_Tokenizer = janome.tokenizer.Tokenizer()
-    user_entries = generate_janome_userdic(
-        __Janome_Tokenizer.sys_dic.entries.values()
-    )
 
-    with tempfile.NamedTemporaryFile(mode = "w") as user_dict_tf:
-        for entry in user_entries:
-            user_dict_tf.write(",".join(map(str, entry)))
-            user_dict_tf.write("\n")
-        # === END FOR entry ===
+    with profile_stage("Janome init"):
+        dir_dic = janome_userdic_path()
+        
+        # キャッシュにコンパイル済みのユーザー辞書がなければ，生成する
+        if not dir_dic.is_dir():
+            with profile_stage("user dictionary generation"):
+                try:
+                    build_janome_userdic(dir_dic)
+                except OSError as e:
+                    # キャッシュに書き込めない場合は，一時ディレクトリに生成する
+                    import tempfile
+                    sys.stderr.write(f"[Janome] Fail to write the cache: {e}\n")
+                    dir_dic = pathlib.Path(tempfile.mkdtemp()) / "userdic"
+                    build_janome_userdic(dir_dic)
+                # === END TRY ===
+            # === END WITH ===
+        # === END IF ===
 
-        __Janome_Tokenizer.user_dic = janome.dic.UserDictionary(
-            user_dict_tf.name, 
-            "utf8", "ipadic",
-            connections
+        # システム辞書はmmapで読み込む
+        __Janome_Tokenizer = janome.tokenizer.Tokenizer(
+            str(dir_dic),
+            mmap = True
         )
-    # === END WITH user_dict ===
+    # === END WITH ===
 # === END ===
 
-def annotate_using_janome(sentences, tokenize = False):
-    import depccg.tokens
-    
+@functools.lru_cache(maxsize = None)
+def _split_janome_pos(part_of_speech: str) -> typing.Tuple[str, str, str, str]:
+    """
+    Split a part-of-speech string of Janome into the four fields.
+    The number of distinct strings is small, so the results are memoized.
+    """
+    pos, pos1, pos2, pos3 = part_of_speech.split(',')
+    return pos, pos1, pos2, pos3
+# === END ===
+
+def tokenize_using_janome(sentence: str) -> typing.List[typing.Tuple[str, ...]]:
+    """
+    Tokenize a sentence with the Janome tokenizer.
+
+    Returns
+    -------
+    tokens : typing.List[typing.Tuple[str, ...]]
+        The tokens, each of which is a tuple of 
+            (surface, pos, pos1, pos2, pos3, 
+            inflection form, inflection type, reading, base form).
+        Tuples are used rather than `depccg.tokens.Token` 
+            so that they are passed cheaply between processes.
+    """
     __init_janome_tokenizer()
 
-    res = []
-    raw_sentences = []
-    for sentence in sentences:
-        sentence = ''.join(sentence)
-        tokenized = __Janome_Tokenizer.tokenize(sentence)
-        tokens = []
-
-        for token in tokenized:
-            pos, pos1, pos2, pos3 = token.part_of_speech.split(',')
-            token = depccg.tokens.Token(
-                word=token.surface,
-                surf=token.surface,
-                pos=pos,
-                pos1=pos1,
-                pos2=pos2,
-                pos3=pos3,
-                inflectionForm=token.infl_form,
-                inflectionType=token.infl_type,
-                reading=token.reading,
-                base=token.base_form
-            )
-            tokens.append(token)
-        raw_sentence = [token.surface for token in tokenized]
-        res.append(tokens)
-        raw_sentences.append(raw_sentence)
+    return [
+        (
+            token.surface,
+            *_split_janome_pos(token.part_of_speech),
+            token.infl_form,
+            token.infl_type,
+            token.reading,
+            token.base_form,
+        )
+        for token in __Janome_Tokenizer.tokenize(sentence)
+    ]
+# === END ===
 
-    return res, raw_sentences
+"""
+The maximum size in bytes of the on-disk cache of tokenization results.
+The cache is disabled if 0.
+"""
+TOKEN_CACHE_SIZE: int = 256 * 1024 * 1024
+
+__Token_Cache: SQLiteLRUCache = None
+
+def get_token_cache() -> typing.Optional[SQLiteLRUCache]:
+    """
+    Get the on-disk cache from sentences to their tokens,
+        which is opened at the first call.
+    None if the cache is disabled.
+    """
+    global __Token_Cache
+
+    if TOKEN_CACHE_SIZE <= 0:
+        return None
+    elif __Token_Cache is None:
+        __Token_Cache = SQLiteLRUCache(
+            DIR_CACHE / "tokens.sqlite3",
+            TOKEN_CACHE_SIZE
+        )
+    # === END IF ===
+
+    return __Token_Cache
 # === END ===
 
-def main(args):
-    from depccg.parser import JapaneseCCGParser
-    from depccg.printer import print_
-    import depccg.tokens
-    from depccg.combinator import (
-        HeadfinalCombinator,
-        JaForwardApplication,
-        JaBackwardApplication,
-        JaGeneralizedForwardComposition0,
-        # JaGeneralizedForwardComposition1,
-        # JaGeneralizedForwardComposition2,
-        JaGeneralizedBackwardComposition0,
-        JaGeneralizedBackwardComposition1,
-        JaGeneralizedBackwardComposition2,
-        JaGeneralizedBackwardComposition3,
-    )
+def token_cache_key(text: str) -> str:
+    """
+    The key of a sentence in the token cache.
+    It contains the version of the user dictionary,
+        so that the cache is invalidated when the dictionary changes.
+    """
+    return f"{janome_userdic_key()}\t{text.strip()}"
+# === END ===
 
-    # 使う組み合わせ規則 headfinal_combinatorでくるんでください。
+def tokenize_using_janome_cached(
+    texts: typing.List[str], 
+    workers: int = 1
+) -> typing.List[typing.List[typing.Tuple[str, ...]]]:
+    """
+    Tokenize sentences with Janome, 
+        skipping the ones found in the token cache.
+    The sentences not found are tokenized 
+        (over a process pool if `workers` > 1) 
+        and stored in the cache.
+    """
+    cache = get_token_cache()
+    keys = [token_cache_key(text) for text in texts]
+    found: typing.Dict[str, bytes] = cache.get_many(keys) if cache else {}
+
+    missed_texts: typing.List[str] = list(
+        dict.fromkeys(
+            text for text, key in zip(texts, keys) if key not in found
+        )
+    )
+
+    if workers > 1 and missed_texts:
+        missed_tokens = __get_janome_pool(workers).imap(
+            tokenize_using_janome,
+            missed_texts,
+            chunksize = max(1, len(missed_texts) // (workers * 4))
+        )
+    else:
+        missed_tokens = map(tokenize_using_janome, missed_texts)
+    # === END IF ===
+
+    tokenized: typing.Dict[str, typing.List[typing.Tuple[str, ...]]] = {}
+    new_entries: typing.Dict[str, bytes] = {}
+    for text, tokens in zip(missed_texts, missed_tokens):
+        key = token_cache_key(text)
+        tokenized[key] = tokens
+        new_entries[key] = json.dumps(tokens, ensure_ascii = False).encode("utf-8")
+    # === END FOR ===
+
+    if cache:
+        cache.put_many(new_entries)
+    # === END IF ===
+
+    return [
+        tokenized[key] if key in tokenized 
+        else json.loads(found[key].decode("utf-8"))
+        for key in keys
+    ]
+# === END ===
+
+__Janome_Pool: "multiprocessing.pool.Pool" = None
+
+def __get_janome_pool(workers: int) -> "multiprocessing.pool.Pool":
+    """
+    Get the pool of the tokenizer processes, which is made at the first call.
+    The tokenizer is initialized before the workers are forked
+        so that the user dictionary is built (if necessary) only once.
+    """
+    import multiprocessing
+    global __Janome_Pool
+
+    if __Janome_Pool is None:
+        __init_janome_tokenizer()
+        __Janome_Pool = multiprocessing.Pool(
+            workers,
+            initializer = __init_janome_tokenizer
+        )
+    # === END IF ===
+
+    return __Janome_Pool
+# === END ===
+
+def shutdown_janome_pool() -> typing.NoReturn:
+    """
+    Terminate the pool of the tokenizer processes if any.
+    """
+    global __Janome_Pool
+
+    if __Janome_Pool is not None:
+        __Janome_Pool.terminate()
+        __Janome_Pool.join()
+        __Janome_Pool = None
+    # === END IF ===
+# === END ===
+
+def annotate_using_janome(sentences, tokenize = False, workers: int = 1):
+    """
+    Tokenize sentences with Janome.
+
+    Parameters
+    ----------
+    sentences : typing.List[typing.List[str]]
+        The sentences, which are split by spaces.
+        The pieces are concatenated before tokenization.
+    tokenize : bool
+        Ignored. For the compatibility with `depccg.tokens.annotate_XX`.
+    workers : int
+        The number of tokenizer processes.
+        The sentences are tokenized in the current process if 1.
+        Sentences found in the token cache are not tokenized again.
+
+    Returns
+    -------
+    res : typing.List[typing.List[depccg.tokens.Token]]
+        The tokens of the sentences.
+    raw_sentences : typing.List[typing.List[str]]
+        The surfaces of the tokens of the sentences.
+    """
+    import depccg.tokens
+    
+    tokenized_doc = tokenize_using_janome_cached(
+        [''.join(sentence) for sentence in sentences],
+        workers = workers
+    )
+
+    res = []
+    raw_sentences = []
+    for tokenized in tokenized_doc:
+        res.append(
+            [
+                depccg.tokens.Token(
+                    word=surf,
+                    surf=surf,
+                    pos=pos,
+                    pos1=pos1,
+                    pos2=pos2,
+                    pos3=pos3,
+                    inflectionForm=infl_form,
+                    inflectionType=infl_type,
+                    reading=reading,
+                    base=base
+                )
+                for surf, pos, pos1, pos2, pos3, infl_form, infl_type, reading, base 
+                in tokenized
+            ]
+        )
+        raw_sentences.append([token[0] for token in tokenized])
+    # === END FOR tokenized ===
+
+    return res, raw_sentences
+# === END ===
+
+"""
+The output formats available.
+"abct" is the ABC Treebank format and the others are passed to depccg.
+"""
+OUTPUT_FORMATS: typing.List[str] = [
+    "abct", 'auto', 'deriv', 'xml', 'conll', 'html', 
+    'prolog', 'jigg_xml', 'ptb', 'json'
+]
+
+def find_model_path(path_raw: typing.Union[str, pathlib.Path]) -> pathlib.Path:
+    model_path_raw: pathlib.Path = pathlib.Path(path_raw)
+
+    # 指定されたパスが相対パスであるのであれば，/root/resultsが省略されている可能性がある
+    if (not model_path_raw.is_absolute()):
+        model_path_abbr_root: pathlib.Path = pathlib.Path("/root/results")
+
+        # model_path_abbr_cand: /root/results/ が省略されていると見なした場合のパス
+        model_path_abbr_cand: pathlib.Path = (
+            model_path_abbr_root / model_path_raw
+        )
+
+        try:
+            # そのパスが実在するのであれば
+            if model_path_abbr_cand.is_dir():
+                sys.stderr.write(
+                    f"[Parser] Model found in {model_path_abbr_cand}\n" 
+                )
+                return model_path_abbr_cand
+            else:
+                pass
+            # === END IF ===
+        # 例外が生じた場合は，エラーメッセージを表示だけして，次の手順にうつる．
+        except Exception as e:
+            sys.stderr.write(e.args)
+            sys.stderr.write(f"[Parser] Fail to find a model in '{model_path_abbr_cand}'. It will be treated as an non-abbreviated path.\n")
+        finally:
+            pass
+        # === END TRY ===
+    # === END IF ===
+
+    # /root/results/... でモデルが見つからなければ，通常通りの検索をする．
+    if model_path_raw.is_dir():
+        return model_path_raw
+    else:
+        raise FileNotFoundError()
+    # === END IF ===
+# === END ===
+
+"""
+The maximum number of the A* steps for a sentence.
+"""
+MAX_STEPS: int = 10000000
+
+def load_parser(
+    model: typing.Union[str, pathlib.Path],
+    nbest: int = 1,
+    load_tagger: bool = True,
+    reduced: bool = False
+) -> "depccg.parser.JapaneseCCGParser":
+    """
+    Initialize a parser from a trained model.
+
+    Parameters
+    ----------
+    model : str or pathlib.Path
+        The path to the model directory, 
+            which may be relative to /root/results.
+    nbest : int
+        The number of trees output for each sentence.
+    load_tagger : bool
+        Whether the supertagger is loaded into the parser.
+        If False, the scores of the supertagger must be given to `parse_doc`
+            (see `load_supertagger`).
+    reduced : bool
+        Whether the parser is the cheaper one of the stage "reduced"
+            (see `PARSE_STAGES`),
+            which uses only the function applications
+            and a tighter beam of categories for each word.
+
+    Returns
+    -------
+    parser : depccg.parser.JapaneseCCGParser
+        The parser ready to use.
+    """
+    from depccg.parser import JapaneseCCGParser
+    from depccg.combinator import (
+        HeadfinalCombinator,
+        JaForwardApplication,
+        JaBackwardApplication,
+        JaGeneralizedForwardComposition0,
+        # JaGeneralizedForwardComposition1,
+        # JaGeneralizedForwardComposition2,
+        JaGeneralizedBackwardComposition0,
+        JaGeneralizedBackwardComposition1,
+        JaGeneralizedBackwardComposition2,
+        JaGeneralizedBackwardComposition3,
+    )
+
+    # 使う組み合わせ規則 headfinal_combinatorでくるんでください。
     binary_rules = [
         HeadfinalCombinator(r) 
         for r in {
@@ -664,20 +1215,17 @@ def main(args):
                 '\\', '\\', '\\', '<B4'
             ),
         }
+        # 縮小版では関数適用のみを使う
+        if not reduced or isinstance(
+            r, (JaForwardApplication, JaBackwardApplication)
+        )
     ]
 
-    # 単語分割にjanome使います。pip install janomeしてください。
-    annotate_fun = (
-        annotate_using_janome
-            if args.tokenize 
-            else depccg.tokens.annotate_XX
-    )
-
     # パーザのオプション
     kwargs = dict(
         # unary ruleを使いすぎないようにペナルティを与えます。
         unary_penalty = 0.1,
-        #nbest=,
+        nbest = nbest,
         binary_rules = binary_rules,
         # ルートのカテゴリがこれらに含まれる木のみ解析結果として出力します
         possible_root_cats = [
@@ -689,155 +1237,2062 @@ def main(args):
         # 長い文は諦める
         max_length = 250,
         # 一定時間内に解析が終了しない場合解析を諦める
-        max_steps = 10000000,
+        max_steps = MAX_STEPS,
         # 構文解析にGPUをつかう
         gpu = -1
     )
 
-    # ------
-    # モデルへのパスの検索
-    # ------
-    
-    def find_model_path(path_raw: typing.Union[str, pathlib.Path]) -> pathlib.Path:
-        model_path_raw: pathlib.Path = pathlib.Path(path_raw)
-
-        # 指定されたパスが相対パスであるのであれば，/root/resultsが省略されている可能性がある
-        if (not model_path_raw.is_absolute()):
-            model_path_abbr_root: pathlib.Path = pathlib.Path("/root/results")
-
-            # model_path_abbr_cand: /root/results/ が省略されていると見なした場合のパス
-            model_path_abbr_cand: pathlib.Path = (
-                model_path_abbr_root / model_path_raw
-            )
-
-            try:
-                # そのパスが実在するのであれば
-                if model_path_abbr_cand.is_dir():
-                    sys.stderr.write(
-                        f"[Parser] Model found in {model_path_abbr_cand}\n" 
-                    )
-                    return model_path_abbr_cand
-                else:
-                    pass
-                # === END IF ===
-            # 例外が生じた場合は，エラーメッセージを表示だけして，次の手順にうつる．
-            except Exception as e:
-                sys.stderr.write(e.args)
-                sys.stderr.write(f"[Parser] Fail to find a model in '{model_path_abbr_cand}'. It will be treated as an non-abbreviated path.\n")
-            finally:
-                pass
-            # === END TRY ===
-        # === END IF ===
-
-        # /root/results/... でモデルが見つからなければ，通常通りの検索をする．
-        if model_path_raw.is_dir():
-            return model_path_raw
-        else:
-            raise FileNotFoundError()
-        # === END IF ===
-    # === END ===
+    if reduced:
+        # 各語のカテゴリの候補を絞る
+        kwargs.update(pruning_size = 10, beta = 0.01)
+    # === END IF ===
 
     # 設定ファイルとallennlpのモデルからパーザを初期化
-    model_path_str: pathlib.Path = str(find_model_path(args.model))
+    model_path_str: str = str(find_model_path(model))
 
-    parser = JapaneseCCGParser.from_json(
+    return JapaneseCCGParser.from_json(
         model_path_str + "/config_parser_abc.json", 
-        model_path_str + "/model",
+        model_path_str + "/model" if load_tagger else None,
         **kwargs
     )
+# === END ===
 
-    # 入力の文を読む
-    doc: typing.List[typing.List[str]]
-    if args.input is None:
-        # --input オプションが指定されていない場合，標準入力から文を読み込む
-        doc = list(
-            filter(
-                None,
-                (l.strip() for l in sys.stdin)
-            )
-        )
+def load_supertagger(model: typing.Union[str, pathlib.Path]) -> "depccg.parser.AllennlpSupertagger":
+    """
+    Load the supertagger of a trained model in the same way as depccg does.
+    The parsers of depccg do not expose their supertaggers,
+        so this is used with `load_parser(..., load_tagger = False)`
+        when the scores of the supertagger are needed besides the trees.
+
+    Returns
+    -------
+    tagger : depccg.parser.AllennlpSupertagger
+        The supertagger, whose `predict_doc` gives the scores 
+            to be passed to `parse_doc` of the parser.
+    """
+    from allennlp.models.archival import load_archive
+    from depccg.parser import AllennlpSupertagger
+    # depccgのモデル・データセット・predictorを登録する
+    from depccg.models.my_allennlp.models.supertagger import Supertagger
+    from depccg.models.my_allennlp.dataset.ja_supertagging_dataset import JaSupertaggingDatasetReader
+    from depccg.models.my_allennlp.predictor.supertagger_predictor import SupertaggerPredictor
+
+    archive = load_archive(
+        str(find_model_path(model) / "model"), 
+        cuda_device = -1
+    )
+    return AllennlpSupertagger(
+        SupertaggerPredictor.from_archive(archive, "supertagger-predictor")
+    )
+# === END ===
+
+def model_identity(
+    model: typing.Union[str, pathlib.Path],
+    nbest: int = 1
+) -> str:
+    """
+    A hash which identifies a trained model together with the parser settings.
+
+    It covers the name of the model directory (the timestamp of the training),
+        the contents of `config_parser_abc.json` and of the allennlp model
+        (`model/model.tar.gz`, or the sizes and the modification times
+        of the files under `model/` if there is no archive),
+        the source of `load_parser`, where the parser options are given,
+        and the number of trees for each sentence.
+    """
+    import hashlib
+    import inspect
+
+    path: pathlib.Path = find_model_path(model)
+    hasher = hashlib.sha1()
+    hasher.update(path.name.encode("utf-8"))
+    hasher.update(inspect.getsource(load_parser).encode("utf-8"))
+    hasher.update(f"nbest={nbest}".encode("utf-8"))
+
+    def update_content(p: pathlib.Path) -> typing.NoReturn:
+        with open(p, "rb") as h_file:
+            for block in iter(lambda: h_file.read(1024 * 1024), b""):
+                hasher.update(block)
+            # === END FOR block ===
+        # === END WITH h_file ===
+    # === END ===
+
+    update_content(path / "config_parser_abc.json")
+
+    path_model: pathlib.Path = path / "model"
+    if path_model.is_file():
+        update_content(path_model)
+    elif (path_model / "model.tar.gz").is_file():
+        update_content(path_model / "model.tar.gz")
     else:
-        # --input オプションが指定されている場合，それの引数である文字列を読み込む
-        doc = list(
-            filter(
-                None,
-                (l.strip() for l in args.input.splitlines())
-            )
-        )
+        for p in sorted(path_model.rglob("*")):
+            if p.is_file():
+                stat = p.stat()
+                hasher.update(
+                    f"{p.relative_to(path_model)}\t{stat.st_size}\t{stat.st_mtime_ns}\n".encode("utf-8")
+                )
+            # === END IF ===
+        # === END FOR p ===
     # === END IF ===
 
-    tagged_doc = annotate_fun(
-        [[word for word in sent.split(' ')] for sent in doc],
-        tokenize = args.tokenize
-    )
+    return hasher.hexdigest()
+# === END ===
+
+"""
+The default maximum number of tokens (including the padding) 
+    in a batch of the supertagger (see `make_length_buckets`).
+"""
+TOKEN_BUDGET: int = 4096
+
+def make_length_buckets(
+    lengths: typing.List[int],
+    token_budget: int,
+    max_batch: typing.Optional[int] = None
+) -> typing.List[typing.List[int]]:
+    """
+    Divide sentences into batches of sentences of similar lengths.
+    The sentences are sorted by their lengths and packed in that order
+        as long as the number of the sentences in a batch
+        times the length of the longest one (i.e. the padded size)
+        is within `token_budget`.
+    A sentence longer than `token_budget` makes a batch by itself.
+
+    Parameters
+    ----------
+    lengths : typing.List[int]
+        The numbers of the tokens of the sentences.
+    token_budget : int
+        The maximum padded size of a batch.
+    max_batch : int, optional
+        The maximum number of the sentences in a batch.
+
+    Returns
+    -------
+    buckets : typing.List[typing.List[int]]
+        The indices of the sentences in each batch.
+    """
+    buckets: typing.List[typing.List[int]] = []
+    bucket: typing.List[int] = []
+
+    for i in sorted(range(len(lengths)), key = lengths.__getitem__):
+        # 長さの順に並べているので，iがバッチの中で一番長い
+        if bucket and (
+            (len(bucket) + 1) * lengths[i] > token_budget
+            or (max_batch is not None and len(bucket) >= max_batch)
+        ):
+            buckets.append(bucket)
+            bucket = []
+        # === END IF ===
+        bucket.append(i)
+    # === END FOR i ===
 
-    if args.tokenize:
-        tagged_doc, doc = tagged_doc
+    if bucket:
+        buckets.append(bucket)
     # === END IF ===
 
-    # 解析
-    parsed_trees = parser.parse_doc(doc, batchsize=args.batchsize)
-        
-    # 木を出力
-    if args.format == "abct":
-        for i, (parsed, tokens) in enumerate(zip(parsed_trees, tagged_doc), 1):
-            for tree, prob in parsed:
-                tree_enh = {
-                    "type": "ROOT",
-                    "cat": "TOP",
-                    "children": [
-                        {
-                            "cat": "COMMENT",
-                            "surf": f"{{probability={prob}}}"
-                        },
-                        tree.json(tokens = tokens),
-                        {
-                            "cat": "ID",
-                            "surf": str(i)
-                        }
-                    ]
-                }
-                dump_tree_ABCT(tree_enh, sys.stdout)
-                sys.stdout.write("\n")
-            # === END FOR ===
-        # === END FOR ===
-    else:
-        print_(parsed_trees, tagged_doc, format=args.format, lang='ja')
+    return buckets
+# === END ===
+
+def supertag_doc(
+    tagger: "depccg.parser.AllennlpSupertagger",
+    splitted: typing.List[typing.List[str]],
+    batchsize: int = 32,
+    token_budget: int = 0
+) -> typing.Tuple[
+    typing.List[typing.Tuple["numpy.ndarray", "numpy.ndarray"]],
+    typing.List["depccg.cat.Category"]
+]:
+    """
+    Supertag sentences in batches of similar lengths (see `make_length_buckets`)
+        so that short sentences are not padded to the length of long ones,
+        and return the scores in the original order.
+
+    Parameters
+    ----------
+    tagger : depccg.parser.AllennlpSupertagger
+        The supertagger.
+    splitted : typing.List[typing.List[str]]
+        The tokenized sentences.
+    batchsize : int
+        The batch size if `token_budget` is 0,
+            and the maximum number of sentences in a batch otherwise.
+    token_budget : int
+        The maximum number of tokens (including the padding) in a batch.
+        If 0, the sentences are supertagged in batches of `batchsize`
+            in the original order.
+
+    Returns
+    -------
+    probs : typing.List[typing.Tuple[numpy.ndarray, numpy.ndarray]]
+        The scores of the categories and the dependencies of the sentences,
+            as given by `predict_doc` of the supertagger.
+    tag_list : typing.List[depccg.cat.Category]
+        The categories of the scores.
+    """
+    if token_budget <= 0:
+        return tagger.predict_doc(splitted, batchsize = batchsize)
     # === END IF ===
+
+    probs: typing.List[typing.Optional[tuple]] = [None] * len(splitted)
+    tag_list = None
+
+    for bucket in make_length_buckets(
+        [len(sent) for sent in splitted], 
+        token_budget, 
+        batchsize
+    ):
+        bucket_probs, tag_list = tagger.predict_doc(
+            [splitted[i] for i in bucket],
+            batchsize = len(bucket)
+        )
+        for i, prob in zip(bucket, bucket_probs):
+            probs[i] = prob
+        # === END FOR ===
+    # === END FOR bucket ===
+
+    return probs, tag_list
 # === END ===
 
-# ======
-# 4. Commandline wrappers
-# ======
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser('A* CCG parser')
-    parser.set_defaults(func=lambda _: parser.print_help())
+"""
+The stages of parsing a sentence within a time budget (see `LazyParser`),
+    each of which is tried only if the previous ones have failed
+    (see `is_failed_parse`) or have run out of their time:
+
+    "full"     A* search with all the combinatory rules
+    "reduced"  A* search with only the function applications
+                   and a tighter beam (see `load_parser`)
+    "frag"     a FRAG tree over the words (see `make_frag_tree`),
+                   which never fails
+"""
+PARSE_STAGES: typing.Tuple[str, ...] = ("full", "reduced", "frag")
 
-    parser.add_argument(
-        '-m',
-        '--model',
-        help='path to a model directory'
-    )
+"""
+The output formats which record the stages of the trees within a time budget:
+    in the COMMENT in the "abct" format and as "stage" in the "json" format.
+"""
+PARSE_STAGE_FORMATS: typing.Tuple[str, ...] = ("abct", "json")
 
-    parser.add_argument(
-        '-i', '--input',
-        type = typing.Union[str],
-        default = None,
-        help = "input to parse"
+"""
+The share of the time budget of a sentence given to the stage "full".
+The stage "reduced" is given the rest of the budget,
+    including the time which the stage "full" has left unused.
+"""
+BUDGET_FULL_SHARE: float = 0.75
+
+def is_failed_parse(
+    parsed: typing.List[typing.Tuple["depccg.tree.Tree", float]],
+    words: typing.List[str]
+) -> bool:
+    """
+    Check if A* search has failed to parse a sentence.
+    depccg gives a failed sentence (a too long one, 
+        one whose search exceeds `max_steps`,
+        or one which has no tree of the root categories)
+        a single leaf "FAILED" of NP instead of no trees.
+    A sentence of a single word "FAILED" is taken as parsed.
+    """
+    if not parsed:
+        return True
+    # === END IF ===
+
+    tree = parsed[0][0]
+    return (
+        len(parsed) == 1
+        and len(words) > 1
+        and tree.is_leaf
+        and tree.word == "FAILED"
     )
+# === END ===
 
-    parser.add_argument('--batchsize',
-                        type=int,
-                        default=32,
-                        help='batchsize in supertagger')
-    parser.add_argument('-f',
-                        '--format',
-                        default='abct',
-                        choices=["abct", 'auto', 'deriv', 'xml', 'conll', 'html', 'prolog', 'jigg_xml', 'ptb', 'json'],
-                        help='output format')
-    parser.add_argument('--tokenize',
-                        action='store_true',
-                        help='tokenize input sentences')
+def make_frag_tree(
+    words: typing.List[str],
+    prob: typing.Tuple["numpy.ndarray", "numpy.ndarray"],
+    tag_list: typing.List["depccg.cat.Category"]
+) -> typing.Tuple["depccg.tree.Tree", float]:
+    """
+    Make a right-branching tree of FRAG over the words,
+        each of which has the best category of the supertagger.
+    This is the last resort for sentences which A* search fails to parse.
+
+    Parameters
+    ----------
+    words : typing.List[str]
+        The words of the sentence.
+    prob : typing.Tuple[numpy.ndarray, numpy.ndarray]
+        The scores of the categories and the dependencies of the sentence
+            (see `supertag_doc`).
+    tag_list : typing.List[depccg.cat.Category]
+        The categories of the scores.
+
+    Returns
+    -------
+    tree : depccg.tree.Tree
+        The tree.
+    prob : float
+        The sum of the log probabilities of the categories of the words.
+    """
+    from depccg.cat import Category as DepccgCategory
+    from depccg.combinator import UNKNOWN_COMBINATOR
+    from depccg.tree import Tree
+
+    tag_scores, _ = prob
+    best = tag_scores.argmax(axis = 1)
+    frag = DepccgCategory.parse("FRAG")
+
+    leaves = [
+        Tree.make_terminal(word, tag_list[j], "ja")
+        for word, j in zip(words, best)
+    ]
+
+    # 右から順に FRAG でまとめる
+    tree = leaves[-1]
+    for leaf in reversed(leaves[:-1]):
+        tree = Tree.make_binary(
+            frag, leaf, tree, UNKNOWN_COMBINATOR, "ja",
+            left_is_head = False
+        )
+    # === END FOR leaf ===
+
+    if len(leaves) == 1:
+        tree = Tree.make_unary(frag, tree, "ja")
+    # === END IF ===
+
+    return tree, float(tag_scores.max(axis = 1).sum())
+# === END ===
+
+def _run_search_process(
+    conn: "multiprocessing.connection.Connection",
+    parsers: typing.Dict[str, "depccg.parser.JapaneseCCGParser"],
+    tag_list: typing.List["depccg.cat.Category"]
+) -> typing.NoReturn:
+    """
+    The loop of the child process of `SearchProcess`,
+        which parses the sentences received from `conn`
+        and sends back the n-best trees in the AUTO format with their probabilities
+        (or the exception raised) until `conn` is closed.
+    """
+    while True:
+        try:
+            stage, sent, prob = conn.recv()
+        except EOFError:
+            return
+        # === END TRY ===
+
+        try:
+            parsed = parsers[stage].parse_doc(
+                [sent], probs = [prob], tag_list = tag_list
+            )[0]
+            conn.send([(tree.auto(), float(p)) for tree, p in parsed])
+        except Exception as e:
+            conn.send(e)
+        # === END TRY ===
+    # === END WHILE ===
+# === END ===
+
+class SearchProcess:
+    """
+    A child process which runs the A* search of the stages within a time budget
+        (see PARSE_STAGES) so that a search running over the budget can be killed.
+    depccg searches inside C++, which a timer in this process cannot interrupt.
+
+    The process is forked at the first search, 
+        inheriting the parsers and the categories of the supertagger 
+        (which are the same for all the sentences),
+        and forked again after it is killed.
+    The trees are passed from the process in the AUTO format 
+        and restored by depccg,
+        which guesses the combinators from the categories.
+
+    Attributes
+    ----------
+    parsers : typing.Dict[str, depccg.parser.JapaneseCCGParser]
+        The parsers of the stages "full" and "reduced".
+    tag_list : typing.List[depccg.cat.Category]
+        The categories of the scores of the supertagger.
+    """
+
+    def __init__(
+        self,
+        parsers: typing.Dict[str, "depccg.parser.JapaneseCCGParser"],
+        tag_list: typing.List["depccg.cat.Category"]
+    ):
+        self.parsers = parsers
+        self.tag_list = tag_list
+        self._pid: typing.Optional[int] = None
+        self._conn: "multiprocessing.connection.Connection" = None
+    # === END ===
+
+    def _start(self) -> typing.NoReturn:
+        import multiprocessing
+
+        self._conn, conn_child = multiprocessing.Pipe()
+
+        # multiprocessing.Processはデーモン（--workersのワーカー）から作れないので，直接forkする
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self._conn.close()
+                _run_search_process(conn_child, self.parsers, self.tag_list)
+            finally:
+                os._exit(0)
+            # === END TRY ===
+        # === END IF ===
+
+        conn_child.close()
+        self._pid = pid
+    # === END ===
+
+    def parse(
+        self,
+        stage: str,
+        sent: typing.Union[str, typing.List[str]],
+        prob: typing.Tuple["numpy.ndarray", "numpy.ndarray"],
+        timeout: float
+    ) -> typing.Optional[typing.List[typing.Tuple["depccg.tree.Tree", float]]]:
+        """
+        Parse a sentence at a stage within `timeout` seconds.
+
+        Returns
+        -------
+        parsed : typing.List[typing.Tuple[depccg.tree.Tree, float]], optional
+            The n-best trees with their probabilities.
+            None if the search has not finished within `timeout`
+                (in which case the process is killed) 
+                or if the process has died.
+        """
+        from depccg.tree import Tree
+
+        if self._pid is None:
+            self._start()
+        # === END IF ===
+
+        try:
+            self._conn.send((stage, sent, prob))
+            if not self._conn.poll(max(timeout, 0.0)):
+                # 時間切れの探索は止められないので，プロセスごと終了させる
+                self.close()
+                return None
+            # === END IF ===
+            result = self._conn.recv()
+        except (EOFError, OSError):
+            self.close()
+            return None
+        # === END TRY ===
+
+        if isinstance(result, Exception):
+            raise result
+        # === END IF ===
+
+        return [
+            (Tree.of_auto(auto, lang = "ja")[0], p) 
+            for auto, p in result
+        ]
+    # === END ===
+
+    def close(self) -> typing.NoReturn:
+        """
+        Kill the process if it is running.
+        """
+        import signal
+
+        if self._pid is not None:
+            os.kill(self._pid, signal.SIGKILL)
+            os.waitpid(self._pid, 0)
+            self._conn.close()
+            self._pid = None
+        # === END IF ===
+    # === END ===
+# === END CLASS ===
 
-    main(parser.parse_args())
+class LazyParser:
+    """
+    A parser which is loaded from a model at its first use,
+        so that inputs whose trees are all in the parse cache
+        are processed without loading the model.
+
+    The supertagger is loaded apart from the parser (see `load_supertagger`)
+        so that the sentences are supertagged in batches of similar lengths
+        (see `supertag_doc`) and its scores can be dumped.
+
+    Attributes
+    ----------
+    model : str or pathlib.Path
+        The path to the model directory.
+    nbest : int
+        The number of trees output for each sentence.
+    token_budget : int
+        The maximum number of tokens (including the padding) 
+            in a batch of the supertagger.
+        If 0, the sentences are supertagged in batches of the given size 
+            in the original order.
+    time_budget : float
+        The wall-clock time in seconds for the A* search of a sentence.
+        If positive, the sentences are parsed one by one 
+            through the stages of PARSE_STAGES in a `SearchProcess`:
+            the stage "full" is killed after BUDGET_FULL_SHARE of the budget,
+            and the stage "reduced" at the end of the budget,
+            after which the stage "frag" makes a tree at once.
+        A sentence thus takes at most the budget,
+            the time of passing the sentence and its trees to and from the process
+            and that of making a FRAG tree
+            (and that of forking a new process if the previous one has been killed).
+        If 0, the sentences are parsed at once as depccg does,
+            and those which fail to be parsed have the trees "FAILED" 
+            (see `is_failed_parse`).
+    stage_counts : typing.Dict[str, int]
+        The numbers of the sentences parsed at the stages 
+            within the time budget.
+    """
+
+    def __init__(
+        self,
+        model: typing.Union[str, pathlib.Path],
+        key: typing.Optional[str] = None,
+        nbest: int = 1,
+        token_budget: int = TOKEN_BUDGET,
+        time_budget: float = 0.0
+    ):
+        self.model = model
+        self.nbest = nbest
+        self.token_budget = token_budget
+        self.time_budget = time_budget
+        self.stage_counts: typing.Dict[str, int] = {
+            stage: 0 for stage in PARSE_STAGES
+        }
+        self._parser: "depccg.parser.JapaneseCCGParser" = None
+        self._fallback: "depccg.parser.JapaneseCCGParser" = None
+        self._tagger: "depccg.parser.AllennlpSupertagger" = None
+        self._search: typing.Optional[SearchProcess] = None
+        self._key: typing.Optional[str] = key
+    # === END ===
+
+    def get(self) -> "depccg.parser.JapaneseCCGParser":
+        """
+        Get the parser (without the supertagger), which is loaded at the first call.
+        """
+        if self._parser is None:
+            with profile_stage("model load"):
+                self._parser = load_parser(
+                    self.model, 
+                    nbest = self.nbest,
+                    load_tagger = False
+                )
+            # === END WITH ===
+        # === END IF ===
+
+        return self._parser
+    # === END ===
+
+    def get_fallback(self) -> "depccg.parser.JapaneseCCGParser":
+        """
+        Get the parser of the stage "reduced", which is loaded at the first call.
+        """
+        if self._fallback is None:
+            with profile_stage("model load"):
+                self._fallback = load_parser(
+                    self.model, 
+                    nbest = self.nbest,
+                    load_tagger = False,
+                    reduced = True
+                )
+            # === END WITH ===
+        # === END IF ===
+
+        return self._fallback
+    # === END ===
+
+    def get_tagger(self) -> "depccg.parser.AllennlpSupertagger":
+        """
+        Get the supertagger, which is loaded at the first call.
+        """
+        if self._tagger is None:
+            with profile_stage("model load"):
+                self._tagger = load_supertagger(self.model)
+            # === END WITH ===
+        # === END IF ===
+
+        return self._tagger
+    # === END ===
+
+    def parse_doc(
+        self,
+        doc: typing.List[typing.Union[str, typing.List[str]]],
+        batchsize: int = 32,
+        tag_scores: typing.Optional["TagScoreWriter"] = None,
+        start_id: int = 1,
+        stages: typing.Optional[typing.List[str]] = None
+    ) -> typing.List[typing.List[typing.Tuple["depccg.tree.Tree", float]]]:
+        """
+        Parse sentences in the same way as `parse_doc` of depccg's parsers,
+            or one by one within the time budget if it is given 
+            or if profiling the latency of each sentence (see `start_profiler`).
+
+        Parameters
+        ----------
+        doc : typing.List[str or typing.List[str]]
+            The sentences, tokenized by spaces or as lists.
+        batchsize : int
+            The batch size of the supertagger (see `supertag_doc`).
+        tag_scores : TagScoreWriter, optional
+            The writer to which the scores of the supertagger are added.
+        start_id : int
+            The ID of the first sentence given to `tag_scores`.
+        stages : typing.List[str], optional
+            The list to which the stages (see PARSE_STAGES) 
+                at which the sentences are parsed are appended
+                if they are parsed within the time budget.
+
+        Returns
+        -------
+        parsed_trees : typing.List[typing.List[typing.Tuple[depccg.tree.Tree, float]]]
+            The n-best trees with their probabilities.
+        """
+        splitted = [
+            sent if isinstance(sent, list) else sent.split(' ') 
+            for sent in doc
+        ]
+        tagger = self.get_tagger()
+        with profile_stage("supertagging"):
+            probs, tag_list = supertag_doc(
+                tagger,
+                splitted,
+                batchsize = batchsize,
+                token_budget = self.token_budget
+            )
+        # === END WITH ===
+
+        if tag_scores is not None:
+            tag_scores.add(start_id, [tag for tag, _ in probs], tag_list)
+        # === END IF ===
+
+        profiler = get_profiler()
+        if self.time_budget <= 0 and (
+            profiler is None or not profiler.per_sentence
+        ):
+            parser = self.get()
+            with profile_stage("A* search"):
+                return parser.parse_doc(
+                    doc, 
+                    probs = probs, 
+                    tag_list = tag_list, 
+                    batchsize = batchsize
+                )
+            # === END WITH ===
+        # === END IF ===
+
+        import time
+
+        # 1文ずつ解析し，各文にかかった時間を測る
+        parser = self.get()
+        search: typing.Optional[SearchProcess] = None
+        if self.time_budget > 0:
+            if self._search is None:
+                self._search = SearchProcess(
+                    {"full": parser, "reduced": self.get_fallback()},
+                    tag_list
+                )
+            # === END IF ===
+            search = self._search
+        # === END IF ===
+
+        parsed_trees: typing.List[typing.List[typing.Tuple["depccg.tree.Tree", float]]] = []
+        for sent, words, prob in zip(doc, splitted, probs):
+            start = time.perf_counter()
+            with profile_stage("A* search"):
+                if search is None:
+                    parsed = parser.parse_doc(
+                        [sent], probs = [prob], tag_list = tag_list
+                    )[0]
+                else:
+                    # 各段階は前の段階で解析に失敗したか時間切れになったときのみ試す
+                    stage = "full"
+                    parsed = search.parse(
+                        stage, sent, prob, 
+                        self.time_budget * BUDGET_FULL_SHARE
+                    )
+
+                    if parsed is None or is_failed_parse(parsed, words):
+                        stage = "reduced"
+                        parsed = search.parse(
+                            stage, sent, prob,
+                            start + self.time_budget - time.perf_counter()
+                        )
+                    # === END IF ===
+
+                    if parsed is None or is_failed_parse(parsed, words):
+                        stage = "frag"
+                        parsed = [make_frag_tree(words, prob, tag_list)]
+                    # === END IF ===
+
+                    self.stage_counts[stage] += 1
+                    if stages is not None:
+                        stages.append(stage)
+                    # === END IF ===
+                # === END IF ===
+            # === END WITH ===
+
+            latency = time.perf_counter() - start
+
+            parsed_trees.append(parsed)
+            if profiler is None:
+                pass
+            elif search is None:
+                profiler.add_latency(len(words), latency)
+            else:
+                profiler.add_latency(len(words), latency, stage = stage)
+            # === END IF ===
+        # === END FOR ===
+
+        return parsed_trees
+    # === END ===
+
+    def close(self) -> typing.NoReturn:
+        """
+        Kill the `SearchProcess` if it is running.
+        """
+        if self._search is not None:
+            self._search.close()
+        # === END IF ===
+    # === END ===
+
+    @property
+    def key(self) -> str:
+        """
+        The identity of the model (see `model_identity`),
+            which is computed at the first access.
+        """
+        if self._key is None:
+            self._key = model_identity(self.model, self.nbest)
+        # === END IF ===
+
+        return self._key
+    # === END ===
+# === END CLASS ===
+
+"""
+The maximum size in bytes of the on-disk cache of parse results.
+The cache is disabled if 0.
+"""
+PARSE_CACHE_SIZE: int = 1024 * 1024 * 1024
+
+__Parse_Cache: SQLiteLRUCache = None
+
+def get_parse_cache() -> typing.Optional[SQLiteLRUCache]:
+    """
+    Get the on-disk cache from sentences to their n-best trees,
+        which is opened at the first call.
+    None if the cache is disabled.
+    """
+    global __Parse_Cache
+
+    if PARSE_CACHE_SIZE <= 0:
+        return None
+    elif __Parse_Cache is None:
+        __Parse_Cache = SQLiteLRUCache(
+            DIR_CACHE / "parses.sqlite3",
+            PARSE_CACHE_SIZE
+        )
+    # === END IF ===
+
+    return __Parse_Cache
+# === END ===
+
+def parse_cache_key(
+    model_key: str,
+    sentence: typing.Union[str, typing.List[str]],
+    tokenize: bool
+) -> str:
+    """
+    The key of a sentence in the parse cache.
+    Tokenized sentences also depend on the version of the Janome user dictionary,
+        as the trees contain the tokens.
+    """
+    if not isinstance(sentence, str):
+        sentence = " ".join(sentence)
+    # === END IF ===
+
+    tokenizer = janome_userdic_key() if tokenize else "-"
+    return f"{model_key}\t{tokenizer}\t{sentence}"
+# === END ===
+
+"""
+The output formats rendered directly from the records in the parse cache.
+"""
+PARSE_CACHE_RENDERED_FORMATS: typing.Tuple[str, ...] = ("abct", "json", "auto")
+
+"""
+The output formats rendered from the depccg trees restored 
+    from the AUTO representations in the parse cache.
+The other formats show the combinators, which AUTO does not record,
+    so that their sentences are always parsed (and stored in the cache).
+"""
+PARSE_CACHE_RESTORED_FORMATS: typing.Tuple[str, ...] = ("ptb", "conll")
+
+def make_parse_record(
+    parsed: typing.List[typing.Tuple["depccg.tree.Tree", float]],
+    tokens: typing.List["depccg.tokens.Token"]
+) -> typing.List[dict]:
+    """
+    Convert the n-best trees of a sentence into the format-neutral form
+        stored in the parse cache:
+        a list of {"prob": ..., "tree": ..., "auto": ...},
+        where "tree" is the JSON representation of the tree
+        (from which the "abct" and "json" formats are rendered)
+        and "auto" is the AUTO representation
+        (from which the tree is restored for PARSE_CACHE_RESTORED_FORMATS).
+    """
+    return [
+        {
+            "prob": float(prob),
+            "tree": tree.json(tokens = tokens),
+            "auto": tree.auto(tokens = tokens),
+        }
+        for tree, prob in parsed
+    ]
+# === END ===
+
+def restore_parse_record(
+    record: typing.List[dict]
+) -> typing.Optional[typing.List[typing.Tuple["depccg.tree.Tree", float]]]:
+    """
+    Restore the depccg trees from a record made by `make_parse_record`.
+    None if they cannot be restored,
+        in which case the sentence is to be parsed again.
+    """
+    from depccg.tree import Tree
+
+    try:
+        return [
+            (Tree.of_auto(entry["auto"], lang = "ja")[0], entry["prob"])
+            for entry in record
+        ]
+    except Exception:
+        return None
+    # === END TRY ===
+# === END ===
+
+def parse_doc_cached(
+    parser: LazyParser,
+    doc: typing.List[typing.Union[str, typing.List[str]]],
+    tagged_doc: typing.List[typing.List["depccg.tokens.Token"]],
+    format: str = "abct",
+    tokenize: bool = False,
+    batchsize: int = 32
+) -> typing.Tuple[
+    typing.List[typing.Optional[typing.List[typing.Tuple["depccg.tree.Tree", float]]]],
+    typing.List[typing.List[dict]]
+]:
+    """
+    Parse sentences, skipping the ones found in the parse cache
+        if `format` can be rendered from the cache.
+    The sentences parsed are stored in the cache.
+
+    Returns
+    -------
+    parsed_trees : typing.List[typing.List[typing.Tuple[depccg.tree.Tree, float]]]
+        The n-best trees with their probabilities.
+        None for the sentences found in the cache 
+            if `format` is in PARSE_CACHE_RENDERED_FORMATS.
+    records : typing.List[typing.List[dict]]
+        The n-best trees in the form of `make_parse_record`.
+    """
+    cache = get_parse_cache()
+    keys = [
+        parse_cache_key(parser.key, sentence, tokenize)
+        for sentence in doc
+    ]
+
+    if format in PARSE_CACHE_RENDERED_FORMATS + PARSE_CACHE_RESTORED_FORMATS:
+        found: typing.Dict[str, bytes] = cache.get_many(keys)
+    else:
+        found = {}
+    # === END IF ===
+
+    records: typing.List[typing.Optional[typing.List[dict]]] = [
+        json.loads(found[key].decode("utf-8")) if key in found else None
+        for key in keys
+    ]
+    parsed_trees: typing.List[typing.Optional[list]] = [None] * len(doc)
+
+    if format in PARSE_CACHE_RESTORED_FORMATS:
+        for i, record in enumerate(records):
+            if record is not None:
+                parsed_trees[i] = restore_parse_record(record)
+
+                # 復元できなければ解析し直す
+                if parsed_trees[i] is None:
+                    records[i] = None
+                # === END IF ===
+            # === END IF ===
+        # === END FOR ===
+    # === END IF ===
+
+    misses: typing.List[int] = [
+        i for i, record in enumerate(records) if record is None
+    ]
+
+    if misses:
+        new_entries: typing.Dict[str, bytes] = {}
+        for i, parsed in zip(
+            misses,
+            parser.parse_doc([doc[i] for i in misses], batchsize = batchsize)
+        ):
+            parsed_trees[i] = parsed
+            records[i] = make_parse_record(parsed, tagged_doc[i])
+            new_entries[keys[i]] = json.dumps(
+                records[i], ensure_ascii = False
+            ).encode("utf-8")
+        # === END FOR ===
+
+        cache.put_many(new_entries)
+    # === END IF ===
+
+    return parsed_trees, records
+# === END ===
+
+def report_cache_stats() -> typing.NoReturn:
+    """
+    Write the hits and misses of the token cache and the parse cache
+        to STDERR if they have been used.
+    """
+    for name, cache in (("Token", __Token_Cache), ("Parse", __Parse_Cache)):
+        if cache is not None and (cache.hits or cache.misses):
+            sys.stderr.write(f"[Cache] {name} cache: {cache.stats()}\n")
+        # === END IF ===
+    # === END FOR ===
+# === END ===
+
+def split_doc(text: typing.Iterable[str]) -> typing.List[str]:
+    """
+    Collect non-empty sentences from lines of an input.
+    """
+    return list(
+        filter(
+            None,
+            (l.strip() for l in text)
+        )
+    )
+# === END ===
+
+def iter_doc_chunks(
+    text: typing.Iterable[str], 
+    size: int
+) -> typing.Iterator[typing.List[str]]:
+    """
+    Collect non-empty sentences from lines of an input 
+        lazily in chunks of `size` sentences.
+    """
+    sentences = filter(
+        None,
+        (l.strip() for l in text)
+    )
+
+    while True:
+        chunk = list(itertools.islice(sentences, size))
+        if chunk:
+            yield chunk
+        else:
+            return
+        # === END IF ===
+    # === END WHILE ===
+# === END ===
+
+class TagScoreWriter:
+    """
+    A writer of the top-k scores of the supertagger for each token,
+        which are saved as a NumPy `.npz` file of the arrays:
+
+        ids         (sentences, )        int64    the IDs of the sentences 
+                                                  (as in the "abct" format)
+        offsets     (sentences + 1, )    int64    the offsets of the sentences 
+                                                  in the arrays below
+        indices     (tokens, k)          int32    the categories in descending order of the scores
+        scores      (tokens, k)          float16  the scores given by the supertagger
+        categories  (categories, )       str      the categories in the depccg format
+        categories_abc  (categories, )   str      the categories in the ABC Treebank format
+
+    The scores of the tokens of the i-th sentence are 
+        `scores[offsets[i]:offsets[i + 1]]`.
+
+    The scores given to `add` are not kept in memory 
+        but appended at once to the `.npz` file (a ZIP archive)
+        as the members `ids.<chunk>`, `lengths.<chunk>`, `indices.<chunk>` 
+        and `scores.<chunk>`, numbered from 000000.
+    `close` joins them into the arrays above one chunk at a time.
+    If the process is killed before `close`, 
+        the file keeps the chunks added so far.
+
+    Attributes
+    ----------
+    path : pathlib.Path
+        The path to the `.npz` file.
+    topk : int
+        The number of the categories kept for each token.
+    """
+
+    CHUNK_ARRAYS: typing.Tuple[str, ...] = ("ids", "lengths", "indices", "scores")
+
+    def __init__(self, path: typing.Union[str, pathlib.Path], topk: int = 10):
+        self.path = pathlib.Path(path)
+        # numpy.savezと同様に拡張子を補う
+        if self.path.suffix != ".npz":
+            self.path = self.path.with_name(self.path.name + ".npz")
+        # === END IF ===
+        self.topk = topk
+        self._chunks: int = 0
+        self._n_sentences: int = 0
+        self._n_tokens: int = 0
+        self._k: int = topk
+        self._categories: typing.Optional[typing.List[str]] = None
+
+        # 前回の実行のファイルに追記しないように消しておく
+        if self.path.exists():
+            self.path.unlink()
+        # === END IF ===
+    # === END ===
+
+    def add(
+        self,
+        start_id: int,
+        tag_scores: typing.List["numpy.ndarray"],
+        tag_list: typing.List["depccg.cat.Category"]
+    ) -> typing.NoReturn:
+        """
+        Add the scores of sentences and append them to the file.
+
+        Parameters
+        ----------
+        start_id : int
+            The ID of the first sentence.
+        tag_scores : typing.List[numpy.ndarray]
+            The score matrices (tokens × categories) of the sentences
+                given by the supertagger.
+        tag_list : typing.List[depccg.cat.Category]
+            The categories of the columns of the matrices.
+        """
+        import numpy
+
+        if not tag_scores:
+            return
+        # === END IF ===
+
+        # 全文の行列を繋げて，上位k個をまとめて求める
+        scores = numpy.concatenate(tag_scores, axis = 0)
+        k = min(self.topk, scores.shape[1])
+        top = numpy.argpartition(-scores, k - 1, axis = 1)[:, :k]
+        top_scores = numpy.take_along_axis(scores, top, axis = 1)
+        order = numpy.argsort(-top_scores, axis = 1, kind = "stable")
+
+        arrays: typing.Dict[str, "numpy.ndarray"] = {
+            "ids": numpy.arange(
+                start_id, start_id + len(tag_scores), dtype = numpy.int64
+            ),
+            "lengths": numpy.array(
+                [len(m) for m in tag_scores], dtype = numpy.int64
+            ),
+            "indices": numpy.take_along_axis(
+                top, order, axis = 1
+            ).astype(numpy.int32),
+            "scores": numpy.take_along_axis(
+                top_scores, order, axis = 1
+            ).astype(numpy.float16),
+        }
+
+        with zipfile.ZipFile(self.path, "a", allowZip64 = True) as archive:
+            if self._categories is None:
+                self._categories = [str(cat) for cat in tag_list]
+                self._k = k
+                self._write_member(
+                    archive, "categories", 
+                    numpy.array(self._categories, dtype = str)
+                )
+                self._write_member(
+                    archive, "categories_abc",
+                    numpy.array(
+                        [parse_cat_translate_TLG(cat) for cat in self._categories], 
+                        dtype = str
+                    )
+                )
+            # === END IF ===
+
+            for name in self.CHUNK_ARRAYS:
+                self._write_member(
+                    archive, f"{name}.{self._chunks:06d}", arrays[name]
+                )
+            # === END FOR name ===
+        # === END WITH archive ===
+
+        self._chunks += 1
+        self._n_sentences += len(tag_scores)
+        self._n_tokens += scores.shape[0]
+    # === END ===
+
+    @staticmethod
+    def _write_member(
+        archive: zipfile.ZipFile, 
+        name: str, 
+        array: "numpy.ndarray"
+    ) -> typing.NoReturn:
+        import numpy
+
+        with archive.open(name + ".npy", "w", force_zip64 = True) as f:
+            numpy.lib.format.write_array(f, array)
+        # === END WITH f ===
+    # === END ===
+
+    def close(self) -> typing.NoReturn:
+        """
+        Join the chunks added so far into the arrays 
+            without loading all of them into memory at once.
+        """
+        import numpy
+
+        if self._chunks == 0:
+            categories = self._categories or []
+            numpy.savez(
+                self.path,
+                ids = numpy.zeros(0, dtype = numpy.int64),
+                offsets = numpy.zeros(1, dtype = numpy.int64),
+                indices = numpy.zeros((0, self._k), dtype = numpy.int32),
+                scores = numpy.zeros((0, self._k), dtype = numpy.float16),
+                categories = numpy.array(categories, dtype = str),
+                categories_abc = numpy.array(
+                    [parse_cat_translate_TLG(cat) for cat in categories], 
+                    dtype = str
+                ),
+            )
+            return
+        # === END IF ===
+
+        shapes: typing.Dict[str, typing.Tuple[int, ...]] = {
+            "ids": (self._n_sentences, ),
+            "offsets": (self._n_sentences + 1, ),
+            "indices": (self._n_tokens, self._k),
+            "scores": (self._n_tokens, self._k),
+        }
+        dtypes: typing.Dict[str, typing.Any] = {
+            "ids": numpy.int64,
+            "offsets": numpy.int64,
+            "indices": numpy.int32,
+            "scores": numpy.float16,
+        }
+
+        joined = self.path.with_name(self.path.name + ".tmp")
+        with zipfile.ZipFile(self.path, "r") as src, \
+                zipfile.ZipFile(joined, "w", allowZip64 = True) as dst:
+            for name in ("categories", "categories_abc"):
+                dst.writestr(name + ".npy", src.read(name + ".npy"))
+            # === END FOR name ===
+
+            for name in ("ids", "offsets", "indices", "scores"):
+                # 全体の形のヘッダーを書いてから，チャンクのデータを順に書き足す
+                header = numpy.lib.format.header_data_from_array_1_0(
+                    numpy.zeros((0, ) * len(shapes[name]), dtype = dtypes[name])
+                )
+                header["shape"] = shapes[name]
+
+                with dst.open(name + ".npy", "w", force_zip64 = True) as f:
+                    numpy.lib.format.write_array_header_1_0(f, header)
+
+                    # offsetsは各チャンクの文の長さの累積和から作る
+                    offset: int = 0
+                    if name == "offsets":
+                        f.write(numpy.zeros(1, dtype = numpy.int64).tobytes())
+                    # === END IF ===
+
+                    for chunk in range(self._chunks):
+                        member = "lengths" if name == "offsets" else name
+                        with src.open(f"{member}.{chunk:06d}.npy") as g:
+                            array = numpy.lib.format.read_array(g)
+                        # === END WITH g ===
+
+                        if name == "offsets":
+                            array = offset + numpy.cumsum(array)
+                            offset = int(array[-1])
+                        # === END IF ===
+
+                        f.write(
+                            numpy.ascontiguousarray(array, dtype = dtypes[name]).tobytes()
+                        )
+                    # === END FOR chunk ===
+                # === END WITH f ===
+            # === END FOR name ===
+        # === END WITH src, dst ===
+
+        os.replace(joined, self.path)
+    # === END ===
+# === END CLASS ===
+
+def parse_sentences(
+    parser: LazyParser,
+    doc: typing.List[str],
+    format: str = "abct",
+    tokenize: bool = False,
+    batchsize: int = 32,
+    start_id: int = 1,
+    tokenize_workers: int = 1,
+    tag_scores: typing.Optional[TagScoreWriter] = None
+) -> typing.Tuple[
+    typing.List[typing.List["depccg.tokens.Token"]],
+    typing.List[typing.Optional[typing.List[typing.Tuple["depccg.tree.Tree", float]]]],
+    typing.Optional[typing.List[typing.List[dict]]],
+    typing.Optional[typing.List[str]]
+]:
+    """
+    Tokenize and parse sentences for `write_trees`.
+    The trees of the sentences found in the parse cache are not parsed again
+        (see `parse_doc_cached`).
+
+    Parameters
+    ----------
+    parser : LazyParser
+        The parser.
+    doc : typing.List[str]
+        The sentences, which are tokenized by spaces
+            unless `tokenize` is True.
+    format : str
+        The output format, one of OUTPUT_FORMATS.
+    tokenize : bool
+        Whether the sentences are to be tokenized by Janome.
+    batchsize : int
+        The batch size of the supertagger.
+    start_id : int
+        The ID of the first sentence given to `tag_scores`.
+    tokenize_workers : int
+        The number of Janome tokenizer processes.
+    tag_scores : TagScoreWriter, optional
+        The writer to which the scores of the supertagger are added.
+        If given, all the sentences are supertagged and parsed
+            without the parse cache.
+
+    Within the time budget of the parser, 
+        the sentences are parsed without the parse cache,
+        as the trees depend on the time spent.
+
+    Returns
+    -------
+    tagged_doc : typing.List[typing.List[depccg.tokens.Token]]
+        The tokens of the sentences.
+    parsed_trees : typing.List[typing.List[typing.Tuple[depccg.tree.Tree, float]]]
+        The n-best trees with their probabilities
+            (see `parse_doc_cached` for the sentences found in the cache).
+    records : typing.List[typing.List[dict]], optional
+        The n-best trees in the form of `make_parse_record`.
+        None if the parse cache is not used.
+    stages : typing.List[str], optional
+        The stages (see PARSE_STAGES) at which the sentences are parsed.
+        None unless within a time budget.
+    """
+    import depccg.tokens
+
+    with profile_stage("tokenization"):
+        # 単語分割にjanome使います。pip install janomeしてください。
+        if tokenize:
+            tagged_doc = annotate_using_janome(
+                [[word for word in sent.split(' ')] for sent in doc],
+                tokenize = tokenize,
+                workers = tokenize_workers
+            )
+        else:
+            tagged_doc = depccg.tokens.annotate_XX(
+                [[word for word in sent.split(' ')] for sent in doc],
+                tokenize = tokenize
+            )
+        # === END IF ===
+
+        if tokenize:
+            tagged_doc, doc = tagged_doc
+        # === END IF ===
+    # === END WITH ===
+
+    profiler = get_profiler()
+    if profiler is not None:
+        profiler.add_doc(len(doc), sum(len(tokens) for tokens in tagged_doc))
+    # === END IF ===
+
+    # 解析
+    # キャッシュがあれば，そこにない文だけを解析する
+    records: typing.Optional[typing.List[typing.List[dict]]] = None
+    stages: typing.Optional[typing.List[str]] = None
+    if parser.time_budget > 0:
+        stages = []
+    # === END IF ===
+
+    if (
+        tag_scores is not None 
+        or stages is not None 
+        or get_parse_cache() is None
+    ):
+        parsed_trees = parser.parse_doc(
+            doc, 
+            batchsize = batchsize,
+            tag_scores = tag_scores,
+            start_id = start_id,
+            stages = stages
+        )
+    else:
+        parsed_trees, records = parse_doc_cached(
+            parser, doc, tagged_doc,
+            format = format,
+            tokenize = tokenize,
+            batchsize = batchsize
+        )
+    # === END IF ===
+
+    return tagged_doc, parsed_trees, records, stages
+# === END ===
+
+def write_trees(
+    stream: typing.TextIO,
+    tagged_doc: typing.List[typing.List["depccg.tokens.Token"]],
+    parsed_trees: typing.Optional[typing.List[typing.Optional[typing.List[typing.Tuple["depccg.tree.Tree", float]]]]],
+    records: typing.Optional[typing.List[typing.List[dict]]] = None,
+    stages: typing.Optional[typing.List[str]] = None,
+    format: str = "abct",
+    start_id: int = 1
+) -> typing.NoReturn:
+    """
+    Write the trees of sentences to `stream`.
+
+    The "abct", "json" and "auto" formats are rendered here
+        (in the same way as the printer of depccg for the latter two) 
+        from `records` if given and from `parsed_trees` otherwise,
+        and the sentences are numbered from `start_id`.
+    The other formats are rendered by the printer of depccg from `parsed_trees`,
+        which numbers the sentences from 1 (or 0 in the "conll" format).
+
+    Parameters
+    ----------
+    stream : typing.TextIO
+        The stream to which the trees are written.
+    tagged_doc : typing.List[typing.List[depccg.tokens.Token]]
+        The tokens of the sentences.
+    parsed_trees : typing.List[typing.List[typing.Tuple[depccg.tree.Tree, float]]], optional
+        The n-best trees with their probabilities.
+    records : typing.List[typing.List[dict]], optional
+        The n-best trees in the form of `make_parse_record`.
+    stages : typing.List[str], optional
+        The stages at which the sentences are parsed, 
+            which are written in PARSE_STAGE_FORMATS.
+    format : str
+        The output format, one of OUTPUT_FORMATS.
+    start_id : int
+        The ID of the first sentence.
+    """
+    from depccg.printer import print_
+
+    with profile_stage("output formatting"):
+        if format == "abct":
+            # 木を1つのバッファに組み立て，まとめて書き出す
+            buffer: typing.List[str] = []
+            for i, tokens in enumerate(tagged_doc):
+                if records is None:
+                    nbest = parsed_trees[i]
+                else:
+                    nbest = ((entry["tree"], entry["prob"]) for entry in records[i])
+                # === END IF ===
+
+                for tree, prob in nbest:
+                    render_tree_ABCT(
+                        tree, tokens, prob, i + start_id, buffer,
+                        stage = None if stages is None else stages[i]
+                    )
+                # === END FOR ===
+
+                if len(buffer) >= ABCT_BUFFER_SIZE:
+                    stream.write("".join(buffer))
+                    buffer.clear()
+                # === END IF ===
+            # === END FOR ===
+            stream.write("".join(buffer))
+        elif format in ("json", "auto"):
+            # depccgのprinterと同じ出力を作る（jsonには木を作った段階を加える）
+            for i, tokens in enumerate(tagged_doc):
+                if records is not None:
+                    nbest = (
+                        (entry["tree" if format == "json" else "auto"], entry["prob"])
+                        for entry in records[i]
+                    )
+                elif format == "json":
+                    nbest = (
+                        (tree.json(tokens = tokens), prob) 
+                        for tree, prob in parsed_trees[i]
+                    )
+                else:
+                    nbest = (
+                        (tree.auto(tokens = tokens), prob) 
+                        for tree, prob in parsed_trees[i]
+                    )
+                # === END IF ===
+
+                for tree, prob in nbest:
+                    if format == "json":
+                        tree["id"] = i + start_id
+                        tree["prob"] = prob
+                        if stages is not None:
+                            tree["stage"] = stages[i]
+                        # === END IF ===
+                        stream.write(json.dumps(tree))
+                    else:
+                        stream.write(f"ID={i + start_id}, log probability={prob}\n{tree}")
+                    # === END IF ===
+                    stream.write("\n")
+                # === END FOR ===
+            # === END FOR ===
+        else:
+            # depccgのprinterは標準出力に書き出すので，streamに付け替える
+            with contextlib.redirect_stdout(stream):
+                print_(parsed_trees, tagged_doc, format = format, lang = 'ja')
+            # === END WITH ===
+        # === END IF ===
+    # === END WITH ===
+# === END ===
+
+def parse_and_dump(
+    parser: LazyParser,
+    doc: typing.List[str],
+    stream: typing.TextIO,
+    format: str = "abct",
+    tokenize: bool = False,
+    batchsize: int = 32,
+    start_id: int = 1,
+    tokenize_workers: int = 1,
+    tag_scores: typing.Optional[TagScoreWriter] = None
+) -> typing.NoReturn:
+    """
+    Parse sentences and write the trees to `stream`
+        (see `parse_sentences` and `write_trees`).
+    The trees of the sentences found in the parse cache are not parsed again.
+    Within the time budget of the parser, 
+        the stages of the trees are written
+        (`format` must be one of PARSE_STAGE_FORMATS).
+    """
+    if parser.time_budget > 0 and format not in PARSE_STAGE_FORMATS:
+        raise ValueError(f"Format not supported with a time budget: {format}")
+    # === END IF ===
+
+    if not doc:
+        return
+    # === END IF ===
+
+    tagged_doc, parsed_trees, records, stages = parse_sentences(
+        parser, doc,
+        format = format,
+        tokenize = tokenize,
+        batchsize = batchsize,
+        start_id = start_id,
+        tokenize_workers = tokenize_workers,
+        tag_scores = tag_scores
+    )
+    write_trees(
+        stream, tagged_doc, parsed_trees, records, stages,
+        format = format,
+        start_id = start_id
+    )
+# === END ===
+
+def report_stage_counts(stage_counts: typing.Dict[str, int]) -> typing.NoReturn:
+    """
+    Write the numbers of the sentences parsed at the stages 
+        within a time budget to STDERR.
+    """
+    sys.stderr.write(
+        "[Parser] Stages: " 
+        + ", ".join(
+            f"{stage} {count}" 
+            for stage, count in stage_counts.items()
+        ) 
+        + "\n"
+    )
+# === END ===
+
+__Worker_Parser: LazyParser = None
+
+def _init_parse_worker(
+    model: typing.Union[str, pathlib.Path],
+    model_key: typing.Optional[str] = None,
+    nbest: int = 1,
+    token_budget: int = TOKEN_BUDGET,
+    time_budget: float = 0.0
+) -> typing.NoReturn:
+    """
+    Initialize a worker process of `parse_and_dump_parallel`.
+    The model is loaded once at the first sentence not found in the parse cache.
+    """
+    import torch
+    global __Worker_Parser
+
+    # 各ワーカーは1スレッドで動かし，コアの取り合いを避ける
+    torch.set_num_threads(1)
+    __Worker_Parser = LazyParser(
+        model, 
+        key = model_key, 
+        nbest = nbest, 
+        token_budget = token_budget,
+        time_budget = time_budget
+    )
+# === END ===
+
+def _cache_counts() -> typing.List[typing.Tuple[int, int]]:
+    """
+    The hits and misses of the token cache and the parse cache (in this order).
+    """
+    return [
+        (cache.hits, cache.misses) if cache else (0, 0)
+        for cache in (get_token_cache(), get_parse_cache())
+    ]
+# === END ===
+
+def _parse_shard(
+    job: typing.Tuple[typing.List[str], str, bool, int]
+) -> typing.Tuple[
+    typing.List[typing.List[dict]],
+    typing.List[typing.List[dict]],
+    typing.Optional[typing.List[str]],
+    typing.List[typing.Tuple[int, int]]
+]:
+    """
+    Parse a shard of sentences in a worker process
+        and return the n-best trees in the form of `make_parse_record`,
+        the tokens as plain dicts, the stages (see `parse_sentences`)
+        and the hits and misses of the caches (see `_cache_counts`).
+    """
+    doc, format, tokenize, batchsize = job
+    counts_before = _cache_counts()
+
+    tagged_doc, parsed_trees, records, stages = parse_sentences(
+        __Worker_Parser, doc,
+        format = format,
+        tokenize = tokenize,
+        batchsize = batchsize
+    )
+
+    if records is None:
+        records = [
+            make_parse_record(parsed, tokens)
+            for parsed, tokens in zip(parsed_trees, tagged_doc)
+        ]
+    # === END IF ===
+
+    # depccgのTokenは__getattr__のためにpickleできないので，dictにして返す
+    return records, [
+        [dict(token) for token in tokens] for tokens in tagged_doc
+    ], stages, [
+        (hits - hits_before, misses - misses_before)
+        for (hits, misses), (hits_before, misses_before) 
+        in zip(_cache_counts(), counts_before)
+    ]
+# === END ===
+
+def parse_and_dump_parallel(
+    model: typing.Union[str, pathlib.Path],
+    shards: typing.Iterable[typing.List[str]],
+    stream: typing.TextIO,
+    workers: int,
+    format: str = "abct",
+    tokenize: bool = False,
+    batchsize: int = 32,
+    nbest: int = 1,
+    token_budget: int = TOKEN_BUDGET,
+    time_budget: float = 0.0
+) -> typing.NoReturn:
+    """
+    Parse shards of sentences across worker processes 
+        and write the trees to `stream` in the original order.
+
+    Each worker loads the model once (if the parse cache does not suffice)
+        and returns the trees in the form of `make_parse_record`,
+        which are rendered in this process (see `write_trees`).
+    At most twice as many shards as the workers are in flight,
+        so that `shards` can be read lazily.
+
+    The trees in PARSE_CACHE_RENDERED_FORMATS are written shard by shard,
+        with the IDs numbered throughout the shards.
+    The trees in the other formats are restored from their AUTO representations
+        (see `restore_parse_record`) and written at once after all the shards,
+        so that the printer of depccg numbers the sentences throughout
+        and makes a single document (e.g. in "xml" and "html").
+    depccg guesses the combinators of the restored trees from the categories,
+        which may differ from those of the parser in the formats showing them
+        (e.g. "deriv" and "xml").
+
+    Parameters
+    ----------
+    model : str or pathlib.Path
+        The path to the model directory.
+    shards : typing.Iterable[typing.List[str]]
+        The sentences divided into shards.
+    stream : typing.TextIO
+        The stream to which the trees are written.
+    workers : int
+        The number of worker processes.
+    """
+    import multiprocessing
+    from collections import deque
+    import depccg.tokens
+
+    if time_budget > 0 and format not in PARSE_STAGE_FORMATS:
+        raise ValueError(f"Format not supported with a time budget: {format}")
+    # === END IF ===
+
+    caches = (get_token_cache(), get_parse_cache())
+
+    # モデルのハッシュは一度だけ計算し，ワーカーに渡す
+    model_key: typing.Optional[str] = (
+        model_identity(model, nbest) if caches[1] else None
+    )
+
+    sent_count: int = 0
+    stage_counts: typing.Dict[str, int] = {stage: 0 for stage in PARSE_STAGES}
+    # 最後にまとめてdepccgのprinterで書き出す木と単語
+    restored_trees: typing.List[typing.List[typing.Tuple["depccg.tree.Tree", float]]] = []
+    restored_doc: typing.List[typing.List["depccg.tokens.Token"]] = []
+
+    def write_result(
+        result: typing.Tuple[
+            typing.List[typing.List[dict]],
+            typing.List[typing.List[dict]],
+            typing.Optional[typing.List[str]],
+            typing.List[typing.Tuple[int, int]]
+        ]
+    ) -> typing.NoReturn:
+        nonlocal sent_count
+        records, tagged_doc, stages, counts = result
+
+        if format in PARSE_CACHE_RENDERED_FORMATS:
+            write_trees(
+                stream, tagged_doc, None, records, stages,
+                format = format,
+                start_id = sent_count + 1
+            )
+            stream.flush()
+        else:
+            for i, record in enumerate(records):
+                parsed = restore_parse_record(record)
+                if parsed is None:
+                    raise RuntimeError(
+                        f"[Parser] Failed to restore the trees of the sentence {sent_count + i + 1}"
+                    )
+                # === END IF ===
+                restored_trees.append(parsed)
+            # === END FOR ===
+            restored_doc.extend(
+                [depccg.tokens.Token(**token) for token in tokens]
+                for tokens in tagged_doc
+            )
+        # === END IF ===
+        sent_count += len(records)
+
+        for stage in stages or ():
+            stage_counts[stage] += 1
+        # === END FOR ===
+
+        # ワーカーでのキャッシュのヒット数を集計する
+        for cache, (hits, misses) in zip(caches, counts):
+            if cache:
+                cache.hits += hits
+                cache.misses += misses
+            # === END IF ===
+        # === END FOR ===
+    # === END ===
+
+    with multiprocessing.Pool(
+        workers,
+        initializer = _init_parse_worker,
+        initargs = (model, model_key, nbest, token_budget, time_budget)
+    ) as pool:
+        pending: typing.Deque["multiprocessing.pool.AsyncResult"] = deque()
+
+        for shard in shards:
+            pending.append(
+                pool.apply_async(
+                    _parse_shard,
+                    (
+                        (shard, format, tokenize, batchsize),
+                    )
+                )
+            )
+
+            if len(pending) >= workers * 2:
+                write_result(pending.popleft().get())
+            # === END IF ===
+        # === END FOR shard ===
+
+        while pending:
+            write_result(pending.popleft().get())
+        # === END WHILE ===
+    # === END WITH pool ===
+
+    if restored_trees:
+        write_trees(stream, restored_doc, restored_trees, format = format)
+    # === END IF ===
+
+    if time_budget > 0:
+        report_stage_counts(stage_counts)
+    # === END IF ===
+# === END ===
+
+def main(args):
+    if args.build_userdic:
+        build_janome_userdic(janome_userdic_path())
+        return
+    # === END IF ===
+
+    if args.workers > 1 and not args.serve:
+        # ワーカーごとにモデルを読み込み，--batchsize文ずつ振り分ける
+        parse_and_dump_parallel(
+            args.model,
+            iter_doc_chunks(
+                sys.stdin if args.input is None else args.input.splitlines(),
+                args.batchsize
+            ),
+            sys.stdout,
+            workers = args.workers,
+            format = args.format,
+            tokenize = args.tokenize,
+            batchsize = args.batchsize,
+            nbest = args.nbest,
+            token_budget = args.token_budget,
+            time_budget = args.time_budget
+        )
+        return
+    # === END IF ===
+
+    # モデルは，キャッシュにない文を解析するときに初めて読み込む
+    parser = LazyParser(
+        args.model, 
+        nbest = args.nbest,
+        token_budget = args.token_budget,
+        time_budget = args.time_budget
+    )
+
+    if args.serve:
+        serve(parser, args)
+        return
+    # === END IF ===
+
+    # スーパータガーのスコアは入力全体について1つのファイルに書き出す
+    tag_scores: typing.Optional[TagScoreWriter] = (
+        TagScoreWriter(args.dump_tag_scores, args.tag_scores_topk)
+        if args.dump_tag_scores is not None
+        else None
+    )
+
+    # 中断されても，それまでに書き出したスコアを閉じる
+    try:
+        if args.stream and args.input is None:
+            # 標準入力から--batchsize文ずつ読み込み，解析し，出力する
+            # 文のIDは入力全体の通し番号となる
+            sent_count: int = 0
+            for doc in iter_doc_chunks(sys.stdin, args.batchsize):
+                parse_and_dump(
+                    parser, doc, sys.stdout,
+                    format = args.format,
+                    tokenize = args.tokenize,
+                    batchsize = args.batchsize,
+                    start_id = sent_count + 1,
+                    tokenize_workers = args.tokenize_workers,
+                    tag_scores = tag_scores
+                )
+                sys.stdout.flush()
+                sent_count += len(doc)
+            # === END FOR doc ===
+        else:
+            # 入力の文を読む
+            doc: typing.List[str]
+            if args.input is None:
+                # --input オプションが指定されていない場合，標準入力から文を読み込む
+                doc = split_doc(sys.stdin)
+            else:
+                # --input オプションが指定されている場合，それの引数である文字列を読み込む
+                doc = split_doc(args.input.splitlines())
+            # === END IF ===
+
+            parse_and_dump(
+                parser, doc, sys.stdout,
+                format = args.format,
+                tokenize = args.tokenize,
+                batchsize = args.batchsize,
+                tokenize_workers = args.tokenize_workers,
+                tag_scores = tag_scores
+            )
+        # === END IF ===
+    finally:
+        if tag_scores is not None:
+            tag_scores.close()
+        # === END IF ===
+    # === END TRY ===
+
+    if args.time_budget > 0:
+        report_stage_counts(parser.stage_counts)
+    # === END IF ===
+# === END ===
+
+# ======
+# 4. Parsing Server
+# ======
+def serve(
+    parser: LazyParser,
+    args: argparse.Namespace
+) -> typing.NoReturn:
+    """
+    Run an HTTP server which keeps the parser (and the Janome tokenizer) warm.
+
+    Requests are POSTed to "/" as JSON objects:
+
+        {"input": "何 か の 文", "format": "abct", "tokenize": false}
+
+    where "input" is mandatory and may contain multiple lines (sentences),
+        and "format" and "tokenize" (a JSON boolean) default to the command-line options.
+    The trees are returned as plain text.
+    A GET request to "/" answers "ok" once the server is ready.
+    Requests are processed one by one.
+    """
+    import http.server
+    import io
+
+    # モデルとJanomeの初期化をここで済ませておく
+    parser.get()
+    parser.get_tagger()
+    if parser.time_budget > 0:
+        parser.get_fallback()
+    # === END IF ===
+    __init_janome_tokenizer()
+
+    class ParseRequestHandler(http.server.BaseHTTPRequestHandler):
+        def _respond(self, code: int, body: str) -> None:
+            body_bytes = body.encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(body_bytes)))
+            self.end_headers()
+            self.wfile.write(body_bytes)
+        # === END ===
+
+        def do_GET(self):
+            self._respond(200, "ok\n")
+        # === END ===
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length).decode("utf-8"))
+                doc = split_doc(str(request["input"]).splitlines())
+                format = request.get("format", args.format)
+                tokenize = request.get("tokenize", args.tokenize)
+
+                if format not in OUTPUT_FORMATS:
+                    raise ValueError(f"Unknown format: {format}")
+                # === END IF ===
+
+                if parser.time_budget > 0 and format not in PARSE_STAGE_FORMATS:
+                    raise ValueError(f"Format not supported with a time budget: {format}")
+                # === END IF ===
+
+                # "false" などの文字列は真と見なされてしまうので，真偽値のみ受け付ける
+                if not isinstance(tokenize, bool):
+                    raise ValueError(f"tokenize must be a boolean: {tokenize!r}")
+                # === END IF ===
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                self._respond(400, f"Bad request: {e}\n")
+                return
+            # === END TRY ===
+
+            output = io.StringIO()
+            try:
+                parse_and_dump(
+                    parser, doc, output,
+                    format = format,
+                    tokenize = tokenize,
+                    batchsize = args.batchsize,
+                    tokenize_workers = args.tokenize_workers
+                )
+            except Exception as e:
+                self._respond(500, f"Parse failure: {e}\n")
+                return
+            # === END TRY ===
+
+            self._respond(200, output.getvalue())
+        # === END ===
+
+        def log_message(self, format, *log_args):
+            sys.stderr.write(f"[Server] {self.address_string()} {format % log_args}\n")
+        # === END ===
+    # === END CLASS ===
+
+    server = http.server.HTTPServer((args.host, args.port), ParseRequestHandler)
+    sys.stderr.write(f"[Server] Listening on {args.host}:{args.port}\n")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    # === END TRY ===
+# === END ===
+
+# ======
+# 5. Commandline wrappers
+# ======
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('A* CCG parser')
+    parser.set_defaults(func=lambda _: parser.print_help())
+
+    parser.add_argument(
+        '-m',
+        '--model',
+        help='path to a model directory'
+    )
+
+    parser.add_argument(
+        '-i', '--input',
+        type = typing.Union[str],
+        default = None,
+        help = "input to parse"
+    )
+
+    parser.add_argument('--batchsize',
+                        type=int,
+                        default=32,
+                        help='batchsize in supertagger (the maximum number of sentences in a batch with --token-budget)')
+    parser.add_argument('--token-budget',
+                        type=int,
+                        default=TOKEN_BUDGET,
+                        help='the maximum number of tokens (including the padding) in a batch of the supertagger, into which sentences of similar lengths are gathered (0 to make batches of --batchsize sentences in the input order)')
+    parser.add_argument('--time-budget',
+                        type=float,
+                        default=0.0,
+                        metavar='SECONDS',
+                        help='parse sentences one by one in a child process, falling back to A* with fewer rules if A* with all the rules fails or runs out of its share of SECONDS, and then to a FRAG tree over the words if that fails or runs out of SECONDS; the stage of each tree is recorded, only in the "abct" and "json" formats (0 to parse at once as depccg does)')
+    parser.add_argument('-f',
+                        '--format',
+                        default='abct',
+                        choices=OUTPUT_FORMATS,
+                        help='output format')
+    parser.add_argument('--tokenize',
+                        action='store_true',
+                        help='tokenize input sentences')
+    parser.add_argument('--nbest',
+                        type=int,
+                        default=1,
+                        help='the number of trees output for each sentence')
+    parser.add_argument('--dump-tag-scores',
+                        default=None,
+                        metavar='NPZ',
+                        help='write the top-k scores of the supertagger for each token to NPZ (a NumPy .npz file) in the same pass, appending them chunk by chunk and joining them at exit (not with --workers or --serve)')
+    parser.add_argument('--tag-scores-topk',
+                        type=int,
+                        default=10,
+                        help='the number of categories of which the scores are written for each token with --dump-tag-scores')
+
+    parser.add_argument('--profile',
+                        nargs='?',
+                        const='-',
+                        default=None,
+                        metavar='JSON',
+                        help='write a JSON report of the wall time of each stage (model load, Janome init, user dictionary generation, tokenization, supertagging, A* search, output formatting), tokens/sec and the peak memory to JSON, or to STDERR if JSON is omitted (not with --workers or --serve)')
+    parser.add_argument('--profile-latency',
+                        action='store_true',
+                        help='with --profile, parse sentences one by one to add the latency of each sentence to the report, so that the time of A* search is not that of the batched search without --time-budget (the latencies are always recorded with --time-budget)')
+
+    parser.add_argument('--tokenize-workers',
+                        type=int,
+                        default=1,
+                        help='the number of Janome tokenizer processes (ignored with --workers)')
+
+    parser.add_argument('--token-cache-size',
+                        type=int,
+                        default=TOKEN_CACHE_SIZE // (1024 * 1024),
+                        help='maximum size in MiB of the on-disk cache of tokenization results')
+    parser.add_argument('--no-token-cache',
+                        action='store_true',
+                        help='disable the cache of tokenization results')
+    parser.add_argument('--parse-cache-size',
+                        type=int,
+                        default=PARSE_CACHE_SIZE // (1024 * 1024),
+                        help='maximum size in MiB of the on-disk cache of parse results')
+    parser.add_argument('--no-cache',
+                        action='store_true',
+                        help='disable the caches of parse results and tokenization results')
+
+    parser.add_argument('--cache-dir',
+                        default=None,
+                        help=f'directory of caches (default: $ABC_DEPCCG_CACHE or {DIR_CACHE})')
+    parser.add_argument('--build-userdic',
+                        action='store_true',
+                        help='(re)build the compiled Janome user dictionary in the cache and exit')
+
+    parser.add_argument('--stream',
+                        action='store_true',
+                        help='parse STDIN in chunks of --batchsize sentences and write the trees of each chunk immediately')
+
+    parser.add_argument('--workers',
+                        type=int,
+                        default=1,
+                        help='the number of parser processes, each of which loads the model and returns the trees to be written by the main process')
+
+    parser.add_argument('--serve',
+                        action='store_true',
+                        help='run as an HTTP server keeping the model loaded')
+    parser.add_argument('--host',
+                        default='127.0.0.1',
+                        help='address the server listens on')
+    parser.add_argument('--port',
+                        type=int,
+                        default=8300,
+                        help='port the server listens on')
+
+    args = parser.parse_args()
+
+    if args.nbest < 1:
+        parser.error('--nbest must be at least 1')
+    # === END IF ===
+
+    if args.tag_scores_topk < 1:
+        parser.error('--tag-scores-topk must be at least 1')
+    # === END IF ===
+
+    if args.dump_tag_scores is not None and (args.workers > 1 or args.serve):
+        parser.error('--dump-tag-scores cannot be used with --workers or --serve')
+    # === END IF ===
+
+    if args.time_budget > 0 and args.format not in PARSE_STAGE_FORMATS:
+        parser.error('--time-budget supports only the "abct" and "json" formats, which record the stages of the trees')
+    # === END IF ===
+
+    if args.profile is not None and (args.workers > 1 or args.serve):
+        parser.error('--profile cannot be used with --workers or --serve')
+    # === END IF ===
+
+    if args.profile_latency and args.profile is None:
+        parser.error('--profile-latency requires --profile')
+    # === END IF ===
+
+    if args.cache_dir is not None:
+        DIR_CACHE = pathlib.Path(args.cache_dir)
+    # === END IF ===
+
+    TOKEN_CACHE_SIZE = (
+        0 if args.no_cache or args.no_token_cache 
+        else args.token_cache_size * 1024 * 1024
+    )
+    PARSE_CACHE_SIZE = (
+        0 if args.no_cache
+        else args.parse_cache_size * 1024 * 1024
+    )
+
+    if args.profile is not None:
+        start_profiler(per_sentence = args.profile_latency)
+    # === END IF ===
+
+    try:
+        main(args)
+        report_cache_stats()
+    finally:
+        # 途中で失敗しても，そこまでの記録を書き出す
+        if args.profile is not None:
+            get_profiler().write(args.profile)
+        # === END IF ===
+    # === END TRY ===
 # === END IF ===
@@ -0,0 +1,165 @@
+#!/usr/bin/python3
+"""
+An opt-in profiler of the parse path of `parser.py` (see its `--profile` option).
+"""
+
+import typing
+import sys
+import json
+import time
+import resource
+import contextlib
+
+"""
+Why the report has no number of the A* steps.
+"""
+ASTAR_STEPS_UNAVAILABLE: str = (
+    "depccg counts the A* steps of a sentence inside its C++ core "
+    "and exposes neither the counts nor the max_steps of its parsers"
+)
+
+class ParseProfiler:
+    """
+    The records of the wall time spent at the stages of the parse path
+        (e.g. "model load", "tokenization", "A* search")
+        and of the latencies of the sentences parsed.
+
+    Stages can be nested (e.g. the model is loaded at the first supertagging).
+    The time of an inner stage is not counted in the outer ones,
+        so that the times of the stages add up to (at most) the total time.
+
+    The number of the A* steps is not recorded,
+        as depccg does not expose it (see ASTAR_STEPS_UNAVAILABLE).
+
+    Attributes
+    ----------
+    per_sentence : bool
+        Whether the sentences are parsed one by one 
+            to record their latencies (see `add_latency`)
+            instead of at once as in production.
+    stages : typing.Dict[str, typing.Dict[str, float]]
+        The wall time in seconds and the number of the calls of each stage.
+    sentences : int
+        The number of the sentences processed, including those in the parse cache.
+    tokens : int
+        The number of the tokens of the sentences processed.
+    latencies : typing.List[typing.Dict[str, typing.Any]]
+        The records of the sentences parsed (see `add_latency`).
+    """
+
+    def __init__(self, per_sentence: bool = False):
+        self.per_sentence = per_sentence
+        self.stages: typing.Dict[str, typing.Dict[str, float]] = {}
+        self.sentences = 0
+        self.tokens = 0
+        self.latencies: typing.List[typing.Dict[str, typing.Any]] = []
+        self._start = time.perf_counter()
+        # The time of the inner stages of each running stage
+        self._inner: typing.List[float] = []
+    # === END ===
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> typing.Iterator[None]:
+        """
+        Measure the wall time of a stage.
+        """
+        self._inner.append(0.0)
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start
+            record = self.stages.setdefault(name, {"wall_time": 0.0, "calls": 0})
+            record["wall_time"] += wall - self._inner.pop()
+            record["calls"] += 1
+
+            if self._inner:
+                self._inner[-1] += wall
+            # === END IF ===
+        # === END TRY ===
+    # === END ===
+
+    def add_doc(self, sentences: int, tokens: int) -> typing.NoReturn:
+        """
+        Count the sentences processed and their tokens.
+        """
+        self.sentences += sentences
+        self.tokens += tokens
+    # === END ===
+
+    def add_latency(
+        self,
+        tokens: int,
+        seconds: float,
+        **info: typing.Any
+    ) -> typing.NoReturn:
+        """
+        Record the time of parsing a sentence of `tokens` tokens
+            together with other figures (e.g. the stage of the fallback).
+        """
+        self.latencies.append(dict(tokens = tokens, seconds = seconds, **info))
+    # === END ===
+
+    def report(self) -> typing.Dict[str, typing.Any]:
+        """
+        Summarize the records:
+            the total wall time,
+            the wall time of each stage and that of the others,
+            the numbers of the sentences and the tokens,
+            the tokens per second throughout,
+            the number of the A* steps (always None, with the reason),
+            the percentiles of the latencies of the sentences parsed
+            (and the latencies themselves) if they are recorded,
+            and the peak resident set sizes in KiB
+            of this process and of its joined child processes.
+        """
+        total = time.perf_counter() - self._start
+        seconds = sorted(record["seconds"] for record in self.latencies)
+
+        def percentile(q: int) -> typing.Optional[float]:
+            if not seconds:
+                return None
+            # === END IF ===
+            return seconds[min(len(seconds) - 1, len(seconds) * q // 100)]
+        # === END ===
+
+        return {
+            "wall_time": total,
+            "stages": self.stages,
+            "other_wall_time": total - sum(
+                record["wall_time"] for record in self.stages.values()
+            ),
+            "sentences": self.sentences,
+            "tokens": self.tokens,
+            "tokens_per_second": self.tokens / total if total > 0 else None,
+            "astar_steps": None,
+            "astar_steps_reason": ASTAR_STEPS_UNAVAILABLE,
+            "latency": {
+                "sentences": len(seconds),
+                "mean": sum(seconds) / len(seconds) if seconds else None,
+                "p50": percentile(50),
+                "p90": percentile(90),
+                "p99": percentile(99),
+                "max": seconds[-1] if seconds else None,
+            },
+            "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "peak_rss_children_kib": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+            "sentence_latencies": self.latencies,
+        }
+    # === END ===
+
+    def write(self, path: str) -> typing.NoReturn:
+        """
+        Write the report as JSON to a file, or to STDERR if `path` is "-".
+        """
+        if path == "-":
+            json.dump(self.report(), sys.stderr, indent = 2)
+            sys.stderr.write("\n")
+        else:
+            with open(path, "w") as h_report:
+                json.dump(self.report(), h_report, indent = 2)
+            # === END WITH h_report ===
+        # === END IF ===
+    # === END ===
+# === END CLASS ===
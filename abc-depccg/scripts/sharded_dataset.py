@@ -0,0 +1,232 @@
+#!/usr/bin/python3
+"""
+Sharded, pre-indexed training data for the supertagger
+    and the dataset reader of `supertagger.jsonnet` which streams it.
+
+A sharded dataset is a folder made by `write_shards` from `traindata.json`.
+Each shard of at most `SHARD_SIZE` sentences consists of:
+
+    <shard>.sents.txt         the sentences, one per line
+    <shard>.offsets.npy       the offsets of the sentences in the arrays below
+    <shard>.tokens.npy        the IDs of the words in the namespace "tokens"
+    <shard>.head_tags.npy     the IDs of the categories in the namespace "head_tags"
+    <shard>.head_indices.npy  the indices of the heads
+
+The arrays are memory-mapped by the reader,
+    so that each epoch neither parses the whole JSON
+    nor looks up the words and the categories in the vocabulary again.
+"""
+
+import typing
+import json
+import pathlib
+import logging
+
+import numpy
+
+from allennlp.data.dataset_readers.dataset_reader import DatasetReader
+from allennlp.data.fields import SequenceLabelField, TextField, MetadataField, ArrayField
+from allennlp.data.instance import Instance
+from allennlp.data.tokenizers import Token
+from allennlp.data.vocabulary import Vocabulary
+
+from depccg.models.my_allennlp.dataset.ja_supertagging_dataset import JaSupertaggingDatasetReader
+
+logger = logging.getLogger(__name__)
+
+"""
+The maximum number of sentences in a shard.
+"""
+SHARD_SIZE: int = 10000
+
+"""
+The name of the file which describes a sharded dataset.
+"""
+SHARDS_META: str = "meta.json"
+
+def write_shards(
+    p_samples: pathlib.Path,
+    dir_shards: pathlib.Path,
+    vocab: Vocabulary,
+    shard_size: int = SHARD_SIZE
+) -> int:
+    """
+    Convert training data (`traindata.json`) into a sharded dataset.
+
+    Parameters
+    ----------
+    p_samples : pathlib.Path
+        The training data made by `trainer.py`.
+    dir_shards : pathlib.Path
+        The folder of the sharded dataset.
+    vocab : allennlp.data.vocabulary.Vocabulary
+        The vocabulary of the training,
+            by which the words and the categories are indexed.
+
+    Returns
+    -------
+    count : int
+        The number of the sentences.
+    """
+    with open(p_samples, "r") as h_samples:
+        samples = json.load(h_samples)
+    # === END WITH h_samples ===
+
+    dir_shards.mkdir(parents = True, exist_ok = True)
+    shards: typing.List[str] = []
+
+    for start in range(0, len(samples), shard_size):
+        shard = f"{start // shard_size:05d}"
+        chunk = samples[start:start + shard_size]
+
+        offsets = numpy.zeros(len(chunk) + 1, dtype = numpy.int64)
+        tokens: typing.List[int] = []
+        head_tags: typing.List[int] = []
+        head_indices: typing.List[int] = []
+
+        with open(dir_shards / f"{shard}.sents.txt", "w") as h_sents:
+            for i, (sentence, (tags, deps)) in enumerate(chunk):
+                h_sents.write(sentence)
+                h_sents.write("\n")
+
+                tokens.extend(
+                    vocab.get_token_index(word, "tokens")
+                    for word in sentence.split(" ")
+                )
+                head_tags.extend(
+                    vocab.get_token_index(tag, "head_tags")
+                    for tag in tags
+                )
+                head_indices.extend(deps)
+                offsets[i + 1] = len(tokens)
+            # === END FOR i, (sentence, (tags, deps)) ===
+        # === END WITH h_sents ===
+
+        numpy.save(dir_shards / f"{shard}.offsets.npy", offsets)
+        for name, ids in (
+            ("tokens", tokens),
+            ("head_tags", head_tags),
+            ("head_indices", head_indices)
+        ):
+            numpy.save(
+                dir_shards / f"{shard}.{name}.npy",
+                numpy.array(ids, dtype = numpy.int32)
+            )
+        # === END FOR name, ids ===
+
+        shards.append(shard)
+    # === END FOR start ===
+
+    with open(dir_shards / SHARDS_META, "w") as h_meta:
+        json.dump(
+            {"shards": shards, "instances": len(samples)},
+            h_meta
+        )
+    # === END WITH h_meta ===
+
+    return len(samples)
+# === END ===
+
+def read_shards(
+    dir_shards: pathlib.Path
+) -> typing.Iterator[typing.Tuple[str, numpy.ndarray, numpy.ndarray, numpy.ndarray]]:
+    """
+    Stream the sentences of a sharded dataset.
+
+    Yields
+    ------
+    sentence : str
+        The words separated by spaces.
+    tokens, head_tags, head_indices : numpy.ndarray
+        Views of the memory-mapped arrays of the sentence.
+    """
+    with open(dir_shards / SHARDS_META, "r") as h_meta:
+        meta = json.load(h_meta)
+    # === END WITH h_meta ===
+
+    for shard in meta["shards"]:
+        offsets, tokens, head_tags, head_indices = (
+            numpy.load(dir_shards / f"{shard}.{name}.npy", mmap_mode = "r")
+            for name in ("offsets", "tokens", "head_tags", "head_indices")
+        )
+
+        with open(dir_shards / f"{shard}.sents.txt", "r") as h_sents:
+            for i, line in enumerate(h_sents):
+                begin, end = offsets[i], offsets[i + 1]
+                yield (
+                    line.rstrip("\n"),
+                    tokens[begin:end],
+                    head_tags[begin:end],
+                    head_indices[begin:end],
+                )
+            # === END FOR i, line ===
+        # === END WITH h_sents ===
+    # === END FOR shard ===
+# === END ===
+
+@DatasetReader.register("ja_sharded_supertagging_dataset")
+class ShardedSupertaggingDatasetReader(JaSupertaggingDatasetReader):
+    """
+    The reader of sharded datasets (see `write_shards`).
+    Other paths are read by `ja_supertagging_dataset`.
+
+    The words are given their IDs in the namespace "tokens"
+        through `allennlp.data.tokenizers.Token.text_id`,
+        which the `single_id` indexer uses as they are.
+    The categories are given as IDs,
+        which `SequenceLabelField` does not index again.
+    The characters are indexed by the `characters` indexer as usual.
+    """
+
+    def _read(self, file_path):
+        dir_shards = pathlib.Path(file_path)
+
+        if not (dir_shards / SHARDS_META).exists():
+            yield from super()._read(file_path)
+            return
+        # === END IF ===
+
+        logger.info(f'Reading instances from shards at: {file_path}')
+        for sentence, tokens, head_tags, head_indices in read_shards(dir_shards):
+            yield self.indexed_to_instance(
+                sentence, tokens, head_tags, head_indices
+            )
+        # === END FOR ===
+    # === END ===
+
+    def indexed_to_instance(
+        self,
+        sentence: str,
+        tokens: numpy.ndarray,
+        head_tags: numpy.ndarray,
+        head_indices: numpy.ndarray,
+        weight: float = 1.0
+    ) -> Instance:
+        """
+        The same instance as `text_to_instance` from a pre-indexed sentence.
+        """
+        token_field = TextField(
+            [
+                Token(word, text_id = int(token_id))
+                for word, token_id in zip(sentence.split(" "), tokens)
+            ],
+            self._token_indexers
+        )
+
+        return Instance(
+            {
+                "words": token_field,
+                "metadata": MetadataField({"words": sentence}),
+                "weight": ArrayField(numpy.array([weight], "f")),
+                "head_tags": SequenceLabelField(
+                    head_tags.tolist(), token_field,
+                    label_namespace = "head_tags"
+                ),
+                "head_indices": SequenceLabelField(
+                    head_indices.tolist(), token_field,
+                    label_namespace = "head_indices"
+                ),
+            }
+        )
+    # === END ===
+# === END CLASS ===
@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+"""
+    Synthetic treebanks in the ABC Treebank format,
+    which `trainer.py --synthetic` trains on for smoke tests
+    and `benchmark.py` preprocesses.
+"""
+import typing
+import pathlib
+
+"""
+    Words of the synthetic treebanks.
+"""
+SYNTHETIC_NOUNS: typing.List[str] = [
+    "太郎", "花子", "本", "猫", "犬", "山", "川", "学校", "先生", "手紙",
+] + [f"名詞{i}" for i in range(200)]
+
+SYNTHETIC_VERBS: typing.List[str] = [
+    "走っ", "読ん", "見", "書い", "行っ",
+] + [f"動詞{i}" for i in range(100)]
+
+def generate_synthetic_tree(rng: "random.Random", tree_id: int) -> str:
+    """
+        Generate a random tree in the ABC Treebank format
+        (the input of `trainer.py`).
+        A clause of a subject, some objects and a verb,
+        whose nouns are optionally modified by adnominal verbs.
+    """
+    def noun_phrase() -> str:
+        noun = f"(NP {rng.choice(SYNTHETIC_NOUNS)})"
+
+        if rng.random() < 0.2:
+            # An adnominal modifier
+            return f'(NP."R" (<NP/NP> {rng.choice(SYNTHETIC_VERBS)}た) {noun})'
+        else:
+            return noun
+        # === END IF ===
+    # === END ===
+
+    def predicate(n_args: int) -> str:
+        if n_args == 0:
+            return f"(<PPs\\Sm> {rng.choice(SYNTHETIC_VERBS)}た)"
+        else:
+            obj = f'(PPo1."L" {noun_phrase()} (<NP\\PPo1> を))'
+            return f'(<PPs\\Sm>."L" {obj} {predicate(n_args - 1)})'
+        # === END IF ===
+    # === END ===
+
+    subj = f'(PPs."L" {noun_phrase()} (<NP\\PPs> {rng.choice(["が", "は"])}))'
+    clause = f'(Sm."L" {subj} {predicate(rng.randint(0, 3))})'
+    return f"(TOP {clause} (ID {tree_id}_synthetic;JP))"
+# === END ===
+
+def generate_synthetic_treebank(
+    dir_treebank: typing.Union[str, pathlib.Path],
+    files: int,
+    trees: int,
+    seed: int = 0
+) -> pathlib.Path:
+    """
+        Generate a synthetic treebank of `files` .psd files
+        each of which contains `trees` trees.
+
+        Returns
+        -------
+        dir_treebank : pathlib.Path
+            The directory of the treebank.
+    """
+    import random
+
+    rng = random.Random(seed)
+    dir_treebank = pathlib.Path(dir_treebank)
+    dir_treebank.mkdir(parents = True, exist_ok = True)
+
+    tree_id: int = 0
+    for i in range(files):
+        with open(dir_treebank / f"synthetic_{i:04d}.psd", "w") as h_treefile:
+            for _ in range(trees):
+                h_treefile.write(generate_synthetic_tree(rng, tree_id))
+                h_treefile.write("\n")
+                tree_id += 1
+            # === END FOR ===
+        # === END WITH h_treefile ===
+    # === END FOR i ===
+
+    return dir_treebank
+# === END ===
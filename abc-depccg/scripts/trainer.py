@@ -6,10 +6,16 @@ import itertools
 import functools
 
 import os
+import sys
 import shutil
 import pathlib
 import datetime
 import json
+import re
+import time
+import contextlib
+
+from category import Category, parse_category
 
 # ======
 # Data Types
@@ -124,31 +130,64 @@ CAT_PP_LISTS_SCRAMBLED: typing.Dict[tuple, typing.Set[tuple]] = {
     for ortho in CAT_PP_LISTS_ORTHODOX_PL
 }
 
-def generate_category(head: str, args: typing.List[str], is_bracketed = False) -> str:
-    if args:
-        return "{br_open}{others}\\{arg}{br_close}".format(
-            br_open = "(" if is_bracketed else "",
-            br_close = ")" if is_bracketed else "",
-            arg = args[0],
-            others = generate_category(head, args[1:], True)
-        )
+def generate_category(
+    head: typing.Union[str, Category], 
+    args: typing.Sequence[typing.Union[str, Category]]
+) -> Category:
+    """
+        Generate a predicate category which takes `args` leftwards.
+
+        Parameters
+        ----------
+        head : str or Category
+            The category of the predicate saturated.
+        args : typing.Sequence[str or Category]
+            The arguments, the outermost one first.
+
+        Returns
+        -------
+        category : Category
+            The interned predicate category.
+
+        Examples
+        --------
+        >>> str(generate_category("S[m]", ("PP[o1]", "PP[s]")))
+        '(S[m]\\PP[s])\\PP[o1]'
+    """
+    res = as_category(head)
+
+    for arg in reversed(args):
+        res = Category.left(as_category(arg), res)
+    # === END FOR arg ===
+
+    return res
+# === END ===
+
+def as_category(cat: typing.Union[str, Category]) -> Category:
+    """
+        Get the interned category object of `cat`.
+    """
+    if isinstance(cat, Category):
+        return cat
     else:
-        return head
+        return parse_category(cat)
     # === END IF ===
 # === END ===
 
 @functools.lru_cache()
-def gen_unary_rules() -> typing.List[typing.Tuple[str, str]]:
+def gen_unary_rules() -> typing.List[typing.Tuple[Category, Category]]:
     """
         Generate all the unary rules for the ABC Treebank.
 
         Returns
         -------
-        unary_rules : typing.List[typing.Tuple[str, str]]
+        unary_rules : typing.List[typing.Tuple[Category, Category]]
             A list of pairs of 
                 categories which represents a permitted unary branching.
             Upper nodes are the second elements of the pairs
                 and lower nodes are the first elements.
+            The categories are interned and are dumped 
+                in the depccg format by `str`.
     """
 
     res = []
@@ -186,10 +225,10 @@ def gen_unary_rules() -> typing.List[typing.Tuple[str, str]]:
     res.extend(
         (
             generate_category("S[rel]", (arg, )), # inner
-            f"{np}/{np}",                         # outer
+            Category.right(np, np),               # outer
         )
         for arg in CAT_PPS
-        for np in CAT_NPS
+        for np in map(parse_category, CAT_NPS)
     )
 
     # =====
@@ -199,21 +238,21 @@ def gen_unary_rules() -> typing.List[typing.Tuple[str, str]]:
             CAT_CLAUSES, 
             CAT_PP_LISTS_ORTHODOX_WITHZERO
     ):
-        pred: str = generate_category(cl, args, is_bracketed = True)
+        pred: Category = generate_category(cl, args)
 
         # Full
         res.append(
             (
-                "S[a]",            # inner
-                f"{pred}/{pred}", # outer
+                parse_category("S[a]"),     # inner
+                Category.right(pred, pred), # outer
             )
         )
 
         # Controlled
         res.append(
             (
-                "S[a]\\PP[s]",    # inner
-                f"{pred}/{pred}", # outer
+                parse_category("S[a]\\PP[s]"), # inner
+                Category.right(pred, pred),     # outer
             )
         )
     # === END FOR ===
@@ -223,8 +262,8 @@ def gen_unary_rules() -> typing.List[typing.Tuple[str, str]]:
     # ======
     res.extend(
         (
-            np,             # inner
-            f"{cl}\\PP[s]", # outer
+            parse_category(np),              # inner
+            generate_category(cl, ("PP[s]", )), # outer
         )
         for cl in CAT_CLAUSES
         for np in CAT_NPS
@@ -237,8 +276,8 @@ def gen_unary_rules() -> typing.List[typing.Tuple[str, str]]:
     for pp in CAT_PPS:
         res.append(
             (
-                "DP", # inner
-                pp,   # outer
+                parse_category("DP"), # inner
+                parse_category(pp),   # outer
             )
         )
     # === END FOR ===
@@ -249,7 +288,8 @@ def gen_unary_rules() -> typing.List[typing.Tuple[str, str]]:
     # ======
 
     res.extend(
-        (
+        (parse_category(inner), parse_category(outer))
+        for inner, outer in (
             ("NP", "DP"), # Covert Determiner
             ("QP", "DP"), # Covert Determiner
 
@@ -288,28 +328,32 @@ def gen_unary_rules() -> typing.List[typing.Tuple[str, str]]:
     return res
 # === END ===
 
-def mod_treebank(
+@functools.lru_cache()
+def gen_sorted_unary_rules() -> typing.List[typing.Tuple[Category, Category]]:
+    """
+        The unary rules generated by `gen_unary_rules` without duplicates,
+        sorted by the depccg representations of the categories,
+        so that the parser settings are the same across runs.
+    """
+    return sorted(
+        set(gen_unary_rules()),
+        key = lambda rule: (rule[0].depccg, rule[1].depccg)
+    )
+# === END ===
+
+def make_modder_settings(
     p_treebank: pathlib.Path,
-    dir_output: pathlib.Path,
-    mode: str
+    dir_output: pathlib.Path
 ) -> ModderSettings:
-    import depccg.tools.ja.keyaki_reader as kr
-
     """
-        Digest a raw treebank file via `depccg.tools.ja.keyaki_reader` and 
-        dump the results to the designated output folder.
-        The used settings is what this function returns.
+        Make the default settings of the digester.
 
         Parameters
         ----------
         p_treebank : pathlib.Path
             The path to the treebank, which is a single file.
-
-        Returns
-        -------
-        parser_settings : ModderSettings
-            A default set of settings of the digester,
-            which may be necessary later.
+        dir_output : pathlib.Path
+            The folder to which the digested treebank is dumped.
     """
     modder_settings = ModderSettings()
     modder_settings.PATH = p_treebank
@@ -319,33 +363,1037 @@ def mod_treebank(
     modder_settings.char_freq_cut = 5
     modder_settings.cat_freq_cut = 5
 
-    # Do the digest
-    if mode == "train":
-        kr.TrainingDataCreator.create_traindata(
-            modder_settings,
+    return modder_settings
+# === END ===
+
+def read_treebank_line(line: str) -> typing.Optional["kr.Tree"]:
+    """
+        Parse a line (i.e. a tree) of a treebank file 
+        in the same way as `depccg.tools.ja.keyaki_reader.read_keyaki`.
+
+        Returns
+        -------
+        tree : depccg.tools.ja.keyaki_reader.Tree, optional
+            The tree without the TOP node.
+            None if the tree is malformed or is not to be used.
+    """
+    import depccg.tools.ja.keyaki_reader as kr
+
+    try:
+        tree = kr.KeyakiParser(line.strip()).parse()
+    except AssertionError:
+        return None
+    # === END TRY ===
+
+    if isinstance(tree, kr.Tree):
+        tree = tree.children[0]
+    # === END IF ===
+
+    if kr.tree_is_to_be_used(tree):
+        return tree
+    else:
+        return None
+    # === END IF ===
+# === END ===
+
+class TreebankDigester:
+    """
+        A digester of trees which makes the same outputs as 
+        `depccg.tools.ja.keyaki_reader.TrainingDataCreator.create_traindata`
+        (mode "train") and `.create_testdata` (mode "test"),
+        but is fed trees one by one,
+        so that multiple digests are made in a single pass over a treebank.
+        The mode "targets" only collects the categories (`target.txt`).
+
+        Attributes
+        ----------
+        settings : ModderSettings
+            The settings of the digester.
+        mode : str
+            "train", "test" or "targets".
+        trees : int
+            The number of the trees digested.
+    """
+
+    def __init__(
+        self,
+        p_treebank: pathlib.Path,
+        dir_output: pathlib.Path,
+        mode: str
+    ):
+        import depccg.tools.ja.keyaki_reader as kr
+
+        if mode not in ("train", "test", "targets"):
+            raise ValueError
+        # === END IF ===
+
+        self.settings: ModderSettings = make_modder_settings(p_treebank, dir_output)
+        self.mode: str = mode
+        self.trees: int = 0
+        self._creator = kr.TrainingDataCreator(
+            p_treebank,
+            self.settings.word_freq_cut,
+            self.settings.char_freq_cut,
+            self.settings.cat_freq_cut
         )
+    # === END ===
+
+    @classmethod
+    def partial(cls, mode: str) -> "TreebankDigester":
+        """
+            Make a digester of a part of a treebank,
+            which is to be merged into another one by `merge`.
+            Its frequencies start from zero 
+            and it has no output folder.
+        """
+        from collections import defaultdict
+
+        self = cls(None, None, mode)
+        self._creator.cats = defaultdict(int)
+        self._creator.words = defaultdict(int)
+        self._creator.chars = defaultdict(int)
+
+        return self
+    # === END ===
+
+    def merge(self, other: "TreebankDigester") -> typing.NoReturn:
+        """
+            Add the results of another digester (made by `partial`) to this one.
+            Merging partial digesters in the order of the trees
+            gives the same results as digesting the trees one by one,
+            as the frequency cutoffs are applied only on `dump`.
+        """
+        creator, creator_other = self._creator, other._creator
+
+        for name in ("cats", "words", "chars", "seen_rules", "unary_rules"):
+            freqs = getattr(creator, name)
+            for key, freq in getattr(creator_other, name).items():
+                freqs[key] += freq
+            # === END FOR key, freq ===
+        # === END FOR name ===
+
+        creator.samples.extend(creator_other.samples)
+        creator.sents.extend(creator_other.sents)
+        self.trees += other.trees
+    # === END ===
+
+    def add(self, tree: "kr.Tree") -> typing.NoReturn:
+        """
+            Digest a tree read by `read_treebank_line`.
+        """
+        if self.mode != "test":
+            self._creator._traverse(tree)
+        # === END IF ===
+
+        if self.mode != "targets":
+            self._creator._create_samples((tree, ))
+        # === END IF ===
+
+        self.trees += 1
+    # === END ===
+
+    def dump(self) -> ModderSettings:
+        """
+            Dump the results to the output folder.
+
+            Returns
+            -------
+            parser_settings : ModderSettings
+                The settings of the digester,
+                to which the list of categories (`targets`) 
+                and the unary rules (`unary_rules`) are added
+                in the modes "train" and "targets".
+        """
+        creator = self._creator
+        dir_output: pathlib.Path = self.settings.OUT
+
+        if self.mode == "test":
+            samples_name = "testdata.json"
+            sents_name = "testsents"
+        else:
+            samples_name = "traindata.json"
+            sents_name = "trainsents"
+
+            cats = {
+                k: v for k, v in creator.cats.items()
+                if v >= creator.cat_freq_cut
+            }
+            creator._write(cats, dir_output / "target.txt")
+        # === END IF ===
+
+        if self.mode == "train":
+            words = {
+                k: v for k, v in creator.words.items()
+                if v >= creator.word_freq_cut
+            }
+            creator._write(words, dir_output / "words.txt")
+
+            chars = {
+                k: v for k, v in creator.chars.items()
+                if v >= creator.char_freq_cut
+            }
+            creator._write(chars, dir_output / "chars.txt")
+
+            seen_rules = {
+                f"{c1} {c2}": v 
+                for (c1, c2), v in creator.seen_rules.items()
+                if c1 in cats and c2 in cats
+            }
+            creator._write(seen_rules, dir_output / "seen_rules.txt")
+
+            unary_rules = {
+                f"{c1} {c2}": v 
+                for (c1, c2), v in creator.unary_rules.items()
+            }
+            creator._write(unary_rules, dir_output / "unary_rules.txt")
+        # === END IF ===
+
+        if self.mode != "targets":
+            with open(dir_output / samples_name, "w") as h_samples:
+                json.dump(creator.samples, h_samples)
+            # === END WITH h_samples ===
+
+            with open(dir_output / f"{sents_name}.txt", "w") as h_sents:
+                for sent in creator.sents:
+                    h_sents.write(sent)
+                    h_sents.write("\n")
+                # === END FOR sent ===
+            # === END WITH h_sents ===
+
+            with open(dir_output / f"{sents_name}.conll", "w") as h_conll:
+                creator._to_conll(h_conll)
+            # === END WITH h_conll ===
+        # === END IF ===
+
+        return load_digest_info(self.settings, self.mode)
+    # === END ===
+# === END CLASS ===
+
+def load_digest_info(
+    settings: ModderSettings,
+    mode: str
+) -> ModderSettings:
+    """
+        Add the information of a digested treebank in `settings.OUT`
+        to the settings of the digester:
+        the list of categories (`targets`) 
+        and the unary rules (`unary_rules`) in the modes "train" and "targets".
+
+        Returns
+        -------
+        parser_settings : ModderSettings
+            `settings` itself.
+    """
+    if mode != "test":
         # Add the list of categories to the modder settings
-        with open(dir_output / "target.txt") as h_target:
-            modder_settings.targets = list(
+        with open(settings.OUT / "target.txt") as h_target:
+            settings.targets = list(
                 filter(
                     None,
                     map(parse_mod_target_line, h_target)
                 )
             )
-        # === END WITH h_target ===            
+        # === END WITH h_target ===
 
         # Add the list of unary rules to the modder settings
+        settings.unary_rules = gen_sorted_unary_rules()
+    # === END IF ===
+
+    return settings
+# === END ===
 
-        modder_settings.unary_rules = gen_unary_rules()
-    elif mode == "test":
-        kr.TrainingDataCreator.create_testdata(
-            modder_settings,
+def mod_treebank(
+    p_treebank: pathlib.Path,
+    dir_output: pathlib.Path,
+    mode: str
+) -> ModderSettings:
+    """
+        Digest a raw treebank file as `depccg.tools.ja.keyaki_reader` does and 
+        dump the results to the designated output folder.
+        The used settings is what this function returns.
+
+        Parameters
+        ----------
+        p_treebank : pathlib.Path
+            The path to the treebank, which is a single file.
+        dir_output : pathlib.Path
+            The folder to which the digested treebank is dumped.
+        mode : str
+            "train" or "test".
+
+        Returns
+        -------
+        parser_settings : ModderSettings
+            A default set of settings of the digester,
+            which may be necessary later.
+    """
+    if mode not in ("train", "test"):
+        raise ValueError
+    # === END IF ===
+
+    digester = TreebankDigester(p_treebank, dir_output, mode)
+
+    with open(p_treebank) as h_treebank:
+        for line in h_treebank:
+            tree = read_treebank_line(line)
+            if tree is not None:
+                digester.add(tree)
+            # === END IF ===
+        # === END FOR line ===
+    # === END WITH h_treebank ===
+
+    return digester.dump()
+# === END ===
+
+def tree_split_key(line: str) -> str:
+    """
+        The key of a tree (a line of a treebank file) 
+        by which it is assigned to the training or the test part:
+        its ID (e.g. "771_aozora_Miyazawa-1934;JP") if any,
+        otherwise the SHA-1 hash of the line.
+    """
+    import hashlib
+
+    match = re.search(r"\(ID\s+([^()\s]+)\)\s*\)\s*$", line)
+
+    if match:
+        return match.group(1)
+    else:
+        return hashlib.sha1(line.strip().encode("utf-8")).hexdigest()
+    # === END IF ===
+# === END ===
+
+def hash_split(key: str, ratio: float, salt: str) -> str:
+    """
+        Assign a tree to the training ("train") or the test ("test") part
+        by a stable hash of its key (see `tree_split_key`) and a salt.
+        The assignment of a tree does not depend on the other trees,
+        so it never moves when trees are added to the treebank.
+
+        Parameters
+        ----------
+        ratio : float
+            The percentage of the training part.
+    """
+    import hashlib
+
+    digest = hashlib.sha1(f"{salt}\t{key}".encode("utf-8")).digest()
+    if int.from_bytes(digest[:8], "big") / 2 ** 64 * 100 < ratio:
+        return "train"
+    else:
+        return "test"
+    # === END IF ===
+# === END ===
+
+def read_split_manifest(
+    p_manifest: pathlib.Path
+) -> typing.Dict[str, str]:
+    """
+        Read a manifest of a split written by `split_treebank_files`.
+
+        Returns
+        -------
+        assignments : typing.Dict[str, str]
+            The part ("train" or "test") of each key of trees.
+    """
+    assignments: typing.Dict[str, str] = {}
+
+    with open(p_manifest, "r") as h_manifest:
+        for line in h_manifest:
+            _, _, key, split = line.rstrip("\n").split("\t")
+            assignments[key] = split
+        # === END FOR line ===
+    # === END WITH h_manifest ===
+
+    return assignments
+# === END ===
+
+def split_treebank_files(
+    treefiles: typing.Iterable[pathlib.Path],
+    h_treebank_all: typing.TextIO,
+    h_treebank_train: typing.TextIO,
+    h_treebank_test: typing.TextIO,
+    ratio: float,
+    salt: typing.Optional[str] = None,
+    pinned: typing.Optional[typing.Dict[str, str]] = None,
+    h_manifest: typing.Optional[typing.TextIO] = None
+) -> typing.Iterator[typing.Tuple[pathlib.Path, typing.List[str]]]:
+    """
+        Divide the trees (lines) of treebank files
+        into the training and the test parts
+        and write them to the given files.
+
+        Parameters
+        ----------
+        ratio : float
+            The percentage of the training part.
+        salt : str, optional
+            The salt of the deterministic split (see `hash_split`).
+            The trees are divided at random (see `get_rand`) if None.
+        pinned : typing.Dict[str, str], optional
+            The parts of trees fixed beforehand, 
+            e.g. by the manifest of a previous run (see `read_split_manifest`).
+            Trees not in it are divided as usual.
+        h_manifest : typing.TextIO, optional
+            The manifest of the split, to which a line 
+            "<file>\t<line number>\t<key>\t<part>" is written for each tree.
+
+        Yields
+        ------
+        treefile : pathlib.Path
+            A treebank file.
+        splits : typing.List[str]
+            The parts ("train" or "test") to which the lines of the file go.
+    """
+    for treefile in treefiles:
+        splits: typing.List[str] = []
+
+        with open(treefile, "r") as h_treefile:
+            # For each line (i.e. sentence) in the file
+            for lineno, line in enumerate(h_treefile, 1):
+                key = tree_split_key(line)
+
+                # Decide whether the sentence goes to the traning or the test part
+                if pinned and key in pinned:
+                    split = pinned[key]
+                elif salt is not None:
+                    split = hash_split(key, ratio, salt)
+                elif get_rand() < ratio:
+                    # Pick up a random number
+                    split = "train"
+                else:
+                    split = "test"
+                # === END IF ===
+
+                if split == "train":
+                    h_treebank_train.write(line)
+                else:
+                    h_treebank_test.write(line)
+                # === END IF ===
+                splits.append(split)
+
+                # Dump the tree to h_treebank_all 
+                h_treebank_all.write(line)
+
+                if h_manifest is not None:
+                    h_manifest.write(f"{treefile}\t{lineno}\t{key}\t{split}\n")
+                # === END IF ===
+            # === END FOR lineno, line ===
+        # === END WITH h_treefile ===
+
+        yield treefile, splits
+    # === END FOR treefile ===
+# === END ===
+
+"""
+    The modes of the digesters of the whole treebank ("all"),
+    the training part ("train") and the test part ("test").
+"""
+DIGEST_MODES: typing.Dict[str, str] = {
+    "all": "targets",
+    "train": "train",
+    "test": "test",
+}
+
+def digest_treebank_file(
+    job: typing.Tuple[pathlib.Path, typing.List[str]]
+) -> typing.Dict[str, TreebankDigester]:
+    """
+        Digest a treebank file into partial digesters of 
+        the whole treebank and the training and test parts
+        (see `DIGEST_MODES`).
+        
+        Parameters
+        ----------
+        job : typing.Tuple[pathlib.Path, typing.List[str]]
+            A treebank file and the parts of its lines
+            (see `split_treebank_files`).
+    """
+    treefile, splits = job
+    partials: typing.Dict[str, TreebankDigester] = {
+        name: TreebankDigester.partial(mode)
+        for name, mode in DIGEST_MODES.items()
+    }
+
+    with open(treefile, "r") as h_treefile:
+        for line, split in zip(h_treefile, splits):
+            tree = read_treebank_line(line)
+
+            if tree is not None:
+                partials["all"].add(tree)
+                partials[split].add(tree)
+            # === END IF ===
+        # === END FOR line, split ===
+    # === END WITH h_treefile ===
+
+    return partials
+# === END ===
+
+"""
+    The maximum total size in bytes of the cache of the digests 
+    of the treebank files (see `digest_treebank_file_cached`).
+    The least recently used digests are removed beyond it
+    (see `prune_treebank_file_cache`).
+"""
+TREEBANK_FILE_CACHE_SIZE: int = 1024 * 1024 * 1024
+
+def digest_treebank_file_cached(
+    job: typing.Tuple[
+        typing.Tuple[pathlib.Path, typing.List[str]],
+        pathlib.Path,
+        str
+    ]
+) -> typing.Dict[str, TreebankDigester]:
+    """
+        `digest_treebank_file` with a cache of the partial digesters
+        keyed by the content of the file, the parts of its lines
+        and the code of the preprocessing.
+        Files which are unchanged and divided in the same way
+        are not digested again
+        (e.g. when new files are added to the treebank).
+        The modification times of the digests found are updated
+        so that `prune_treebank_file_cache` keeps them.
+        
+        Parameters
+        ----------
+        job : typing.Tuple[typing.Tuple[pathlib.Path, typing.List[str]], pathlib.Path, str]
+            A job of `digest_treebank_file`, 
+            the cache folder and the key of the code (see `preprocess_code_key`).
+    """
+    import hashlib
+    import pickle
+
+    (treefile, splits), dir_cache, code_key = job
+
+    hasher = hashlib.sha1()
+    hasher.update(code_key.encode("utf-8"))
+    with open(treefile, "rb") as h_treefile:
+        hasher.update(hashlib.sha1(h_treefile.read()).digest())
+    # === END WITH h_treefile ===
+    hasher.update(" ".join(splits).encode("utf-8"))
+    p_cache = dir_cache / f"{hasher.hexdigest()}.pickle"
+
+    try:
+        with open(p_cache, "rb") as h_cache:
+            partials = pickle.load(h_cache)
+        # === END WITH h_cache ===
+        os.utime(p_cache)
+        return partials
+    except (OSError, pickle.UnpicklingError, EOFError):
+        pass
+    # === END TRY ===
+
+    partials = digest_treebank_file((treefile, splits))
+
+    try:
+        dir_cache.mkdir(parents = True, exist_ok = True)
+        p_temp = dir_cache / f".{p_cache.name}.{os.getpid()}"
+        with open(p_temp, "wb") as h_cache:
+            pickle.dump(partials, h_cache)
+        # === END WITH h_cache ===
+        os.replace(p_temp, p_cache)
+    except OSError as e:
+        sys.stderr.write(
+            f"[Trainer] Cannot store the digest of {treefile}: {e}\n"
         )
+    # === END TRY ===
+
+    return partials
+# === END ===
+
+def prune_treebank_file_cache(
+    dir_cache: pathlib.Path,
+    max_bytes: int = TREEBANK_FILE_CACHE_SIZE
+) -> int:
+    """
+        Remove the least recently used digests of the treebank files
+        (see `digest_treebank_file_cached`)
+        until their total size is within `max_bytes`.
+
+        Returns
+        -------
+        removed : int
+            The number of the digests removed.
+    """
+    entries: typing.List[typing.Tuple[float, int, pathlib.Path]] = []
+    for p_cache in dir_cache.glob("*.pickle"):
+        try:
+            stat = p_cache.stat()
+        except OSError:
+            continue
+        # === END TRY ===
+        entries.append((stat.st_mtime, stat.st_size, p_cache))
+    # === END FOR p_cache ===
+
+    total = sum(size for _, size, _ in entries)
+    removed: int = 0
+    for _, size, p_cache in sorted(entries):
+        if total <= max_bytes:
+            break
+        # === END IF ===
+
+        try:
+            p_cache.unlink()
+        except OSError:
+            continue
+        # === END TRY ===
+        total -= size
+        removed += 1
+    # === END FOR ===
+
+    return removed
+# === END ===
+
+def digest_treebank_files(
+    jobs: typing.Iterable[typing.Tuple[pathlib.Path, typing.List[str]]],
+    digesters: typing.Dict[str, TreebankDigester],
+    workers: int = 1,
+    dir_cache: typing.Optional[pathlib.Path] = None
+) -> typing.NoReturn:
+    """
+        Digest treebank files across worker processes
+        and merge the results into `digesters` in the order of the files,
+        so that the results do not depend on the number of workers.
+
+        Parameters
+        ----------
+        jobs : typing.Iterable[typing.Tuple[pathlib.Path, typing.List[str]]]
+            Treebank files and the parts of their lines
+            (see `split_treebank_files`).
+        digesters : typing.Dict[str, TreebankDigester]
+            The digesters of the whole treebank 
+            and the training and test parts (see `DIGEST_MODES`).
+        workers : int
+            The number of worker processes.
+            The files are digested in this process if 1.
+        dir_cache : pathlib.Path, optional
+            The cache folder of the digests of the files
+            (see `digest_treebank_file_cached`),
+            which is pruned to TREEBANK_FILE_CACHE_SIZE afterwards.
+            No cache is used if None.
+    """
+    import multiprocessing
+
+    if dir_cache is not None:
+        code_key = preprocess_code_key()
+        jobs = ((job, dir_cache, code_key) for job in jobs)
+        digest = digest_treebank_file_cached
     else:
-        raise ValueError
+        digest = digest_treebank_file
     # === END IF ===
 
-    return modder_settings
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            for partials in pool.imap(digest, jobs):
+                for name, partial in partials.items():
+                    digesters[name].merge(partial)
+                # === END FOR name, partial ===
+            # === END FOR partials ===
+        # === END WITH pool ===
+    else:
+        for partials in map(digest, jobs):
+            for name, partial in partials.items():
+                digesters[name].merge(partial)
+            # === END FOR name, partial ===
+        # === END FOR partials ===
+    # === END IF ===
+
+    if dir_cache is not None and dir_cache.is_dir():
+        removed = prune_treebank_file_cache(dir_cache)
+        if removed:
+            sys.stderr.write(
+                f"[Trainer] Removed {removed} old digests of treebank files from {dir_cache}\n"
+            )
+        # === END IF ===
+    # === END IF ===
+# === END ===
+
+def preprocess_code_key() -> str:
+    """
+        The SHA-1 hash of the settings of the digester 
+        (e.g. the frequency cutoffs)
+        and the sources of the preprocessing 
+        (including `depccg.tools.ja.keyaki_reader`).
+    """
+    import hashlib
+    import inspect
+    import depccg.tools.ja.keyaki_reader as kr
+
+    hasher = hashlib.sha1()
+    hasher.update(
+        json.dumps(
+            vars(make_modder_settings(None, None)),
+            sort_keys = True,
+            default = str
+        ).encode("utf-8")
+    )
+
+    for source in (
+        kr, read_treebank_line, TreebankDigester, 
+        tree_split_key, hash_split, split_treebank_files, 
+        digest_treebank_file, get_rand
+    ):
+        hasher.update(inspect.getsource(source).encode("utf-8"))
+    # === END FOR source ===
+
+    return hasher.hexdigest()
+# === END ===
+
+def preprocess_cache_key(
+    treefiles: typing.Sequence[pathlib.Path],
+    dir_treebank: pathlib.Path,
+    salt: str,
+    ratio: float,
+    pinned: typing.Optional[typing.Dict[str, str]] = None
+) -> str:
+    """
+        The key of a preprocessed (split and digested) treebank 
+        in the preprocessing cache.
+        It covers the paths and the contents of the treebank files,
+        the salt and the ratio of the split, 
+        the parts of trees fixed beforehand
+        and the code of the preprocessing (see `preprocess_code_key`).
+    """
+    import hashlib
+
+    hasher = hashlib.sha1()
+    hasher.update(f"{salt}\t{ratio}\n".encode("utf-8"))
+    hasher.update(
+        json.dumps(pinned or {}, sort_keys = True).encode("utf-8")
+    )
+    hasher.update(preprocess_code_key().encode("utf-8"))
+
+    for treefile in treefiles:
+        hasher.update(f"{treefile.relative_to(dir_treebank)}\n".encode("utf-8"))
+
+        with open(treefile, "rb") as h_treefile:
+            hasher.update(
+                hashlib.sha1(h_treefile.read()).hexdigest().encode("utf-8")
+            )
+        # === END WITH h_treefile ===
+    # === END FOR treefile ===
+
+    return hasher.hexdigest()
+# === END ===
+
+def link_tree(src: pathlib.Path, dst: pathlib.Path) -> typing.NoReturn:
+    """
+        Make a copy of the directory `src` at `dst` 
+        whose files are hard links to those in `src`,
+        or symbolic links if they cannot be hard-linked 
+        (e.g. across file systems).
+        Files in the copy must be unlinked before being overwritten.
+    """
+    dst.mkdir(parents = True, exist_ok = True)
+
+    for path in sorted(src.rglob("*")):
+        target = dst / path.relative_to(src)
+
+        if path.is_dir():
+            target.mkdir(exist_ok = True)
+        else:
+            try:
+                os.link(path, target)
+            except OSError:
+                os.symlink(path.resolve(), target)
+            # === END TRY ===
+        # === END IF ===
+    # === END FOR path ===
+# === END ===
+
+"""
+    The folders of an output directory 
+    which are stored in the preprocessing cache.
+"""
+PREPROCESS_CACHE_PARTS: typing.Tuple[str, ...] = ("source", "treebank_mod")
+
+def store_preprocess_cache(
+    dir_output: pathlib.Path,
+    dir_cache: pathlib.Path
+) -> typing.NoReturn:
+    """
+        Store the preprocessed treebank in `dir_output` 
+        (see `PREPROCESS_CACHE_PARTS`) to the cache folder `dir_cache`.
+        The files are linked rather than copied.
+        The folder is completed in a temporary place and then renamed
+        so that an incomplete cache is never used.
+        Failures (e.g. a read-only cache) are only reported to STDERR.
+    """
+    import tempfile
+
+    dir_temp: typing.Optional[pathlib.Path] = None
+    try:
+        dir_cache.parent.mkdir(parents = True, exist_ok = True)
+        dir_temp = pathlib.Path(
+            tempfile.mkdtemp(dir = dir_cache.parent, prefix = ".tmp-")
+        )
+
+        for part in PREPROCESS_CACHE_PARTS:
+            link_tree(dir_output / part, dir_temp / part)
+        # === END FOR part ===
+
+        os.rename(dir_temp, dir_cache)
+    except OSError as e:
+        sys.stderr.write(
+            f"[Trainer] Cannot store the preprocessing cache {dir_cache}: {e}\n"
+        )
+        if dir_temp is not None:
+            shutil.rmtree(dir_temp, ignore_errors = True)
+        # === END IF ===
+    # === END TRY ===
+# === END ===
+
+def read_word_vectors(
+    p_vectors: pathlib.Path,
+    words: typing.Set[str],
+    dim: int
+) -> typing.Dict[str, typing.List[float]]:
+    """
+        Read the vectors of the given words 
+        from a text file of word vectors ("<word> <dim 1> <dim 2> ..."),
+        skipping the lines with a wrong number of dimensions
+        in the same way as allennlp.
+    """
+    res: typing.Dict[str, typing.List[float]] = {}
+
+    with open(p_vectors, "rb") as h_vectors:
+        for line in h_vectors:
+            word, _, rest = line.partition(b" ")
+            word = word.decode("utf-8", errors = "replace")
+
+            if word in words:
+                fields = rest.rstrip().split(b" ")
+                if len(fields) == dim:
+                    res[word] = [float(field) for field in fields]
+                # === END IF ===
+            # === END IF ===
+        # === END FOR line ===
+    # === END WITH h_vectors ===
+
+    return res
+# === END ===
+
+def build_embedding_matrix(
+    p_vectors: pathlib.Path,
+    tokens: typing.List[str],
+    dim: int,
+    dir_cache: pathlib.Path
+) -> pathlib.Path:
+    """
+        Make the embedding matrix of a vocabulary 
+        from a text file of word vectors as a float32 `.npy` file
+        and cache it under `dir_cache`,
+        keyed by the vector file (its path, size and modification time),
+        the vocabulary and the dimension.
+        Words without vectors are initialized at random 
+        with the mean and the standard deviation of the found vectors,
+        as allennlp does.
+
+        Parameters
+        ----------
+        tokens : typing.List[str]
+            The words of the vocabulary in the order of their IDs.
+
+        Returns
+        -------
+        p_matrix : pathlib.Path
+            The matrix of the shape (len(tokens), dim).
+    """
+    import hashlib
+    import numpy
+
+    stat = p_vectors.stat()
+    hasher = hashlib.sha1()
+    hasher.update(
+        f"{p_vectors.resolve()}\t{stat.st_size}\t{stat.st_mtime_ns}\t{dim}\n".encode("utf-8")
+    )
+    hasher.update("\n".join(tokens).encode("utf-8"))
+    p_matrix = dir_cache / f"{hasher.hexdigest()}.npy"
+
+    if p_matrix.exists():
+        return p_matrix
+    # === END IF ===
+
+    vectors = read_word_vectors(p_vectors, set(tokens), dim)
+    if not vectors:
+        raise ValueError(f"No vectors of dimension {dim} found in {p_vectors}")
+    # === END IF ===
+
+    found = numpy.array(list(vectors.values()), dtype = numpy.float32)
+    matrix = numpy.random.RandomState(0).normal(
+        float(found.mean()), float(found.std()), (len(tokens), dim)
+    ).astype(numpy.float32)
+    for i, token in enumerate(tokens):
+        if token in vectors:
+            matrix[i] = vectors[token]
+        # === END IF ===
+    # === END FOR i, token ===
+
+    sys.stderr.write(
+        f"[Trainer] Vectors found for {len(vectors)} out of {len(tokens)} words\n"
+    )
+
+    dir_cache.mkdir(parents = True, exist_ok = True)
+    p_temp = dir_cache / f".{p_matrix.name}.{os.getpid()}.npy"
+    numpy.save(p_temp, matrix)
+    os.replace(p_temp, p_matrix)
+
+    return p_matrix
+# === END ===
+
+def write_embedding_hdf5(
+    p_matrix: pathlib.Path,
+    p_hdf5: pathlib.Path
+) -> typing.NoReturn:
+    """
+        Write an embedding matrix (see `build_embedding_matrix`) 
+        as an HDF5 file, which the `embedding` token embedder of allennlp
+        loads as `pretrained_file` without parsing.
+    """
+    import numpy
+    import h5py
+
+    with h5py.File(p_hdf5, "w") as h_hdf5:
+        h_hdf5.create_dataset(
+            "embedding", 
+            data = numpy.load(p_matrix, mmap_mode = "r")
+        )
+    # === END WITH h_hdf5 ===
+# === END ===
+
+def read_proc_io() -> typing.Dict[str, int]:
+    """
+        The bytes read and written by this process 
+        (`read_bytes` and `write_bytes` of `/proc/self/io`, 
+        i.e. those which hit the storage).
+        Empty where `/proc` is not available.
+    """
+    res: typing.Dict[str, int] = {}
+
+    try:
+        with open("/proc/self/io", "r") as h_io:
+            for line in h_io:
+                key, _, value = line.partition(":")
+                if key in ("read_bytes", "write_bytes"):
+                    res[key] = int(value)
+                # === END IF ===
+            # === END FOR line ===
+        # === END WITH h_io ===
+    except OSError:
+        pass
+    # === END TRY ===
+
+    return res
+# === END ===
+
+class StageLog:
+    """
+        The records of the stages of a training run,
+        which are written as JSON to `path` after every stage
+        so that the costs are kept even if a later stage fails.
+        A stage is recorded only when it is complete,
+        so the records also serve as the markers 
+        of the stages to be skipped when the run is resumed.
+
+        Attributes
+        ----------
+        path : pathlib.Path, optional
+            The JSON file. Nothing is written if None.
+        stages : typing.List[typing.Dict[str, typing.Any]]
+            The records made by `report_time`,
+            including those of the previous runs if resumed.
+    """
+
+    def __init__(
+        self, 
+        path: typing.Optional[pathlib.Path] = None,
+        resume: bool = False
+    ):
+        self.path = path
+        self.stages: typing.List[typing.Dict[str, typing.Any]] = []
+
+        if resume and path is not None and path.exists():
+            with open(path, "r") as h_log:
+                self.stages = json.load(h_log)["stages"]
+            # === END WITH h_log ===
+        # === END IF ===
+    # === END ===
+
+    def completed(self, *stages: str) -> bool:
+        """
+            Check if any of the given stages has been completed.
+        """
+        return any(
+            record["stage"] in stages
+            for record in self.stages
+        )
+    # === END ===
+
+    def add(self, record: typing.Dict[str, typing.Any]) -> typing.NoReturn:
+        self.stages.append(record)
+
+        if self.path is not None:
+            p_temp = self.path.with_name(f".{self.path.name}.tmp")
+            with open(p_temp, "w") as h_log:
+                json.dump({"stages": self.stages}, h_log, indent = 2)
+            # === END WITH h_log ===
+            os.replace(p_temp, self.path)
+        # === END IF ===
+    # === END ===
+# === END CLASS ===
+
+@contextlib.contextmanager
+def report_time(
+    stage: str,
+    log: typing.Optional[StageLog] = None
+) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+    """
+        Report the wall time of a stage to STDERR
+        and add a record of the stage to `log`:
+        the wall time and the CPU time (user and system, 
+        including the worker processes joined in the stage) in seconds,
+        the peak resident set sizes in KiB so far of this process 
+        and of the joined worker processes,
+        and the bytes read and written by this process.
+        The stage can add its own figures (e.g. the number of trees)
+        to the yielded record.
+    """
+    import resource
+
+    def cpu_time() -> float:
+        return sum(
+            usage.ru_utime + usage.ru_stime
+            for usage in (
+                resource.getrusage(resource.RUSAGE_SELF),
+                resource.getrusage(resource.RUSAGE_CHILDREN),
+            )
+        )
+    # === END ===
+
+    record: typing.Dict[str, typing.Any] = {"stage": stage}
+    io_start = read_proc_io()
+    cpu_start = cpu_time()
+    start = time.perf_counter()
+
+    yield record
+
+    wall = time.perf_counter() - start
+    io_end = read_proc_io()
+    record.update(
+        wall_time = wall,
+        cpu_time = cpu_time() - cpu_start,
+        peak_rss_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        peak_rss_children_kib = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        **{
+            key: io_end[key] - io_start[key]
+            for key in io_end.keys() & io_start.keys()
+        }
+    )
+
+    sys.stderr.write(f"[Trainer] {stage}: {wall:.2f} s\n")
+    if log is not None:
+        log.add(record)
+    # === END IF ===
 # === END ===
 
 def get_rand() -> float:
@@ -364,26 +1412,79 @@ def get_rand() -> float:
 # Main Procedure
 # ======
 if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(
+        "Train the supertagger of the A* CCG parser on the ABC Treebank"
+    )
+    arg_parser.add_argument(
+        '--cpu', action = 'store_true',
+        help = 'train on CPU with the CPU profile (supertagger_cpu.jsonnet)'
+    )
+    arg_parser.add_argument(
+        '--threads', type = int, default = None,
+        help = 'the number of intra-op threads of torch on CPU (default: the number of CPUs minus --data-workers)'
+    )
+    arg_parser.add_argument(
+        '--data-workers', type = int, default = 2,
+        help = 'the number of background processes which make batches on CPU (0 to make them in the training process)'
+    )
+    arg_parser.add_argument(
+        '--epochs', type = int, default = None,
+        help = 'override the number of epochs'
+    )
+    arg_parser.add_argument(
+        '--source', type = pathlib.Path, default = pathlib.Path("/root/source/"),
+        help = 'the directory of the treebank'
+    )
+    arg_parser.add_argument(
+        '--synthetic', type = int, default = None, metavar = 'TREES',
+        help = 'train on a synthetic treebank of about TREES trees instead of --source (for smoke tests)'
+    )
+    arg_parser.add_argument(
+        '--resume', type = str, default = None, metavar = 'TIMESTAMP',
+        help = 'resume the interrupted run in /root/results/TIMESTAMP, skipping its completed stages and recovering the training from the last checkpoint (give the same options as the run)'
+    )
+    args = arg_parser.parse_args()
+
     import allennlp.common.params as allp
     import allennlp.common.util as allu
     import allennlp.commands.train as allct
+    import allennlp.data.vocabulary as allv
     allu.import_submodules("depccg.models.my_allennlp")
+    import sharded_dataset
     # ------
     # Constants
     # ------
-    DIR_TREEBANK: pathlib.Path = pathlib.Path("/root/source/")
+    DIR_TREEBANK: pathlib.Path = args.source
     """ 
         The path to the original treebank directory 
         in which data are dispersed in multiple files.
     """
 
     FILE_TRAINER_SETTINGS: pathlib.Path = pathlib.Path(
-        "/root/scripts/supertagger.jsonnet"
+        "/root/scripts/supertagger_cpu.jsonnet"
+        if args.cpu
+        else "/root/scripts/supertagger.jsonnet"
     )
     """
         The path to the trainer settings.
     """
 
+    INT_DATA_WORKERS: int = args.data_workers if args.cpu else 0
+    """
+        The number of processes which make batches (on CPU).
+    """
+
+    INT_THREADS: int = (
+        args.threads 
+        if args.threads is not None 
+        else max(1, (os.cpu_count() or 1) - INT_DATA_WORKERS)
+    )
+    """
+        The number of intra-op threads of torch (on CPU).
+    """
+
     DIR_WVECT: pathlib.Path = pathlib.Path(
         "/root/lex-model-depccg-ja/vocabulary"
     )
@@ -391,119 +1492,388 @@ if __name__ == "__main__":
         The path to the directory of the word-vector database.
     """
 
+    FILE_WORD_VECTORS: pathlib.Path = pathlib.Path(
+        "/root/vector-wikija/entity_vector/entity_vector.model.txt"
+    )
+    """
+        The path to the word vectors (JaWiki entity vectors) in the text format.
+        Only the vectors of the vocabulary are extracted 
+        and cached under `DIR_RES / ".cache" / "embeddings"`.
+    """
+
+    INT_WORD_VECTOR_DIM: int = 200
+    """
+        The dimension of the word vectors.
+    """
+
     INT_TRAINTEST_RATIO: int = 80
     """ 
         The ratio of the traning part to the whold treebank sentences.
     """
 
+    INT_PREPROCESS_WORKERS: int = os.cpu_count() or 1
+    """
+        The number of processes which digest the treebank files.
+    """
+
+    STR_SPLIT_SALT: typing.Optional[str] = "abc-depccg"
+    """
+        The salt of the deterministic division of the treebank 
+        into the training and the test parts (see `hash_split`).
+        Each tree is assigned by the hash of its ID,
+        so the assignments do not change when trees are added.
+        The preprocessed treebank is cached 
+        under `DIR_RES / ".cache" / "treebank"`
+        and reused as long as the treebank files, the salt, the ratio 
+        and the settings of the digester are unchanged.
+        The trees are divided at random and nothing is cached if None.
+    """
+
+    FILE_SPLIT_MANIFEST: typing.Optional[pathlib.Path] = None
+    """
+        The manifest of the division of a previous run 
+        (`/root/results/<timestamp>/source/split.tsv`),
+        whose assignments are kept (e.g. after changing the ratio).
+    """
+
     # ------
     # 0. Construct the output folder
     # ------
     DIR_RES: pathlib.Path = pathlib.Path("/root/results/")
 
-    DIR_OUTPUT: pathlib.Path = DIR_RES / datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    if args.resume is not None:
+        DIR_OUTPUT: pathlib.Path = DIR_RES / args.resume
 
-    while DIR_OUTPUT.exists():
+        if not DIR_OUTPUT.is_dir():
+            arg_parser.error(f"no run to resume in {DIR_OUTPUT}")
+        # === END IF ===
+    else:
         DIR_OUTPUT: pathlib.Path = DIR_RES / datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+
+        while DIR_OUTPUT.exists():
+            DIR_OUTPUT: pathlib.Path = DIR_RES / datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        # === END ===
+        DIR_OUTPUT.mkdir()
+    # === END IF ===
+
+    stage_log: StageLog = StageLog(
+        DIR_OUTPUT / "stages.json",
+        resume = args.resume is not None
+    )
+    """
+        The costs of the stages of this run, written to `stages.json`,
+        which also mark the stages to be skipped by `--resume`.
+    """
+
+    def skip_stage(*stages: str) -> bool:
+        """
+            Check if a stage has been completed by the resumed run.
+        """
+        if stage_log.completed(*stages):
+            sys.stderr.write(f"[Trainer] {stages[0]}: completed by the resumed run\n")
+            return True
+        else:
+            return False
+        # === END IF ===
     # === END ===
-    DIR_OUTPUT.mkdir()
+
+    if args.synthetic is not None:
+        # Generate a synthetic treebank for a smoke test
+        from synthetic import generate_synthetic_treebank
+
+        DIR_TREEBANK = generate_synthetic_treebank(
+            DIR_OUTPUT / "synthetic", 
+            max(1, args.synthetic // 100),
+            min(args.synthetic, 100)
+        )
+    # === END IF ===
+
+    preprocessed: bool = skip_stage(
+        "dump the digested treebanks",
+        "link the cached treebank"
+    )
+    """
+        Whether the treebank has been divided and digested by the resumed run.
+    """
+
+    if not preprocessed:
+        # Remove the partial results of the resumed run
+        # (they may be links to the cache and must not be overwritten)
+        for part in PREPROCESS_CACHE_PARTS:
+            if (DIR_OUTPUT / part).exists():
+                shutil.rmtree(DIR_OUTPUT / part)
+            # === END IF ===
+        # === END FOR part ===
+    # === END IF ===
 
     DIR_OUTPUT_SOURCE: pathlib.Path = DIR_OUTPUT / "source"
-    DIR_OUTPUT_SOURCE.mkdir()
+    DIR_OUTPUT_SOURCE.mkdir(exist_ok = True)
 
     DIR_OUTPUT_MODTREEBANK: pathlib.Path = DIR_OUTPUT / "treebank_mod"
-    DIR_OUTPUT_MODTREEBANK.mkdir()
+    DIR_OUTPUT_MODTREEBANK.mkdir(exist_ok = True)
 
     DIR_OUTPUT_WVECT: pathlib.Path = DIR_OUTPUT / "wvect"
-    # DIR_OUTPUT_WVECT.mkdir() # will be made later by shutil
+    # DIR_OUTPUT_WVECT.mkdir() # will be made later by link_tree
+
+    DIR_OUTPUT_SHARDS: pathlib.Path = DIR_OUTPUT / "traindata"
+    # DIR_OUTPUT_SHARDS.mkdir() # will be made later by sharded_dataset
+
+    FILE_OUTPUT_EMBEDDING: pathlib.Path = DIR_OUTPUT / "embedding.h5"
 
     DIR_OUTPUT_MODEL: pathlib.Path = DIR_OUTPUT / "model"
-    DIR_OUTPUT_MODEL.mkdir()
+    DIR_OUTPUT_MODEL.mkdir(exist_ok = True)
 
     # ------
     # 1. Divide trees to the training / test sets
+    #    and digest them in the same pass
     # ------
+    DIR_OUTPUT_MODTREEBANK_ALL = DIR_OUTPUT_MODTREEBANK / "all"
+    DIR_OUTPUT_MODTREEBANK_ALL.mkdir(exist_ok = True)
 
-    # Create temporary files for the treebank
-    with open(
-        DIR_OUTPUT_SOURCE / "all.psd",
-        mode = "w"
-    ) as h_treebank_all, open(
-        DIR_OUTPUT_SOURCE / "training.psd",
-        mode = "w"
-    ) as h_treebank_train, open(
-        DIR_OUTPUT_SOURCE / "testing.psd",
-        mode = "w"
-    ) as h_treebank_test:
-        # Open and scan each file in the treebank
-        for treefile in DIR_TREEBANK.glob("**/*.psd"):
-            with open(treefile, "r") as h_treefile:
-                # For each line (i.e. sentence) in the file
-                for line in h_treefile:
-                    # Pick up a random number and decide whether the sentence goes to the traning or the test part
-                    if get_rand() < INT_TRAINTEST_RATIO:
-                        h_treebank_train.write(line)
-                    else:
-                        h_treebank_test.write(line)
-                    # === END IF ===
-
-                    # Dump the tree to h_treebank_all 
-                    h_treebank_all.write(line)                
-                # === END FOR line ===
-            # === END WITH h_treefile ===
-        # === END FOR treefile ===
-    # === END WITH h_(temporary files) ===
+    DIR_OUTPUT_MODTREEBANK_TRAIN = DIR_OUTPUT_MODTREEBANK / "train"
+    DIR_OUTPUT_MODTREEBANK_TRAIN.mkdir(exist_ok = True)
 
-    # ------
-    # 2. Digest the separated treebanks and collect info
-    # ------
-    DIR_OUTPUT_MODTREEBANK_ALL = DIR_OUTPUT_MODTREEBANK / "all"
-    DIR_OUTPUT_MODTREEBANK_ALL.mkdir()
+    DIR_OUTPUT_MODTREEBANK_TEST = DIR_OUTPUT_MODTREEBANK / "test"
+    DIR_OUTPUT_MODTREEBANK_TEST.mkdir(exist_ok = True)
+
+    treefiles: typing.List[pathlib.Path] = sorted(DIR_TREEBANK.glob("**/*.psd"))
 
-    info_treebank_all: ModderSettings = mod_treebank(
-        DIR_OUTPUT_SOURCE / "all.psd",
-        DIR_OUTPUT_MODTREEBANK_ALL,
-        mode = "train"
+    split_pinned: typing.Optional[typing.Dict[str, str]] = (
+        read_split_manifest(FILE_SPLIT_MANIFEST)
+        if FILE_SPLIT_MANIFEST is not None
+        else None
     )
 
-    DIR_OUTPUT_MODTREEBANK_TRAIN = DIR_OUTPUT_MODTREEBANK / "train"
-    DIR_OUTPUT_MODTREEBANK_TRAIN.mkdir()
+    DIR_CACHE_PREPROCESS: typing.Optional[pathlib.Path] = None
+    if STR_SPLIT_SALT is not None and not preprocessed:
+        with report_time("hash the treebank", stage_log) as record:
+            record["files"] = len(treefiles)
+            DIR_CACHE_PREPROCESS = (
+                DIR_RES / ".cache" / "treebank" 
+                / preprocess_cache_key(
+                    treefiles, 
+                    DIR_TREEBANK,
+                    STR_SPLIT_SALT,
+                    INT_TRAINTEST_RATIO,
+                    split_pinned
+                )
+            )
+        # === END WITH ===
+    # === END IF ===
+
+    if (
+        not preprocessed
+        and DIR_CACHE_PREPROCESS is not None 
+        and DIR_CACHE_PREPROCESS.exists()
+    ):
+        # Reuse the treebank preprocessed by a previous run
+        with report_time("link the cached treebank", stage_log) as record:
+            record["cached"] = True
+            for part in PREPROCESS_CACHE_PARTS:
+                link_tree(DIR_CACHE_PREPROCESS / part, DIR_OUTPUT / part)
+            # === END FOR part ===
+
+            # The number of trees is found in the manifest of the split
+            splits = read_split_manifest(DIR_OUTPUT_SOURCE / "split.tsv")
+            record["trees"] = {
+                "all": len(splits),
+                "train": sum(1 for part in splits.values() if part == "train"),
+                "test": sum(1 for part in splits.values() if part == "test"),
+            }
+        # === END WITH ===
+        preprocessed = True
+    # === END IF ===
 
-    info_treebank_train: ModderSettings = mod_treebank(
-        DIR_OUTPUT_SOURCE / "training.psd",
-        DIR_OUTPUT_MODTREEBANK_TRAIN,
-        mode = "train"
+    if preprocessed:
+        # Collect the info of the digested treebanks
+        info_treebank_all: ModderSettings = load_digest_info(
+            make_modder_settings(
+                DIR_OUTPUT_SOURCE / "all.psd",
+                DIR_OUTPUT_MODTREEBANK_ALL
+            ),
+            DIGEST_MODES["all"]
+        )
+        info_treebank_train: ModderSettings = load_digest_info(
+            make_modder_settings(
+                DIR_OUTPUT_SOURCE / "training.psd",
+                DIR_OUTPUT_MODTREEBANK_TRAIN
+            ),
+            DIGEST_MODES["train"]
+        )
+        info_treebank_test: ModderSettings = load_digest_info(
+            make_modder_settings(
+                DIR_OUTPUT_SOURCE / "testing.psd",
+                DIR_OUTPUT_MODTREEBANK_TEST
+            ),
+            DIGEST_MODES["test"]
+        )
+    else:
+        # Only the categories are needed of the whole treebank
+        digesters: typing.Dict[str, TreebankDigester] = {
+            "all": TreebankDigester(
+                DIR_OUTPUT_SOURCE / "all.psd",
+                DIR_OUTPUT_MODTREEBANK_ALL,
+                mode = DIGEST_MODES["all"]
+            ),
+            "train": TreebankDigester(
+                DIR_OUTPUT_SOURCE / "training.psd",
+                DIR_OUTPUT_MODTREEBANK_TRAIN,
+                mode = DIGEST_MODES["train"]
+            ),
+            "test": TreebankDigester(
+                DIR_OUTPUT_SOURCE / "testing.psd",
+                DIR_OUTPUT_MODTREEBANK_TEST,
+                mode = DIGEST_MODES["test"]
+            ),
+        }
+
+        # Create temporary files for the treebank
+        with report_time("split and digest the treebank", stage_log) as record, open(
+            DIR_OUTPUT_SOURCE / "all.psd",
+            mode = "w"
+        ) as h_treebank_all, open(
+            DIR_OUTPUT_SOURCE / "training.psd",
+            mode = "w"
+        ) as h_treebank_train, open(
+            DIR_OUTPUT_SOURCE / "testing.psd",
+            mode = "w"
+        ) as h_treebank_test, open(
+            DIR_OUTPUT_SOURCE / "split.tsv",
+            mode = "w"
+        ) as h_manifest:
+            # Each file in the treebank is digested by a worker
+            # and the results are merged in the order of the files.
+            # Files divided in the same way as in a previous run 
+            # are not digested again.
+            digest_treebank_files(
+                split_treebank_files(
+                    treefiles,
+                    h_treebank_all,
+                    h_treebank_train,
+                    h_treebank_test,
+                    INT_TRAINTEST_RATIO,
+                    salt = STR_SPLIT_SALT,
+                    pinned = split_pinned,
+                    h_manifest = h_manifest
+                ),
+                digesters,
+                workers = INT_PREPROCESS_WORKERS,
+                dir_cache = (
+                    DIR_RES / ".cache" / "treebank-files"
+                    if STR_SPLIT_SALT is not None
+                    else None
+                )
+            )
+            record["cached"] = False
+            record["files"] = len(treefiles)
+            record["trees"] = {
+                mode: digester.trees
+                for mode, digester in digesters.items()
+            }
+        # === END WITH h_(temporary files) ===
+
+        # ------
+        # 2. Dump the digested treebanks and collect info
+        # ------
+        with report_time("dump the digested treebanks", stage_log):
+            info_treebank_all: ModderSettings = digesters["all"].dump()
+            info_treebank_train: ModderSettings = digesters["train"].dump()
+            info_treebank_test: ModderSettings = digesters["test"].dump()
+        # === END WITH ===
+
+        if DIR_CACHE_PREPROCESS is not None:
+            store_preprocess_cache(DIR_OUTPUT, DIR_CACHE_PREPROCESS)
+        # === END IF ===
+    # === END IF ===
+
+    # ------
+    # 3. Configure the word-vector directory
+    # ------
+    # The later stages are skipped only if the earlier ones are
+    vocab_configured: bool = (
+        preprocessed 
+        and skip_stage("configure the word-vector directory")
     )
 
-    DIR_OUTPUT_MODTREEBANK_TEST = DIR_OUTPUT_MODTREEBANK / "test"
-    DIR_OUTPUT_MODTREEBANK_TEST.mkdir()
+    if not vocab_configured:
+        if DIR_OUTPUT_WVECT.exists():
+            # Remove the partial copy of the resumed run
+            shutil.rmtree(DIR_OUTPUT_WVECT)
+        # === END IF ===
+
+        with report_time("configure the word-vector directory", stage_log) as record:
+            # Link the files of the directory to the new folder 
+            link_tree(
+                DIR_WVECT,
+                DIR_OUTPUT_WVECT
+            )
 
-    info_treebank_test: ModderSettings = mod_treebank(
-        DIR_OUTPUT_SOURCE / "testing.psd",
-        DIR_OUTPUT_MODTREEBANK_TEST,
-        mode = "test"
+            # Overwrite the vocabulary list
+            # (unlinked first so as not to overwrite the original through the link)
+            if os.path.lexists(DIR_OUTPUT_WVECT / "head_tags.txt"):
+                (DIR_OUTPUT_WVECT / "head_tags.txt").unlink()
+            # === END IF ===
+            with open(
+                DIR_OUTPUT_WVECT / "head_tags.txt", 
+                mode = "w"
+            ) as h_headtags:
+                h_headtags.write("@@UNKNOWN@@\n")
+                for entry in info_treebank_all.targets:
+                    h_headtags.write(entry)
+                    h_headtags.write("\n")
+                # === END FOR entry ===
+            # === END with h_headtags ===
+            record["categories"] = len(info_treebank_all.targets)
+        # === END WITH ===
+    # === END IF ===
+
+    vocab: allv.Vocabulary = allv.Vocabulary.from_files(
+        str(DIR_OUTPUT_WVECT)
     )
 
     # ------
-    # 3. Configure the word-vector directory
+    # 3.5. Shard and index the training data
     # ------
-    # Copy the directory to the new folder 
-    shutil.copytree(
-        DIR_WVECT,
-        DIR_OUTPUT_WVECT
+    data_sharded: bool = (
+        vocab_configured 
+        and skip_stage("shard the training data")
     )
 
-    # Overwrite the vocabulary list
-    with open(
-        DIR_OUTPUT_WVECT / "head_tags.txt", 
-        mode = "w"
-    ) as h_headtags:
-        h_headtags.write("@@UNKNOWN@@\n")
-        for entry in info_treebank_all.targets:
-            h_headtags.write(entry)
-            h_headtags.write("\n")
-        # === END FOR entry ===
-    # === END with h_headtags ===
+    if not data_sharded:
+        with report_time("shard the training data", stage_log) as record:
+            record["instances"] = sharded_dataset.write_shards(
+                DIR_OUTPUT_MODTREEBANK_TRAIN / "traindata.json",
+                DIR_OUTPUT_SHARDS,
+                vocab
+            )
+        # === END WITH ===
+    # === END IF ===
+
+    # ------
+    # 3.6. Extract the word vectors of the vocabulary
+    # ------
+    vectors_extracted: bool = (
+        vocab_configured 
+        and skip_stage("extract the word vectors")
+    )
+
+    if not vectors_extracted:
+        with report_time("extract the word vectors", stage_log) as record:
+            record["words"] = vocab.get_vocab_size("tokens")
+            write_embedding_hdf5(
+                build_embedding_matrix(
+                    FILE_WORD_VECTORS,
+                    [
+                        vocab.get_token_from_index(i, "tokens")
+                        for i in range(vocab.get_vocab_size("tokens"))
+                    ],
+                    INT_WORD_VECTOR_DIM,
+                    DIR_RES / ".cache" / "embeddings"
+                ),
+                FILE_OUTPUT_EMBEDDING
+            )
+        # === END WITH ===
+    # === END IF ===
 
     # ------
     # 4. Configure the trainer
@@ -516,21 +1886,34 @@ if __name__ == "__main__":
                     DIR_OUTPUT_WVECT
                 ),
                 "train_data": str(
-                    DIR_OUTPUT_MODTREEBANK_TRAIN
-                    / "traindata.json"
+                    DIR_OUTPUT_SHARDS
                 ),
                 "test_data": str(
                     DIR_OUTPUT_MODTREEBANK_TEST
                     / "testdata.json"
                 ),
-                "gpu": "0"
-            }
+                "embedding": str(
+                    FILE_OUTPUT_EMBEDDING
+                ),
+                "gpu": "-1" if args.cpu else "0",
+                "data_workers": str(INT_DATA_WORKERS)
+            },
+            params_overrides = (
+                json.dumps({"trainer.num_epochs": args.epochs})
+                if args.epochs is not None
+                else ""
+            )
         )
     )
 
     # ------
     # 5. Dump parser settings
     # ------
+    n_unary_rules: int = len(gen_sorted_unary_rules())
+    sys.stderr.write(
+        f"[Trainer] Unary rules: {n_unary_rules} rules "
+        f"({len(gen_unary_rules()) - n_unary_rules} duplicates discarded)\n"
+    )
     with open(
         DIR_OUTPUT / "config_parser_abc.json",
         "w+"
@@ -545,8 +1928,36 @@ if __name__ == "__main__":
     # ------
     # 6. Execute the trainer
     # ------
-    allct.train_model(
-        params = trainer_settings,
-        serialization_dir = DIR_OUTPUT_MODEL
-    )
+    if args.cpu:
+        import torch
+        torch.set_num_threads(INT_THREADS)
+    # === END IF ===
+
+    data_reused: bool = data_sharded and vectors_extracted
+    """
+        Whether the training data are those of the resumed run.
+    """
+
+    if not (data_reused and skip_stage("train the supertagger")):
+        # Recover the training from the last checkpoint of the resumed run
+        recover: bool = (
+            data_reused 
+            and (DIR_OUTPUT_MODEL / "config.json").exists()
+        )
+
+        if not recover and any(DIR_OUTPUT_MODEL.iterdir()):
+            # Remove the checkpoints trained on other data
+            shutil.rmtree(DIR_OUTPUT_MODEL)
+            DIR_OUTPUT_MODEL.mkdir()
+        # === END IF ===
+
+        with report_time("train the supertagger", stage_log) as record:
+            record["recovered"] = recover
+            allct.train_model(
+                params = trainer_settings,
+                serialization_dir = DIR_OUTPUT_MODEL,
+                recover = recover
+            )
+        # === END WITH ===
+    # === END IF ===
 # === END IF ===
\ No newline at end of file